@@ -2,90 +2,196 @@ import argparse
 from . import config
 from .log_setup import setup_logger
 from .market.binance_api import klines
+from .market.kline_store import interval_ms
+from .market.trend_filter import ema1h_allow_arrays
 from .trading import paper
-from .strategy import trend_breakout_5m, range_reversion_5m
+from .trading.engine import DecisionEngine, bar_day
+from .trading.intrabar import MODES, history_path
+from . import strategy
 
 logger = setup_logger()
 
-def pick_strategy(name: str):
-    if name == "trend":
-        return trend_breakout_5m
-    if name == "range":
-        return range_reversion_5m
-    raise ValueError("Unknown strategy. Use 'trend' or 'range'.")
-
-def run_backtest(strategy_name: str, limit: int):
-    strat = pick_strategy(strategy_name)
-    # validate config for backtest run
-    config.validate_config()
-    df = klines(config.SYMBOL, config.KLINE_INTERVAL, limit)
+WARMUP_BARS = 60
 
-    # state (paper only)
-    state = {
-        "position": "flat",
-        "paper": {
-            "enabled": True,
-            "start_cash": config.START_CASH_USDT,
-            "cash": config.START_CASH_USDT,
-            "btc_long": 0.0,
-            "avg_long": 0.0,
-            "btc_short": 0.0,
-            "avg_short": 0.0,
-            "realized_pnl": 0.0,
-            "trades": 0,
-            "trail_active": False,
-            "trail_stop": 0.0,
-            "entry_atr": 0.0,
-            "entry_price": 0.0,
-        }
-    }
-
-    trades = 0
-    for i in range(60, len(df)):  # warmup
+def pick_strategy(name: str):
+    return strategy.get(name)
+
+def parse_strategies(spec: str) -> list:
+    """"trend,range" -> ["trend", "range"], each a registered strategy."""
+    names = [n.strip() for n in spec.split(",") if n.strip()]
+    unknown = [n for n in names if n not in strategy.STRATEGIES]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(f"unknown strategy {spec!r}, use one or more of: {', '.join(strategy.names())}")
+    return names
+
+def new_book():
+    # paper only
+    return paper.PaperBook(config.START_CASH_USDT)
+
+def new_engine():
+    return DecisionEngine(new_book())
+
+def run_bar(engine, strat, ctx, allow_long: bool, allow_short: bool, fills: list, path=None):
+    """One closed bar through the same rules as the live bot (main.step).
+
+    The kill-switch day is the bar's own day; day-start value and drawdown use the bar close.
+    `path` is an optional trading.intrabar.HistoryPath for intrabar risk exits.
+    """
+    bar_close_ms = ctx["bar_close_ms"]
+    close = ctx["close"]
+    day = bar_day(bar_close_ms)
+    if day != engine.day:
+        engine.new_day(day, engine.book.value(close))
+    else:
+        engine.kill_switch(engine.book.value(close))
+
+    action = strat.decide(ctx, engine.book.position, allow_long=allow_long, allow_short=allow_short)
+    action, reason, fill = engine.on_bar(bar_close_ms, close, ctx.get("atr", 0.0) or 0.0, action,
+                                         path.bar(bar_close_ms) if path is not None else None)
+    if fill is not None:
+        fills.append({"bar_close_ms": int(bar_close_ms), "action": action, "reason": reason, "price": close, **fill})
+
+def simulate_loop(strat, df, allow=None, path=None):
+    """Reference engine: rebuild the context from the growing prefix on every bar (O(n^2)).
+
+    `allow` is an optional (allow_long, allow_short) pair of per-bar arrays, e.g. from ema1h_allow_arrays.
+    """
+    engine = new_engine()
+    fills = []
+    if path is not None:
+        path.reset()
+    for i in range(WARMUP_BARS, len(df)):  # warmup
         window = df.iloc[:i].copy()
 
-        # allow filters (for backtest keep them simple: no 1h filter here)
-        allow_long = True
-        allow_short = True
+        allow_long = bool(allow[0][i - 2]) if allow is not None else True
+        allow_short = bool(allow[1][i - 2]) if allow is not None else True
 
         ctx = strat.build_context(window)
-        action = strat.decide(ctx, state["position"], allow_long=allow_long, allow_short=allow_short)
-
-        price = float(ctx["close"])
-
-        if action == "open_long" and state["position"] == "flat":
-            paper.open_long(state, price, atr_at_entry=float(ctx.get("atr", 0.0) or 0.0))
-            trades += 1
-
-        elif action == "open_short" and state["position"] == "flat":
-            paper.open_short(state, price, atr_at_entry=float(ctx.get("atr", 0.0) or 0.0))
-            trades += 1
+        run_bar(engine, strat, ctx, allow_long, allow_short, fills, path)
+    return engine.book, fills
+
+def run_signals(strat, sig, start: int, end: int, allow=None, equity=None, path=None):
+    """Single pass of the decision engine over bars [start, end) of precomputed signals.
+
+    Signals are causal, so any segment of one whole-history build_signals() can be replayed
+    (walk-forward windows reuse them). If `equity` is a list, the portfolio value at each bar's
+    close is appended to it.
+    """
+    keys = list(sig)
+    n = len(sig["close"])
+    if allow is None:
+        allow = ([True] * n, [True] * n)
+    allow_long = [bool(x) for x in allow[0][start:end]]
+    allow_short = [bool(x) for x in allow[1][start:end]]
+    rows = zip(*[sig[k][start:end].tolist() for k in keys]) if end > start else ()
+
+    engine = new_engine()
+    book = engine.book
+    fills = []
+    if path is not None:
+        path.reset()
+    for row, al, ash in zip(rows, allow_long, allow_short):
+        ctx = dict(zip(keys, row))
+        run_bar(engine, strat, ctx, al, ash, fills, path)
+        if equity is not None:
+            equity.append(book.value(ctx["close"]))
+    return book, fills
+
+def simulate(strat, df, allow=None, path=None):
+    """Vectorized engine: compute every signal column once, then a single pass over the position state.
+
+    Bar j plays the role of ``window.iloc[-2]`` in simulate_loop, so the same bars are visited
+    (WARMUP_BARS - 2 .. len(df) - 3) and the still-open last bar is never traded.
+    """
+    sig = strat.build_signals(df.copy())
+    return run_signals(strat, sig, WARMUP_BARS - 2, len(df) - 2, allow, path=path)
+
+def simulate_many(strategy_names, df, allow=None, path=None):
+    """simulate() for several strategies on the same bars; indicators they share are computed once."""
+    sigs = strategy.build_signals(strategy_names, df.copy())
+    return {n: run_signals(strategy.get(n), sigs[n], WARMUP_BARS - 2, len(df) - 2, allow, path=path)
+            for n in strategy_names}
+
+ENGINES = {"vector": simulate, "loop": simulate_loop}
+
+def summarize(book, fills, last_price: float):
+    # end value with last close
+    pv = book.value(last_price)
+    start = book.start_cash
+    pnl = pv - start
+    closes = [f["realized"] for f in fills if "realized" in f]
+    exits = {}
+    for f in fills:
+        if "realized" in f:
+            kind = f.get("exit", "signal")
+            exits[kind] = exits.get(kind, 0) + 1
+    return {
+        "trades": len(fills),
+        "end_value": pv,
+        "pnl": pnl,
+        "pnl_pct": (pnl / start * 100.0) if start > 0 else 0.0,
+        "realized": book.realized_pnl,
+        "win_rate": (sum(1 for r in closes if r > 0) / len(closes)) if closes else 0.0,
+        "exits": exits,
+        "fills": fills,
+    }
 
-        elif action == "close_long" and state["position"] == "long":
-            paper.close_long(state, price)
-            trades += 1
+def load_path(df, mode: str):
+    """Intrabar path for a backtest over `df` (see trading.intrabar); "1m" downloads the 1m klines."""
+    sub_df = None
+    if mode == "1m":
+        per_bar = interval_ms(config.KLINE_INTERVAL) // 60000
+        sub_df = klines(config.SYMBOL, "1m", (len(df) + 1) * per_bar)
+    return history_path(df, mode, sub_df)
 
-        elif action == "close_short" and state["position"] == "short":
-            paper.close_short(state, price)
-            trades += 1
+def run_backtest(strategy_name: str, limit: int, engine: str = "vector", ema1h: bool = None, intrabar: str = None):
+    return run_backtests([strategy_name], limit, engine, ema1h, intrabar)[strategy_name]
 
-    # end value with last close
-    last_price = float(df.iloc[-1]["close"])
-    pv = paper.portfolio_value(state["paper"], last_price)
-    start = float(state["paper"]["start_cash"])
-    pnl = pv - start
-    pnl_pct = (pnl / start * 100.0) if start > 0 else 0.0
+def run_backtests(strategy_names, limit: int, engine: str = "vector", ema1h: bool = None, intrabar: str = None):
+    """Backtest each strategy on the same bars, 1h filter and intrabar path; {name: result}."""
+    strats = {n: pick_strategy(n) for n in strategy_names}
+    # validate config for backtest run
+    config.validate_config()
+    df = klines(config.SYMBOL, config.KLINE_INTERVAL, limit)
 
-    logger.info(f"Backtest done. strategy={strategy_name} limit={limit} bars interval={config.KLINE_INTERVAL}")
-    logger.info(f"Trades={trades}, EndValue={pv:.2f}, PnL={pnl:.2f} ({pnl_pct:+.2f}%), Realized={state['paper']['realized_pnl']:.2f}")
-    print(f"strategy={strategy_name} bars={limit} trades={trades} end={pv:.2f} pnl={pnl:.2f} ({pnl_pct:+.2f}%) realized={state['paper']['realized_pnl']:.2f}")
+    if ema1h is None:
+        ema1h = config.EMA_FILTER_1H
+    allow = ema1h_allow_arrays(df) if ema1h else None
+    intrabar = intrabar or config.INTRABAR_FILLS
+    path = load_path(df, intrabar)
+
+    if engine == "vector":
+        runs = simulate_many(list(strats), df, allow, path)
+    else:
+        runs = {n: ENGINES[engine](strat, df, allow, path) for n, strat in strats.items()}
+
+    results = {}
+    for strategy_name, (book, fills) in runs.items():
+        result = summarize(book, fills, float(df.iloc[-1]["close"]))
+        result.update(strategy=strategy_name, bars=len(df))
+        trades, pv, pnl, pnl_pct = result["trades"], result["end_value"], result["pnl"], result["pnl_pct"]
+
+        logger.info(f"Backtest done. strategy={strategy_name} limit={limit} bars interval={config.KLINE_INTERVAL} engine={engine} ema1h={ema1h} intrabar={intrabar}")
+        logger.info(f"Trades={trades}, EndValue={pv:.2f}, PnL={pnl:.2f} ({pnl_pct:+.2f}%), Realized={book.realized_pnl:.2f}")
+        exits = " ".join(f"{k}={v}" for k, v in sorted(result["exits"].items()))
+        print(f"strategy={strategy_name} bars={limit} trades={trades} end={pv:.2f} pnl={pnl:.2f} ({pnl_pct:+.2f}%) realized={book.realized_pnl:.2f}"
+              + (f" exits: {exits}" if exits else ""))
+        results[strategy_name] = result
+    return results
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--strategy", choices=["trend", "range"], default="trend")
+    ap.add_argument("--strategy", type=parse_strategies, default=["trend"],
+                    help=f"one or a comma list of {', '.join(strategy.names())}, run on the same bars and indicators")
     ap.add_argument("--limit", type=int, default=config.BACKTEST_KLINES_LIMIT)
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="vector",
+                    help="vector: single pass over precomputed signals; loop: legacy per-bar rebuild")
+    ap.add_argument("--ema1h", choices=["on", "off"], default="on" if config.EMA_FILTER_1H else "off",
+                    help="apply the 1h EMA trend filter (1h bars resampled from the backtest bars)")
+    ap.add_argument("--intrabar", choices=list(MODES), default=config.INTRABAR_FILLS,
+                    help="risk exits against the bar close (off), its high/low (bar) or its 1m klines (1m)")
     args = ap.parse_args()
-    run_backtest(args.strategy, args.limit)
+    run_backtests(args.strategy, args.limit, args.engine, ema1h=args.ema1h == "on", intrabar=args.intrabar)
 
 if __name__ == "__main__":
     main()
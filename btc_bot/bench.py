@@ -0,0 +1,281 @@
+"""Offline benchmarks of the bot's hot paths with machine-readable output.
+
+    python -m btc_bot.bench --out bench.json
+    python -m btc_bot.bench --only backtest --repeat 3 --compare bench.json
+
+Every case runs against synthetic data (market.synthetic): REST calls go to a SyntheticExchange,
+files to a temporary directory. Each case is timed `repeat` times (min/median/mean wall time,
+setup excluded) and then run once more under tracemalloc for its peak Python allocation.
+--compare prints the median ratio to an earlier result file and exits 1 if any case got slower
+than --threshold.
+"""
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from unittest import mock
+import numpy as np
+import pandas as pd
+from . import config
+from .log_setup import setup_logger
+from .market import binance_api
+from .market.kline_store import interval_ms
+from .market.synthetic import SimClock, SyntheticExchange, frame
+
+logger = setup_logger()
+
+SYMBOL = "BTCUSDT"
+
+
+@contextmanager
+def settings(**values):
+    """Temporarily override config module settings."""
+    with mock.patch.multiple(config, **values):
+        yield
+
+
+class Case:
+    def __init__(self, name: str, params: dict, run, setup=None, teardown=None):
+        self.name = name
+        self.params = params
+        self.run = run
+        self.setup = setup or (lambda: None)
+        self.teardown = teardown or (lambda: None)
+
+    @property
+    def key(self) -> str:
+        return self.name + "".join(f"[{k}={v}]" for k, v in self.params.items())
+
+
+def measure(case: Case, repeat: int) -> dict:
+    times = []
+    extra = None
+    for _ in range(repeat):
+        arg = case.setup()
+        t0 = time.perf_counter()
+        extra = case.run(arg)
+        times.append(time.perf_counter() - t0)
+        case.teardown()
+
+    arg = case.setup()
+    tracemalloc.start()
+    try:
+        case.run(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        case.teardown()
+
+    result = {
+        "case": case.key,
+        "name": case.name,
+        "params": case.params,
+        "repeat": repeat,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+        "peak_kib": peak / 1024.0,
+    }
+    # cases may report their own finer-grained metrics (from the last timed run)
+    if isinstance(extra, dict):
+        result.update(extra)
+    return result
+
+
+# ----- cases -----
+
+def klines_cases(sizes):
+    exchange = SyntheticExchange(history=max(sizes) + 10)
+    for n in sizes:
+        def run(_, n=n):
+            with exchange.install(), settings(USE_KLINE_STORE=False):
+                df = binance_api.klines(SYMBOL, "5m", n)
+            assert len(df) == n
+        yield Case("klines_parse", {"bars": n}, run)
+
+        def run_bars(_, n=n):
+            with exchange.install(), settings(USE_KLINE_STORE=False):
+                bars = binance_api.kline_bars(SYMBOL, "5m", n)
+            assert len(bars) == n
+        yield Case("kline_bars", {"bars": n}, run_bars)
+
+
+def context_cases(sizes):
+    from . import strategy
+    for strat_name in strategy.names():
+        strat = strategy.get(strat_name)
+        for n in sizes:
+            df = frame(n, seed=2)
+            yield Case("build_context", {"strategy": strat_name, "bars": n},
+                       lambda d, strat=strat: strat.build_context(d), setup=lambda df=df: df.copy())
+    # every registered strategy on one indicator graph
+    for n in sizes:
+        df = frame(n, seed=2)
+        yield Case("build_contexts", {"strategy": "+".join(strategy.names()), "bars": n},
+                   lambda d: strategy.build_contexts(strategy.names(), d), setup=lambda df=df: df.copy())
+
+
+def backtest_cases(sizes):
+    from . import backtest
+    for n in sizes:
+        df = frame(n, seed=3)
+
+        def run(_, n=n, df=df):
+            # run_backtest downloads its klines; hand it the prebuilt frame instead
+            with mock.patch.object(backtest, "klines", lambda *a, **k: df), redirect_stdout(io.StringIO()):
+                backtest.run_backtest("trend", n)
+        yield Case("run_backtest", {"strategy": "trend", "bars": n}, run)
+
+
+def state_cases(tmp: str):
+    from . import state_store
+    path = os.path.join(tmp, "bench_state.json")
+    state = state_store.load_state(path)
+    counter = iter(range(10**9))
+
+    def changed(_):
+        state["last_bar_ms"] = next(counter)
+        state_store.save_state(state, path)
+
+    yield Case("save_state", {"change": "one_key"}, changed)
+    yield Case("save_state", {"change": "none"}, lambda _: state_store.save_state(state, path))
+    yield Case("load_state", {}, lambda _: state_store.load_state(path))
+
+
+class _Stop(BaseException):
+    """Ends main.main()'s endless loop from inside wait_next (not caught by its `except Exception`)."""
+
+
+def main_loop_case(tmp: str, iterations: int = 30):
+    """Whole main.main() loop iterations against a SyntheticExchange; each iteration sees a new bar."""
+    from . import main as bot
+    from . import ledger
+    step_ms = interval_ms(config.KLINE_INTERVAL)
+
+    def run(_):
+        clock = SimClock(int(time.time() * 1000) // step_ms * step_ms + 2000)
+        exchange = SyntheticExchange(clock, history=3000)
+        marks = [time.perf_counter()]
+
+        def wait_next(stream, state):
+            marks.append(time.perf_counter())
+            if len(marks) > iterations:
+                raise _Stop()
+            clock.advance(step_ms)
+
+        overrides = dict(STATE_FILE=os.path.join(tmp, "bench_main_state.json"),
+                         KLINE_STORE_DIR=os.path.join(tmp, "klines"), LEDGER_FILE=os.path.join(tmp, "ledger.sqlite"),
+                         USE_KLINE_STREAM=False)
+        with settings(**overrides), clock.install(), exchange.install(), \
+                mock.patch.object(bot, "wait_next", wait_next), mock.patch.object(bot.tg, "token", ""), \
+                mock.patch.object(binance_api, "_store", None), mock.patch.object(bot, "_ema1h_filters", {}), \
+                mock.patch.object(ledger, "_ledger", None):
+            try:
+                bot.main()
+            except _Stop:
+                pass
+            finally:
+                if ledger._ledger is not None:
+                    ledger._ledger.close()
+        for f in os.listdir(tmp):
+            if f.startswith(("bench_main_state", "ledger.sqlite")):
+                os.remove(os.path.join(tmp, f))
+        # the first iteration also loads the initial history; later ones are the steady state
+        laps = np.diff(marks)
+        return {"first_iteration_s": float(laps[0]) if len(laps) else None,
+                "steady_iteration_median_s": float(np.median(laps[1:])) if len(laps) > 1 else None}
+
+    yield Case("main_iteration", {"iterations": iterations}, run)
+
+
+def all_cases(tmp: str, quick: bool):
+    if quick:
+        yield from klines_cases([1000])
+        yield from context_cases([800, 20000])
+        yield from backtest_cases([3000, 30000])
+    else:
+        yield from klines_cases([1000, 30000])
+        yield from context_cases([800, 100000])
+        yield from backtest_cases([3000, 30000, 100000])
+    yield from state_cases(tmp)
+    yield from main_loop_case(tmp, 10 if quick else 30)
+
+
+def environment() -> dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except Exception:
+        rev = ""
+    return {
+        "git_rev": rev,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline_file: str, threshold: float) -> bool:
+    """Print current/baseline median ratios; True if any shared case regressed past `threshold`."""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        base = {r["case"]: r for r in json.load(f)["results"]}
+    regressed = False
+    for r in results:
+        b = base.get(r["case"])
+        if b is None:
+            continue
+        ratio = r["median_s"] / b["median_s"] if b["median_s"] > 0 else float("inf")
+        flag = ""
+        if ratio > 1.0 + threshold:
+            flag, regressed = "  REGRESSION", True
+        print(f"{r['case']:<55} {b['median_s'] * 1000:10.2f}ms -> {r['median_s'] * 1000:10.2f}ms  x{ratio:.2f}{flag}")
+    return regressed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline benchmarks of the bot's hot paths")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--only", default="", help="comma list of case names (klines_parse, kline_bars, build_context, ...)")
+    ap.add_argument("--quick", action="store_true", help="smaller sizes")
+    ap.add_argument("--out", default="", help="write results as JSON")
+    ap.add_argument("--compare", default="", help="earlier --out file to compare medians against")
+    ap.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio counted as a regression")
+    args = ap.parse_args()
+
+    only = {s.strip() for s in args.only.split(",") if s.strip()}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, settings(LOG_LEVEL="WARNING"):
+        logger.setLevel("WARNING")
+        for case in all_cases(tmp, args.quick):
+            if only and case.name not in only:
+                continue
+            r = measure(case, args.repeat)
+            results.append(r)
+            print(f"{r['case']:<55} median={r['median_s'] * 1000:10.2f}ms min={r['min_s'] * 1000:10.2f}ms "
+                  f"peak={r['peak_kib'] / 1024:8.1f}MiB", file=sys.stderr)
+
+    doc = {"env": environment(), "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+    else:
+        json.dump(doc, sys.stdout, indent=2)
+        print()
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,7 +27,56 @@ SYMBOL = env_str("SYMBOL", "BTCUSDT")
 KLINE_INTERVAL = env_str("KLINE_INTERVAL", "5m")
 POLL_SEC = env_int("POLL_SEC", 5)
 
+# Multi-symbol runner (python -m btc_bot.multi): "BTCUSDT,ETHUSDT:range" (optional :strategy per symbol)
+SYMBOLS = env_str("SYMBOLS", "")
+MULTI_IO_WORKERS = env_int("MULTI_IO_WORKERS", 16)
+MULTI_CPU_WORKERS = env_int("MULTI_CPU_WORKERS", 4)
+# older name of BAR_CLOSE_DELAY_MS, still honoured as its default
+MULTI_CLOSE_DELAY_MS = env_int("MULTI_CLOSE_DELAY_MS", 1500)
+
+# Bar-close scheduling (REST polling): sleep until BAR_CLOSE_DELAY_MS after the next KLINE_INTERVAL
+# close, then poll every CLOSE_POLL_SEC for up to CLOSE_WINDOW_SEC until the new bar is served.
+# POLL_SEC is only used for intervals without a fixed length.
+BAR_CLOSE_DELAY_MS = env_int("BAR_CLOSE_DELAY_MS", MULTI_CLOSE_DELAY_MS)
+CLOSE_POLL_SEC = env_float("CLOSE_POLL_SEC", 1.0)
+CLOSE_WINDOW_SEC = env_int("CLOSE_WINDOW_SEC", 60)
+# Hold off polling once the IP has used WEIGHT_BACKOFF_PCT of BINANCE_WEIGHT_LIMIT this minute
+BINANCE_WEIGHT_LIMIT = env_int("BINANCE_WEIGHT_LIMIT", 6000)
+WEIGHT_BACKOFF_PCT = env_float("WEIGHT_BACKOFF_PCT", 80.0)
+
+# Push-based ingestion: act when the exchange marks a bar closed, REST polling only while the stream is quiet
+USE_KLINE_STREAM = env_bool("USE_KLINE_STREAM", False)
+KLINE_STREAM_URL = env_str("KLINE_STREAM_URL", "wss://stream.binance.com:9443")
+KLINE_STREAM_STALE_SEC = env_int("KLINE_STREAM_STALE_SEC", 30)
+
 STATE_FILE = env_str("STATE_FILE", "/app/data/state.json")
+# Unchanged state is never rewritten; changes are appended to STATE_FILE.journal and folded into
+# the snapshot every STATE_COMPACT_EVERY records
+STATE_JOURNAL = env_bool("STATE_JOURNAL", True)
+STATE_COMPACT_EVERY = env_int("STATE_COMPACT_EVERY", 288)
+STATE_FSYNC = env_bool("STATE_FSYNC", True)
+
+# Fills and per-bar equity in SQLite (python -m btc_bot.ledger daily|summary|strategies)
+USE_LEDGER = env_bool("USE_LEDGER", True)
+LEDGER_FILE = env_str("LEDGER_FILE", "/app/data/ledger.sqlite")
+LEDGER_BATCH_SIZE = env_int("LEDGER_BATCH_SIZE", 50)
+LEDGER_FLUSH_SEC = env_int("LEDGER_FLUSH_SEC", 300)
+
+# Concurrent requests (price/klines fan-out, overlapped kline paging) over one keep-alive pool
+HTTP_MAX_CONCURRENCY = env_int("HTTP_MAX_CONCURRENCY", 8)
+# REST base URL; point it at python -m btc_bot.market.rest_server to run offline
+BINANCE_REST_URL = env_str("BINANCE_REST_URL", "https://api.binance.com").rstrip("/")
+
+# Bulk history download (python -m btc_bot.history): request weight per minute the downloader may
+# use (Binance allows 6000/min per IP; the rest is left to the live bot), weight of one klines call
+HISTORY_WORKERS = env_int("HISTORY_WORKERS", 8)
+HISTORY_WEIGHT_PER_MIN = env_int("HISTORY_WEIGHT_PER_MIN", 2400)
+HISTORY_RETRIES = env_int("HISTORY_RETRIES", 5)
+KLINES_REQUEST_WEIGHT = env_int("KLINES_REQUEST_WEIGHT", 2)
+
+# Local store of closed candles; klines() only downloads bars newer than the last stored one
+USE_KLINE_STORE = env_bool("USE_KLINE_STORE", True)
+KLINE_STORE_DIR = env_str("KLINE_STORE_DIR", "/app/data/klines")
 
 # ===== Logging =====
 LOG_LEVEL = env_str("LOG_LEVEL", "INFO").upper()
@@ -35,16 +84,41 @@ LOG_TO_FILE = env_bool("LOG_TO_FILE", True)
 LOG_FILE = env_str("LOG_FILE", "/app/data/btc_bot.log")
 LOG_MAX_MB = env_int("LOG_MAX_MB", 5)
 LOG_BACKUP_COUNT = env_int("LOG_BACKUP_COUNT", 3)
+# gzip rotated files (btc_bot.log.1.gz, ...)
+LOG_COMPRESS = env_bool("LOG_COMPRESS", True)
+# text ("time [LEVEL] message") or json (one object per line with symbol/strategy/bar_ms/action/price/latency)
+LOG_FORMAT = env_str("LOG_FORMAT", "text").lower()
+# Format and write on a background thread; the caller only enqueues (up to LOG_QUEUE_SIZE, then drops)
+LOG_ASYNC = env_bool("LOG_ASYNC", True)
+LOG_QUEUE_SIZE = env_int("LOG_QUEUE_SIZE", 10000)
+# High-frequency lines (the [SCRAPE] price) are written at most once per LOG_SAMPLE_SEC per symbol; 0 = all
+LOG_SAMPLE_SEC = env_float("LOG_SAMPLE_SEC", 60.0)
+
+# Prometheus text endpoint (http://METRICS_HOST:METRICS_PORT/metrics); 0 = off, no collection
+METRICS_PORT = env_int("METRICS_PORT", 0)
+METRICS_HOST = env_str("METRICS_HOST", "127.0.0.1")
 
 # ===== Telegram =====
 TG_BOT_TOKEN = os.getenv("TG_BOT_TOKEN", "").strip().strip('"').strip("'")
 TG_CHAT_ID = os.getenv("TG_CHAT_ID", "").strip().strip('"').strip("'")
+# Bot API base URL; the replay harness points it at its local stand-in
+TELEGRAM_API_URL = env_str("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+# Delivery runs on a background thread: bursts within TG_COALESCE_SEC become one message,
+# sends are at least TG_MIN_INTERVAL_SEC apart, at most TG_QUEUE_SIZE messages wait
+TG_ASYNC = env_bool("TG_ASYNC", True)
+TG_QUEUE_SIZE = env_int("TG_QUEUE_SIZE", 100)
+TG_COALESCE_SEC = env_float("TG_COALESCE_SEC", 2.0)
+TG_MIN_INTERVAL_SEC = env_float("TG_MIN_INTERVAL_SEC", 1.0)
+TG_FLUSH_TIMEOUT_SEC = env_float("TG_FLUSH_TIMEOUT_SEC", 10.0)
 
 # ===== Strategy Selection =====
 # trend | range
 STRATEGY = env_str("STRATEGY", "trend")
 
 # ===== Indicators & Filters =====
+# update indicators per closed bar instead of recomputing them over the whole window each poll
+USE_STREAMING_INDICATORS = env_bool("USE_STREAMING_INDICATORS", True)
+
 EMA_5M_PERIOD = env_int("EMA_5M_PERIOD", 20)
 ATR_PERIOD = env_int("ATR_PERIOD", 14)
 
@@ -59,6 +133,9 @@ MIN_ATR_PCT = env_float("MIN_ATR_PCT", 0.003)
 EMA_FILTER_1H = env_bool("EMA_FILTER_1H", True)
 EMA_1H_PERIOD = env_int("EMA_1H_PERIOD", 200)
 EMA_1H_KLINES_LIMIT = env_int("EMA_1H_KLINES_LIMIT", 400)
+# resample: 1h bars built in memory from the KLINE_INTERVAL bars the loop already fetches (no extra
+# requests) | rest: cached 1h klines, refreshed when a 1h bar closes
+EMA_1H_SOURCE = env_str("EMA_1H_SOURCE", "resample")
 
 # ===== Risk / Execution =====
 COOLDOWN_SEC = env_int("COOLDOWN_SEC", 20)
@@ -71,6 +148,9 @@ TP_ATR_MULT = env_float("TP_ATR_MULT", 2.0)
 USE_TRAILING = env_bool("USE_TRAILING", True)
 TRAIL_ATR_MULT = env_float("TRAIL_ATR_MULT", 1.3)
 TRAIL_ACTIVATE_R = env_float("TRAIL_ACTIVATE_R", 1.0)
+# where TP/SL/trailing are checked: off = closed bar's close (default, as before), bar = its
+# high/low, 1m = the 1m klines inside it (first level touched fills at that level); opt-in
+INTRABAR_FILLS = env_str("INTRABAR_FILLS", "off").lower()
 
 # Kill switch
 USE_KILL_SWITCH = env_bool("USE_KILL_SWITCH", True)
@@ -95,5 +175,11 @@ def validate_config():
         raise ValueError("ORDER_PCT must be between 0.0 and 1.0")
     if POLL_SEC <= 0:
         raise ValueError("POLL_SEC must be a positive integer")
+    if CLOSE_POLL_SEC <= 0:
+        raise ValueError("CLOSE_POLL_SEC must be > 0")
+    if LOG_FORMAT not in ("text", "json"):
+        raise ValueError("LOG_FORMAT must be 'text' or 'json'")
+    if INTRABAR_FILLS not in ("off", "bar", "1m"):
+        raise ValueError("INTRABAR_FILLS must be 'off', 'bar' or '1m'")
     if USE_KILL_SWITCH and MAX_DAILY_DD_PCT <= 0:
         raise ValueError("MAX_DAILY_DD_PCT must be > 0 when USE_KILL_SWITCH is enabled")
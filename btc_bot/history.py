@@ -0,0 +1,208 @@
+"""Bulk kline history download into the local kline store.
+
+    python -m btc_bot.history --symbol BTCUSDT --interval 5m --days 730
+    python -m btc_bot.history --start 2023-01-01 --end 2025-01-01 --workers 16
+
+The range is split into 1000-bar chunks (one request each) that --workers threads fetch
+concurrently. Every request first takes its weight from a token bucket refilled at
+HISTORY_WEIGHT_PER_MIN per minute; the exchange's X-MBX-USED-WEIGHT-1M header and 429/418
+Retry-After answers pause the bucket for everyone. Failed chunks are retried with backoff.
+Each finished chunk is written to <KLINE_STORE_DIR>/download/<SYMBOL>_<interval>/ right away, so
+a rerun after an interruption only fetches what is missing; once all chunks are there they are
+merged into the store file that klines() and the backtests read.
+
+Offline: python -m btc_bot.market.rest_server, then BINANCE_REST_URL=http://127.0.0.1:9444.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from . import config
+from .http import TokenBucket, get_session
+from .log_setup import setup_logger
+from .market import binance_api
+from .market.bars import loads
+from .market.kline_store import BAR_DTYPE, interval_ms, rows_to_array
+
+logger = setup_logger()
+
+CHUNK_BARS = 1000
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class Downloader:
+    """Concurrent, resumable download of one (symbol, interval) range of closed bars."""
+
+    def __init__(self, symbol: str, interval: str, start_ms: int, end_ms: int, workers: int = None,
+                 weight_per_min: int = None, retries: int = None, session=None, store=None):
+        self.symbol = symbol.upper()
+        self.interval = interval
+        self.step = interval_ms(interval)
+        if not self.step:
+            raise ValueError(f"interval {interval} has no fixed length")
+        self.start_ms = int(start_ms)
+        self.end_ms = int(end_ms)
+        self.workers = workers or config.HISTORY_WORKERS
+        self.weight = config.KLINES_REQUEST_WEIGHT
+        self.weight_per_min = weight_per_min or config.HISTORY_WEIGHT_PER_MIN
+        self.retries = config.HISTORY_RETRIES if retries is None else retries
+        # a few requests of burst; the steady rate is the per-minute budget
+        self.bucket = TokenBucket(self.weight_per_min / 60.0, max(self.weight, self.weight * self.workers))
+        self.session = session or get_session(retries=0, pool_maxsize=self.workers, status_forcelist=())
+        self.store = store or binance_api._kline_store()
+        self.dir = os.path.join(self.store.root, "download", f"{self.symbol}_{interval}")
+        self.requests = 0
+        self.retried = 0
+        self._lock = threading.Lock()
+
+    def chunks(self) -> list:
+        """(first_open, last_open) of every chunk; only bars that are closed by now are included."""
+        first = -(-self.start_ms // self.step) * self.step
+        last = min(self.end_ms - self.step, int(time.time() * 1000) - self.step) // self.step * self.step
+        span = CHUNK_BARS * self.step
+        return [(s, min(s + span - self.step, last)) for s in range(first, last + 1, span)]
+
+    def chunk_path(self, chunk) -> str:
+        # the last open is part of the name: a tail chunk cut short by "now" is fetched again later
+        return os.path.join(self.dir, f"{chunk[0]}_{chunk[1]}.bin")
+
+    def pending(self) -> list:
+        return [c for c in self.chunks() if not os.path.exists(self.chunk_path(c))]
+
+    def _request(self, first_open: int, last_open: int) -> np.ndarray:
+        self.bucket.take(self.weight)
+        params = {"symbol": self.symbol, "interval": self.interval, "limit": CHUNK_BARS,
+                  "startTime": first_open, "endTime": last_open + self.step - 1}
+        r = self.session.get(binance_api.klines_url(), params=params, timeout=30)
+        with self._lock:
+            self.requests += 1
+
+        used = r.headers.get("X-MBX-USED-WEIGHT-1M")
+        if used is not None and int(used) >= self.weight_per_min:
+            # the IP-wide budget is spent (the live bot counts too): wait for the next minute
+            self.bucket.pause(60.0 - time.time() % 60 + 0.5)
+        if r.status_code in (418, 429):
+            retry_after = float(r.headers.get("Retry-After", 60))
+            self.bucket.pause(retry_after)
+            raise RateLimited(retry_after)
+        r.raise_for_status()
+        data = loads(r.content)
+        if isinstance(data, dict) and "code" in data:
+            raise RuntimeError(f"Binance klines error: {data}")
+        return rows_to_array(data)
+
+    def _fetch_chunk(self, chunk) -> int:
+        first_open, last_open = chunk
+        for attempt in range(self.retries + 1):
+            try:
+                arr = self._request(first_open, last_open)
+                break
+            except Exception as exc:
+                if attempt == self.retries:
+                    raise
+                with self._lock:
+                    self.retried += 1
+                if not isinstance(exc, RateLimited):
+                    # rate limits wait in the bucket; other errors back off with jitter
+                    time.sleep(min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+                logger.warning(f"[HISTORY] chunk {first_open} attempt {attempt + 1} failed: {exc}")
+
+        arr = arr[(arr["open_time"] >= first_open) & (arr["open_time"] <= last_open)]
+        # an empty chunk (before listing, maintenance) is written too, so it counts as done
+        target = self.chunk_path(chunk)
+        tmp_path = target + ".tmp"
+        with open(tmp_path, "wb") as f:
+            arr.tofile(f)
+        os.replace(tmp_path, target)
+        return len(arr)
+
+    def download(self, progress_every: int = 50) -> list:
+        """Fetch every missing chunk; returns the chunks that still failed after all retries."""
+        os.makedirs(self.dir, exist_ok=True)
+        todo = self.pending()
+        total = len(self.chunks())
+        logger.info(f"[HISTORY] {self.symbol} {self.interval}: {total - len(todo)}/{total} chunks on disk, "
+                    f"fetching {len(todo)} with {self.workers} workers")
+        failed = []
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="history") as pool:
+            futures = {pool.submit(self._fetch_chunk, c): c for c in todo}
+            for f in as_completed(futures):
+                done += 1
+                if f.exception() is not None:
+                    failed.append(futures[f])
+                    logger.error(f"[HISTORY] chunk {futures[f][0]} failed: {f.exception()}")
+                if done % progress_every == 0 or done == len(todo):
+                    logger.info(f"[HISTORY] {done}/{len(todo)} chunks, {self.requests} requests, "
+                                f"{self.retried} retries")
+        return sorted(failed)
+
+    def merge(self, keep_chunks: bool = False) -> np.ndarray:
+        """Fold the downloaded chunks into the kline store file; returns the stored bars."""
+        parts = [np.fromfile(self.chunk_path(c), dtype=BAR_DTYPE) for c in self.chunks()
+                 if os.path.exists(self.chunk_path(c))]
+        new = np.concatenate(parts) if parts else np.empty(0, dtype=BAR_DTYPE)
+        with self.store.lock(self.symbol, self.interval):
+            old = self.store.read(self.symbol, self.interval)
+            # stored bars win over downloaded ones with the same open time
+            merged = np.concatenate([old, new])
+            order = np.argsort(merged["open_time"], kind="stable")
+            merged = merged[order]
+            keep = np.concatenate(([True], np.diff(merged["open_time"]) != 0)) if len(merged) else np.ones(0, bool)
+            merged = self.store.write(self.symbol, self.interval, merged[keep])
+        if not keep_chunks:
+            for name in os.listdir(self.dir):
+                os.remove(os.path.join(self.dir, name))
+            os.rmdir(self.dir)
+        return merged
+
+
+def parse_time(value: str) -> int:
+    """Epoch ms from "2024-01-31", "2024-01-31T12:00" (UTC) or a plain ms number."""
+    if value.isdigit():
+        return int(value)
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Bulk kline history download into the local kline store")
+    ap.add_argument("--symbol", default=config.SYMBOL)
+    ap.add_argument("--interval", default=config.KLINE_INTERVAL)
+    ap.add_argument("--days", type=float, default=365.0, help="history length when --start is not given")
+    ap.add_argument("--start", default="", help="UTC date/time or epoch ms")
+    ap.add_argument("--end", default="", help="UTC date/time or epoch ms (default now)")
+    ap.add_argument("--workers", type=int, default=config.HISTORY_WORKERS)
+    ap.add_argument("--weight-per-min", type=int, default=config.HISTORY_WEIGHT_PER_MIN)
+    ap.add_argument("--keep-chunks", action="store_true", help="keep the per-chunk files after merging")
+    args = ap.parse_args()
+
+    end_ms = parse_time(args.end) if args.end else int(time.time() * 1000)
+    start_ms = parse_time(args.start) if args.start else int(end_ms - args.days * 24 * 60 * 60 * 1000)
+    dl = Downloader(args.symbol, args.interval, start_ms, end_ms, args.workers, args.weight_per_min)
+
+    t0 = time.perf_counter()
+    failed = dl.download()
+    if failed:
+        print(f"{len(failed)} chunks failed after {dl.retries} retries; run again to resume")
+        sys.exit(1)
+    stored = dl.merge(args.keep_chunks)
+    elapsed = time.perf_counter() - t0
+    print(f"{dl.symbol} {dl.interval}: {len(stored)} bars in store ({dl.requests} requests, "
+          f"{dl.retried} retries, {elapsed:.1f}s) -> {dl.store.path(dl.symbol, dl.interval)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,171 @@
+import time
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util import Retry
+from . import metrics
 
 
-def get_session(retries: int = 3, backoff_factor: float = 0.5):
+class CountingRetry(Retry):
+    """Retry policy that also counts each retry in the metrics."""
+
+    def increment(self, *args, **kwargs):
+        metrics.inc("btc_bot_http_retries_total")
+        return super().increment(*args, **kwargs)
+
+
+def get_session(retries: int = 3, backoff_factor: float = 0.5, pool_maxsize: int = 10,
+                status_forcelist=(429, 500, 502, 503, 504)):
     """Return a requests.Session configured with retry/backoff for common transient errors."""
     session = requests.Session()
     # urllib3 older versions used `method_whitelist` instead of `allowed_methods`.
     # Try the modern arg first, fall back if it raises TypeError.
     try:
-        retry = Retry(
+        retry = CountingRetry(
             total=retries,
             read=retries,
             connect=retries,
             backoff_factor=backoff_factor,
-            status_forcelist=(429, 500, 502, 503, 504),
+            status_forcelist=status_forcelist,
             allowed_methods=("GET", "POST"),
         )
     except TypeError:
-        retry = Retry(
+        retry = CountingRetry(
             total=retries,
             read=retries,
             connect=retries,
             backoff_factor=backoff_factor,
-            status_forcelist=(429, 500, 502, 503, 504),
+            status_forcelist=status_forcelist,
             method_whitelist=("GET", "POST"),
         )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=pool_maxsize)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
+    session.hooks["response"].append(lambda r, *args, **kwargs: metrics.observe_response(r))
+    session.hooks["response"].append(lambda r, *args, **kwargs: used_weight.observe(r))
     return session
+
+
+_shared = None
+_executor = None
+_lock = threading.Lock()
+
+
+def shared_session():
+    """Process-wide keep-alive session; its urllib3 pools are thread-safe, so fan-out threads share it."""
+    global _shared
+    if _shared is None:
+        with _lock:
+            if _shared is None:
+                from . import config
+                _shared = get_session(pool_maxsize=max(10, config.HTTP_MAX_CONCURRENCY))
+    return _shared
+
+
+def fan_out(*calls):
+    """Run zero-argument callables concurrently on a shared thread pool; results in call order.
+
+    The first exception raised by any call is re-raised after all of them finished.
+    """
+    global _executor
+    # nested fan-out from a pool thread runs inline so the pool can never deadlock on itself
+    if len(calls) <= 1 or threading.current_thread().name.startswith("http"):
+        return [c() for c in calls]
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                from . import config
+                _executor = ThreadPoolExecutor(max_workers=config.HTTP_MAX_CONCURRENCY, thread_name_prefix="http")
+    futures = [_executor.submit(c) for c in calls]
+    errors = [f.exception() for f in futures]
+    for e in errors:
+        if e is not None:
+            raise e
+    return [f.result() for f in futures]
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second up to `capacity`.
+
+    take(n) blocks until n tokens are available; pause(seconds) stops handing out tokens for a
+    while (e.g. after a 429 with Retry-After) and empties the bucket.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.blocked_until = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def take(self, n: float = 1.0) -> float:
+        """Block until `n` tokens are taken; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= n:
+                    self.tokens -= n
+                    return waited
+                wait = max(self.blocked_until - now, (n - self.tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self._last = now
+
+
+class UsedWeight:
+    """Binance request weight this IP has used in the current minute, from X-MBX-USED-WEIGHT-1M.
+
+    Every Binance response (BINANCE_REST_URL's host) of a get_session() session updates it, and
+    418/429 answers record the Retry-After ban; other hosts (Telegram) have their own limits.
+    backoff() says how long to hold off so the next poll does not push the IP over the limit.
+    Weight resets at the start of each UTC minute.
+    """
+
+    def __init__(self):
+        self.used = 0
+        self.minute = None
+        self.banned_until = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, r):
+        from . import config
+        if urlsplit(r.url).netloc != urlsplit(config.BINANCE_REST_URL).netloc:
+            return
+        now = time.time()
+        used = r.headers.get("X-MBX-USED-WEIGHT-1M")
+        with self._lock:
+            if used is not None:
+                self.used, self.minute = int(used), int(now // 60)
+            if r.status_code in (418, 429):
+                self.banned_until = max(self.banned_until, now + float(r.headers.get("Retry-After", 60)))
+
+    def current(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        return self.used if self.minute == int(now // 60) else 0
+
+    def backoff(self, limit: int, threshold_pct: float, now: float = None) -> float:
+        """Seconds to wait before the next request: the rest of a ban, or of the minute once
+        `threshold_pct` of `limit` is used; 0.0 when there is headroom."""
+        now = time.time() if now is None else now
+        wait = max(0.0, self.banned_until - now)
+        if self.current(now) >= limit * threshold_pct / 100.0:
+            wait = max(wait, 60.0 - now % 60 + 0.5)
+        return wait
+
+
+used_weight = UsedWeight()
@@ -0,0 +1,264 @@
+"""Trade and equity ledger in SQLite (WAL), with a reporting CLI.
+
+    python -m btc_bot.ledger daily --symbol BTCUSDT
+    python -m btc_bot.ledger summary
+    python -m btc_bot.ledger strategies
+
+The live bot records every paper fill and one equity sample per processed bar. Rows are buffered
+and written in one transaction once LEDGER_BATCH_SIZE rows are pending, LEDGER_FLUSH_SEC have
+passed, a fill happened, or a query needs them. Days are Asia/Bangkok days, as for the kill switch.
+"""
+import os
+import time
+import atexit
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from . import config
+
+DAY_TZ = ZoneInfo("Asia/Bangkok")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY,
+    ts_ms INTEGER NOT NULL,
+    bar_close_ms INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    action TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    price REAL NOT NULL,
+    fill REAL NOT NULL,
+    qty REAL NOT NULL,
+    fee REAL NOT NULL,
+    realized REAL,
+    value_after REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fills_symbol_ts ON fills (symbol, bar_close_ms);
+CREATE INDEX IF NOT EXISTS fills_strategy_ts ON fills (strategy, bar_close_ms);
+
+CREATE TABLE IF NOT EXISTS equity (
+    symbol TEXT NOT NULL,
+    bar_close_ms INTEGER NOT NULL,
+    strategy TEXT NOT NULL,
+    price REAL NOT NULL,
+    value REAL NOT NULL,
+    cash REAL NOT NULL,
+    position TEXT NOT NULL,
+    PRIMARY KEY (symbol, bar_close_ms)
+) WITHOUT ROWID;
+"""
+
+
+def day_start_ms(day: str) -> int:
+    """Epoch ms of 00:00 Asia/Bangkok on `day` ("2026-02-03")."""
+    return int(datetime.fromisoformat(day).replace(tzinfo=DAY_TZ).timestamp() * 1000)
+
+
+def _day_offset_sec() -> int:
+    # Asia/Bangkok has no DST, so one offset is valid for every row
+    return int(datetime.now(DAY_TZ).utcoffset().total_seconds())
+
+
+class Ledger:
+    def __init__(self, path: str, batch_size: int = None, flush_sec: float = None):
+        self.path = path
+        self.batch_size = batch_size or config.LEDGER_BATCH_SIZE
+        self.flush_sec = config.LEDGER_FLUSH_SEC if flush_sec is None else flush_sec
+        # one connection shared by the multi runner's threads, serialized by the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.RLock()
+        self._fills = []
+        self._equity = []
+        self._last_flush = time.monotonic()
+
+    def record_fill(self, symbol: str, strategy: str, bar_close_ms: int, action: str, reason: str,
+                    price: float, result: dict, value_after: float):
+        """`result` is what paper.open_long/close_long/... returned."""
+        row = (int(time.time() * 1000), int(bar_close_ms), symbol, strategy, action, reason, float(price),
+               float(result["fill"]), float(result["qty"]), float(result["fee"]),
+               None if result.get("realized") is None else float(result["realized"]), float(value_after))
+        with self.lock:
+            self._fills.append(row)
+            self.flush()
+
+    def record_equity(self, symbol: str, strategy: str, bar_close_ms: int, price: float, paper_state: dict,
+                      position: str, value: float):
+        row = (symbol, int(bar_close_ms), strategy, float(price), float(value),
+               float(paper_state["cash"]), position)
+        with self.lock:
+            self._equity.append(row)
+            if (len(self._equity) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_sec):
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self._fills and not self._equity:
+                return
+            with self.conn:
+                if self._fills:
+                    self.conn.executemany(
+                        "INSERT INTO fills (ts_ms, bar_close_ms, symbol, strategy, action, reason, price, fill,"
+                        " qty, fee, realized, value_after) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", self._fills)
+                if self._equity:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO equity VALUES (?,?,?,?,?,?,?)", self._equity)
+            self._fills.clear()
+            self._equity.clear()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.conn.close()
+
+    def _query(self, sql: str, params=()):
+        with self.lock:
+            self.flush()
+            return self.conn.execute(sql, params).fetchall()
+
+    # ----- queries -----
+
+    def value_at(self, symbol: str, ts_ms: int):
+        """Portfolio value at `ts_ms`: the last sample before it, else the first one at/after it (None if empty)."""
+        row = self._query("SELECT value FROM equity WHERE symbol=? AND bar_close_ms<? "
+                          "ORDER BY bar_close_ms DESC LIMIT 1", (symbol, int(ts_ms)))
+        if not row:
+            row = self._query("SELECT value FROM equity WHERE symbol=? AND bar_close_ms>=? "
+                              "ORDER BY bar_close_ms LIMIT 1", (symbol, int(ts_ms)))
+        return float(row[0][0]) if row else None
+
+    def day_start_value(self, symbol: str, day: str):
+        return self.value_at(symbol, day_start_ms(day))
+
+    def symbols(self):
+        return [r[0] for r in self._query("SELECT DISTINCT symbol FROM equity ORDER BY symbol")]
+
+    def daily(self, symbol: str, since_ms: int = 0):
+        """[{day, close_value, pnl, pnl_pct, realized, fills}] per Asia/Bangkok day."""
+        off = _day_offset_sec()
+        closes = self._query(
+            "SELECT date(bar_close_ms / 1000 + ?, 'unixepoch') AS day, value, MAX(bar_close_ms) "
+            "FROM equity WHERE symbol=? AND bar_close_ms>=? GROUP BY day ORDER BY day",
+            (off, symbol, int(since_ms)))
+        per_day = {r[0]: (r[1] or 0.0, r[2]) for r in self._query(
+            "SELECT date(bar_close_ms / 1000 + ?, 'unixepoch') AS day, SUM(realized), COUNT(*) "
+            "FROM fills WHERE symbol=? AND bar_close_ms>=? GROUP BY day",
+            (off, symbol, int(since_ms)))}
+        rows = []
+        prev = self.value_at(symbol, day_start_ms(closes[0][0])) if closes else None
+        for day, value, _ in closes:
+            realized, n = per_day.get(day, (0.0, 0))
+            pnl = value - prev
+            rows.append({"day": day, "close_value": value, "pnl": pnl,
+                         "pnl_pct": pnl / prev * 100.0 if prev else 0.0, "realized": realized, "fills": n})
+            prev = value
+        return rows
+
+    def max_drawdown(self, symbol: str, since_ms: int = 0):
+        """(max drawdown %, peak bar_close_ms, trough bar_close_ms) over the equity samples."""
+        rows = self._query(
+            "SELECT bar_close_ms, value, MAX(value) OVER (ORDER BY bar_close_ms) FROM equity "
+            "WHERE symbol=? AND bar_close_ms>=? ORDER BY bar_close_ms", (symbol, int(since_ms)))
+        worst, peak_ms, trough_ms = 0.0, None, None
+        last_peak_ms = None
+        for ts, value, peak in rows:
+            if value >= peak:
+                last_peak_ms = ts
+            dd = (peak - value) / peak * 100.0 if peak > 0 else 0.0
+            if dd > worst:
+                worst, peak_ms, trough_ms = dd, last_peak_ms, ts
+        return worst, peak_ms, trough_ms
+
+    def strategy_stats(self, symbol: str = None, since_ms: int = 0):
+        """Per (symbol, strategy): fills, closed trades, wins, win rate, realized PnL and fees."""
+        where, params = "bar_close_ms>=?", [int(since_ms)]
+        if symbol:
+            where += " AND symbol=?"
+            params.append(symbol)
+        rows = self._query(
+            "SELECT symbol, strategy, COUNT(*), COUNT(realized), SUM(realized > 0), "
+            f"COALESCE(SUM(realized), 0), SUM(fee) FROM fills WHERE {where} "
+            "GROUP BY symbol, strategy ORDER BY symbol, strategy", params)
+        return [{"symbol": s, "strategy": st, "fills": n, "closed": closed, "wins": wins or 0,
+                 "win_rate": (wins or 0) / closed * 100.0 if closed else 0.0, "realized": realized, "fees": fees}
+                for s, st, n, closed, wins, realized, fees in rows]
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """Process-wide ledger at LEDGER_FILE (./data fallback like the state file); None if USE_LEDGER is off."""
+    global _ledger
+    if not config.USE_LEDGER:
+        return None
+    with _ledger_lock:
+        if _ledger is None:
+            path = config.LEDGER_FILE
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            except PermissionError:
+                fallback_dir = os.path.join(os.getcwd(), "data")
+                os.makedirs(fallback_dir, exist_ok=True)
+                path = config.LEDGER_FILE = os.path.join(fallback_dir, os.path.basename(path))
+            _ledger = Ledger(path)
+            atexit.register(_ledger.close)
+        return _ledger
+
+
+def _fmt_ms(ms):
+    if ms is None:
+        return "-"
+    return datetime.fromtimestamp(ms / 1000, DAY_TZ).strftime("%Y-%m-%d %H:%M")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Reports from the trade/equity ledger")
+    ap.add_argument("report", choices=["daily", "summary", "strategies"])
+    ap.add_argument("--symbol", default="", help="default: every symbol in the ledger")
+    ap.add_argument("--days", type=int, default=0, help="only the last N days (0 = all)")
+    ap.add_argument("--db", default=config.LEDGER_FILE)
+    args = ap.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"no ledger at {args.db}")
+    led = Ledger(args.db)
+    since_ms = 0
+    if args.days:
+        since_ms = day_start_ms((datetime.now(DAY_TZ) - timedelta(days=args.days - 1)).date().isoformat())
+    symbols = [args.symbol.upper()] if args.symbol else led.symbols()
+
+    if args.report == "strategies":
+        for r in led.strategy_stats(args.symbol.upper() or None, since_ms):
+            print(f"{r['symbol']:<10} {r['strategy']:<6} fills={r['fills']} closed={r['closed']} "
+                  f"win_rate={r['win_rate']:.1f}% realized={r['realized']:,.2f} fees={r['fees']:,.2f}")
+        return
+
+    for sym in symbols:
+        if args.report == "daily":
+            print(sym)
+            for r in led.daily(sym, since_ms):
+                print(f"  {r['day']} value={r['close_value']:,.2f} pnl={r['pnl']:+,.2f} ({r['pnl_pct']:+.2f}%) "
+                      f"realized={r['realized']:+,.2f} fills={r['fills']}")
+        else:
+            days = led.daily(sym, since_ms)
+            dd, peak_ms, trough_ms = led.max_drawdown(sym, since_ms)
+            stats = led.strategy_stats(sym, since_ms)
+            closed = sum(s["closed"] for s in stats)
+            wins = sum(s["wins"] for s in stats)
+            pnl = sum(d["pnl"] for d in days)
+            print(f"{sym} days={len(days)} pnl={pnl:+,.2f} realized={sum(s['realized'] for s in stats):+,.2f} "
+                  f"trades={closed} win_rate={(wins / closed * 100.0) if closed else 0.0:.1f}% "
+                  f"max_dd={dd:.2f}% ({_fmt_ms(peak_ms)} -> {_fmt_ms(trough_ms)})")
+
+
+if __name__ == "__main__":
+    main()
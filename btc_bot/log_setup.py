@@ -1,54 +1,180 @@
+"""The "btc-bot" logger.
+
+With LOG_ASYNC (the default) the logger's only handler is a QueueHandler: the calling thread
+puts the record on a bounded queue and returns, and a QueueListener thread formats it and writes
+the console and file output (including rotation and gzip compression of rotated files), so log
+I/O never adds to the trading loop's decision latency. When the queue is full the record is
+dropped and counted rather than blocking. The listener drains the queue at interpreter exit.
+
+LOG_FORMAT=json writes one JSON object per line. Structured fields given with
+`extra={"symbol": ..., "action": ...}` (FIELDS) become keys of that object, so the logs can be
+filtered without parsing messages. High-frequency lines pass `extra={"sample": key}` and are
+written at most once per LOG_SAMPLE_SEC per key; the next line written reports how many were
+skipped.
+"""
 import os
+import json
+import gzip
+import queue
+import atexit
+import shutil
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from . import config
+from . import metrics
+
+# structured fields callers may pass with extra=; written as JSON keys when present
+FIELDS = ("symbol", "strategy", "bar_ms", "action", "price", "latency")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        for name in FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                out[name] = value
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            out["suppressed"] = suppressed
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The plain "time [LEVEL] message" lines, with a note of sampled-out repeats."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (+{suppressed} suppressed)" if suppressed else text
+
+
+class SampleFilter(logging.Filter):
+    """Passes a record with a `sample` key at most once per `interval` seconds per key."""
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._skipped = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or self.interval <= 0:
+            return True
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and record.created - last < self.interval:
+                self._skipped[key] = self._skipped.get(key, 0) + 1
+                metrics.inc("btc_bot_log_records_total", result="suppressed")
+                return False
+            self._last[key] = record.created
+            record.suppressed = self._skipped.pop(key, 0)
+        return True
+
+
+class AsyncHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener and never blocks on a full queue."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # same process: the record (exc_info included) is handed over as is and formatted by the listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("btc_bot_log_records_total", result="dropped")
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_handler(path: str) -> RotatingFileHandler:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fh = RotatingFileHandler(
+        path,
+        maxBytes=config.LOG_MAX_MB * 1024 * 1024,
+        backupCount=config.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    if config.LOG_COMPRESS:
+        # btc_bot.log.1.gz, btc_bot.log.2.gz, ...
+        fh.namer = lambda name: name + ".gz"
+        fh.rotator = _gzip_rotator
+    return fh
+
+
+def stop_listener():
+    """Write out everything queued so far and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logger():
+    global _listener
     logger = logging.getLogger("btc-bot")
     logger.setLevel(getattr(logging, config.LOG_LEVEL, logging.INFO))
 
-    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-
     # Avoid duplicate handlers on reload
     if logger.handlers:
         return logger
 
-    ch = logging.StreamHandler()
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
+    if config.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter("%(asctime)s [%(levelname)s] %(message)s")
 
+    handlers = [logging.StreamHandler()]
+    fallback = None
     if config.LOG_TO_FILE:
-        log_dir = os.path.dirname(config.LOG_FILE) or "."
         try:
-            os.makedirs(log_dir, exist_ok=True)
-            fh = RotatingFileHandler(
-                config.LOG_FILE,
-                maxBytes=config.LOG_MAX_MB * 1024 * 1024,
-                backupCount=config.LOG_BACKUP_COUNT,
-                encoding="utf-8",
-            )
-            fh.setFormatter(formatter)
-            logger.addHandler(fh)
+            handlers.append(_file_handler(config.LOG_FILE))
         except PermissionError:
             # Fallback to a local ./data directory if the configured path is not writable (e.g. running locally
             # without /app mounted). Update config.LOG_FILE so other parts of the app use the same fallback.
-            fallback_dir = os.path.join(os.getcwd(), "data")
+            fallback_file = os.path.join(os.getcwd(), "data", os.path.basename(config.LOG_FILE))
             try:
-                os.makedirs(fallback_dir, exist_ok=True)
-                fallback_file = os.path.join(fallback_dir, os.path.basename(config.LOG_FILE))
+                handlers.append(_file_handler(fallback_file))
                 config.LOG_FILE = fallback_file
-                fh = RotatingFileHandler(
-                    config.LOG_FILE,
-                    maxBytes=config.LOG_MAX_MB * 1024 * 1024,
-                    backupCount=config.LOG_BACKUP_COUNT,
-                    encoding="utf-8",
-                )
-                fh.setFormatter(formatter)
-                logger.addHandler(fh)
-                logger.warning(f"Log directory not writable, falling back to {config.LOG_FILE}")
-            except Exception:
-                # If even the fallback fails, continue without file logging but keep console logging.
-                logger.exception("Failed to initialize file logger; continuing with console logger only")
+                fallback = True
+            except Exception as e:
+                fallback = e
+    for h in handlers:
+        h.setFormatter(formatter)
+
+    # sampling runs in the calling thread, so skipped lines never reach the queue
+    logger.addFilter(SampleFilter(config.LOG_SAMPLE_SEC))
+    if config.LOG_ASYNC:
+        q = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+        logger.addHandler(AsyncHandler(q))
+        _listener = QueueListener(q, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_listener)
+    else:
+        for h in handlers:
+            logger.addHandler(h)
 
+    if fallback is True:
+        logger.warning(f"Log directory not writable, falling back to {config.LOG_FILE}")
+    elif fallback is not None:
+        # If even the fallback fails, continue without file logging but keep console logging.
+        logger.error("Failed to initialize file logger; continuing with console logger only", exc_info=fallback)
     logger.info("Logger initialized")
     return logger
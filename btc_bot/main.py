@@ -1,46 +1,56 @@
 import time
 from . import config
+from . import metrics
 from .log_setup import setup_logger
+from .http import fan_out
+from .scheduler import BarScheduler
 from .telegram_client import TelegramClient
 from .state_store import load_state, save_state
-from .market.binance_api import spot_price, klines
-from .market.indicators import ema
+from .ledger import get_ledger
+from .market.binance_api import spot_price, kline_bars
+from .market.kline_stream import KlineStream
+from .market.resample import timeframes
+from .market.trend_filter import Ema1hFilter
 from .trading import paper
-from .strategy import trend_breakout_5m, range_reversion_5m
+from .trading.engine import DecisionEngine
+from .trading.intrabar import bar_path
+from .market.kline_store import interval_ms
+from . import strategy
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
 logger = setup_logger()
 tg = TelegramClient()
 
-def pick_strategy():
-    if config.STRATEGY == "trend":
-        return trend_breakout_5m, "trend"
-    if config.STRATEGY == "range":
-        return range_reversion_5m, "range"
-    raise ValueError("STRATEGY must be 'trend' or 'range'")
+def pick_strategy(name: str = None):
+    name = name or config.STRATEGY
+    return strategy.get(name), name
 
-def ema1h_filter_allow(symbol: str):
-    if not config.EMA_FILTER_1H:
-        return True, True, None
+_ema1h_filters = {}
 
-    df = klines(symbol, "1h", config.EMA_1H_KLINES_LIMIT)
-    if len(df) < config.EMA_1H_PERIOD + 5:
+def _ema1h_filter(symbol: str):
+    # cached per symbol; 1h data is only re-read when a new 1h bar has closed
+    f = _ema1h_filters.get(symbol)
+    if f is None:
+        f = _ema1h_filters[symbol] = Ema1hFilter(symbol)
+    return f
+
+def ema1h_filter_allow(symbol: str, price: float):
+    if not config.EMA_FILTER_1H:
         return True, True, None
+    return _ema1h_filter(symbol).allow(price)
 
-    e = float(ema(df["close"], config.EMA_1H_PERIOD).iloc[-1])
-    p = float(df["close"].iloc[-1])
-    allow_long = p > e
-    allow_short = p < e
-    return allow_long, allow_short, e
+def ema1h_prefetch(symbol: str):
+    if config.EMA_FILTER_1H:
+        _ema1h_filter(symbol).maybe_refresh()
 
-def notify_summary(state, price_now: float, title: str):
+def notify_summary(state, price_now: float, title: str, symbol: str = None):
     pv = paper.portfolio_value(state["paper"], price_now)
     start = float(state["paper"]["start_cash"])
     pnl = pv - start
     pnl_pct = (pnl / start * 100.0) if start > 0 else 0.0
     msg = (
-        f"{title}\n"
+        f"{title}" + (f" | {symbol}" if symbol else "") + "\n"
         f"Now: {price_now:,.2f}\n"
         f"Cash: {float(state['paper']['cash']):,.2f}\n"
         f"Pos: {state['position']}\n"
@@ -50,7 +60,157 @@ def notify_summary(state, price_now: float, title: str):
         f"PnL: {pnl:,.2f} ({pnl_pct:+.2f}%)\n"
         f"Realized: {float(state['paper']['realized_pnl']):,.2f} Trades: {int(state['paper']['trades'])}"
     )
-    tg.send(msg)
+    with metrics.timer("telegram"):
+        tg.send(msg)
+
+def record_fill(state, ctx, symbol: str, strat_name: str, action: str, reason: str, result: dict):
+    led = get_ledger()
+    if led is None:
+        return
+    try:
+        price = float(ctx["close"])
+        led.record_fill(symbol, strat_name, ctx["bar_close_ms"], action, reason, price, result,
+                        paper.portfolio_value(state["paper"], price))
+    except Exception:
+        # the ledger is reporting only; never let it stop trading
+        logger.exception("Ledger write failed")
+
+def record_equity(state, ctx, symbol: str, strat_name: str, price: float):
+    led = get_ledger()
+    if led is None:
+        return
+    try:
+        led.record_equity(symbol, strat_name, ctx["bar_close_ms"], price, state["paper"], state["position"],
+                          paper.portfolio_value(state["paper"], price))
+    except Exception:
+        logger.exception("Ledger write failed")
+
+def day_start_value(symbol: str, today: str, pv: float) -> float:
+    """Value at the start of `today` from the ledger's equity samples (current value if none)."""
+    led = get_ledger()
+    if led is None:
+        return pv
+    try:
+        v = led.day_start_value(symbol, today)
+    except Exception:
+        logger.exception("Ledger read failed")
+        v = None
+    return pv if v is None else v
+
+def intrabar_path(symbol: str, bars, state):
+    """Price path of the last closed bar for intrabar risk exits (None with INTRABAR_FILLS=off).
+
+    1m klines are only fetched while a position is open."""
+    mode = config.INTRABAR_FILLS
+    if mode == "off":
+        return None
+    sub_df = None
+    if mode == "1m" and state["position"] != "flat":
+        per_bar = interval_ms(config.KLINE_INTERVAL) // 60000
+        sub_df = kline_bars(symbol, "1m", per_bar + 2)
+    return bar_path(bars, sub_df)
+
+_scheduler = None
+
+def wait_next(stream, state):
+    """Sleep until there is something to do.
+
+    With a healthy kline stream this blocks until the exchange marks a bar newer than
+    `last_bar_ms` closed (retrying shortly if REST has not caught up yet); otherwise the
+    BarScheduler sleeps until just after the next bar close. Either way polling is held back
+    while the Binance request weight is close to its limit.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = BarScheduler(config.KLINE_INTERVAL)
+    last_bar_ms = int(state.get("last_bar_ms", 0))
+    if stream is None or not stream.healthy():
+        _scheduler.sleep(last_bar_ms)
+        return
+    backoff = _scheduler.backoff()
+    if backoff > 0:
+        metrics.inc("btc_bot_weight_backoff_seconds_total", backoff)
+        logger.warning(f"Binance request weight near the limit, pausing {backoff:.1f}s")
+        time.sleep(backoff)
+        return
+    if stream.last_closed_ms > last_bar_ms:
+        time.sleep(1)
+        return
+    stream.wait_closed(last_bar_ms, timeout=config.KLINE_STREAM_STALE_SEC)
+
+TRADE_TITLES = {
+    "open_long": "OPEN LONG",
+    "open_short": "OPEN SHORT",
+    "close_long": "CLOSE LONG",
+    "close_short": "CLOSE SHORT",
+}
+
+def step(state, strat, strat_name: str, ctx, price_now: float, allow_long: bool, allow_short: bool,
+         symbol: str = None, save=save_state, path=None):
+    """Act on one newly closed bar: daily/kill-switch bookkeeping, cooldown, risk exits, strategy action.
+
+    The rules themselves live in DecisionEngine (shared with the backtests); this wraps them with
+    the live side effects: logging, Telegram, ledger and persistence. `save` persists the state
+    (save_state for the single-symbol bot, a per-symbol path in multi); `path` is the bar's
+    intrabar price path (intrabar_path) for TP/SL/trailing fills at the touched level.
+    """
+    symbol = symbol or config.SYMBOL
+    save = metrics.wrap("save_state", save)
+    state["last_bar_ms"] = ctx["bar_close_ms"]
+    engine = DecisionEngine.from_state(state)
+
+    # update daily start value and reset halt flag on new day
+    try:
+        now_bkk = datetime.now(ZoneInfo("Asia/Bangkok"))
+        state["last_updated"] = now_bkk.isoformat()
+        today = now_bkk.date().isoformat()  # "2026-02-03"
+
+        pv = engine.book.value(float(price_now))
+        if engine.day != today:
+            engine.new_day(today, day_start_value(symbol, today, pv))
+            engine.store(state)
+            logger.info(f"New day {today}, day_start_value={engine.day_start_value:.2f}")
+            save(state)
+        else:
+            dd_pct = engine.kill_switch(pv)
+            if dd_pct is not None:
+                engine.store(state)
+                save(state)
+                msg = f"⛔ [{symbol}] Kill switch triggered: daily drawdown {dd_pct:.2f}% >= {config.MAX_DAILY_DD_PCT}%"
+                logger.warning(msg)
+                if tg.enabled():
+                    with metrics.timer("telegram"):
+                        tg.send(msg)
+
+    except Exception:
+        logger.exception("Error computing daily PnL / kill-switch")
+
+    record_equity(state, ctx, symbol, strat_name, float(price_now))
+
+    with metrics.timer("decide"):
+        action = strat.decide(ctx, state["position"], allow_long=allow_long, allow_short=allow_short)
+
+        was_trailing = engine.book.trail_active
+        action, reason, fill = engine.on_bar(ctx["bar_close_ms"], float(ctx["close"]),
+                                             float(ctx.get("atr", 0.0) or 0.0), action, path)
+        engine.store(state)
+    latency = time.time() - ctx["bar_close_ms"] / 1000.0
+    metrics.observe("btc_bot_bar_decision_delay_seconds", latency)
+    fields = {"symbol": symbol, "strategy": strat_name, "bar_ms": ctx["bar_close_ms"], "action": action,
+              "price": float(ctx["close"]), "latency": round(latency, 3)}
+    if engine.book.trail_active and not was_trailing:
+        logger.info(f"Trail activated ({engine.book.position}), stop={engine.book.trail_stop:.2f}", extra=fields)
+
+    if reason == "halted":
+        logger.info("Open blocked by kill switch (halt_today)", extra=fields)
+    elif fill is not None:
+        title = TRADE_TITLES[action] + (f" ({fill['exit']})" if reason == "risk" else "")
+        logger.info(f"[TRADE] {title} @ {fill['fill']:.2f} strategy={strat_name} symbol={symbol}",
+                    extra={**fields, "price": fill["fill"]})
+        record_fill(state, ctx, symbol, strat_name, action, fill.get("exit", reason), fill)
+        metrics.inc("btc_bot_fills_total", action=action, reason=fill.get("exit", reason))
+        notify_summary(state, price_now, f"📌 After {title}", symbol)
+    save(state)
 
 def main():
     # validate config
@@ -59,174 +219,54 @@ def main():
     strat, strat_name = pick_strategy()
 
     state = load_state()
+    # streaming indicators: only bars that closed since the last poll are processed
+    live = strat.live_context() if config.USE_STREAMING_INDICATORS else None
+    stream = None
+    if config.USE_KLINE_STREAM:
+        stream = KlineStream(config.KLINE_STREAM_URL, config.SYMBOL, config.KLINE_INTERVAL,
+                             stale_sec=config.KLINE_STREAM_STALE_SEC).start()
+    if config.METRICS_PORT:
+        metrics.start_server(config.METRICS_PORT, config.METRICS_HOST)
+        logger.info(f"Metrics on http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
     if tg.enabled():
         tg.send(f"✅ bot started | strategy={strat_name} | symbol={config.SYMBOL} interval={config.KLINE_INTERVAL}")
 
     while True:
+        t_loop = time.perf_counter()
         try:
-            price_now = spot_price(config.SYMBOL)
-            df = klines(config.SYMBOL, config.KLINE_INTERVAL, 800)
+            # price, klines and (hourly) 1h refresh go out concurrently over the shared keep-alive pool
+            price_now, bars, _ = fan_out(
+                metrics.wrap("spot_price", lambda: (stream and stream.price()) or spot_price(config.SYMBOL)),
+                metrics.wrap("klines", lambda: kline_bars(config.SYMBOL, config.KLINE_INTERVAL, 800)),
+                metrics.wrap("ema1h_refresh", lambda: ema1h_prefetch(config.SYMBOL)),
+            )
 
-            allow_long, allow_short, ema1h = ema1h_filter_allow(config.SYMBOL)
+            # higher timeframes (EMA_1H_SOURCE=resample) are built from the bars just fetched
+            timeframes(config.SYMBOL).update(bars)
 
-            ctx = strat.build_context(df)
+            # the open bar's close is the latest trade, as the open 1h bar's close was before
+            with metrics.timer("ema1h_filter_allow"):
+                allow_long, allow_short, ema1h = ema1h_filter_allow(config.SYMBOL, float(bars.close[-1]))
+
+            with metrics.timer("build_context"):
+                ctx = live.context(bars) if live else strat.build_context(bars.to_frame())
 
             # avoid duplicate same bar
             if ctx["bar_close_ms"] == int(state.get("last_bar_ms", 0)):
-                time.sleep(config.POLL_SEC)
-                continue
-
-            state["last_bar_ms"] = ctx["bar_close_ms"]
-
-            # update daily start value and reset halt flag on new UTC day
-            try:
-                now_bkk = datetime.now(ZoneInfo("Asia/Bangkok"))
-                state["last_updated"] = now_bkk.isoformat()
-                today = now_bkk.date().isoformat()  # "2026-02-03"
-                
-                pv = paper.portfolio_value(state["paper"], float(price_now))
-                if state.get("day") != today:
-                    state["day"] = today
-                    state["day_start_value"] = pv
-                    state["halt_today"] = False
-                    logger.info(f"New day {today}, day_start_value={pv:.2f}")
-                    save_state(state)
-                else:
-                    # check kill-switch
-                    if config.USE_KILL_SWITCH and not state.get("halt_today", False) and state.get("day_start_value"):
-                        dd_pct = (state["day_start_value"] - pv) / float(state["day_start_value"]) * 100.0
-                        if dd_pct >= float(config.MAX_DAILY_DD_PCT):
-                            state["halt_today"] = True
-                            save_state(state)
-                            msg = f"⛔ Kill switch triggered: daily drawdown {dd_pct:.2f}% >= {config.MAX_DAILY_DD_PCT}%"
-                            logger.warning(msg)
-                            if tg.enabled():
-                                tg.send(msg)
-
-            except Exception:
-                logger.exception("Error computing daily PnL / kill-switch")
-
-            action = strat.decide(ctx, state["position"], allow_long=allow_long, allow_short=allow_short)
-
-            # reentry guard by bars
-            if int(state.get("cooldown_until_bar_ms", 0)) and ctx["bar_close_ms"] < int(state["cooldown_until_bar_ms"]):
-                save_state(state)
-                time.sleep(config.POLL_SEC)
-                continue
-
-            # risk-based exits (TP/SL/trailing) take precedence over strategy opens
-            def risk_exit_check(price_now: float):
-                paper_state = state["paper"]
-                entry_atr = float(paper_state.get("entry_atr", 0.0) or 0.0)
-                entry_price = float(paper_state.get("entry_price", 0.0) or 0.0)
-
-                if state["position"] == "long":
-                    # TP
-                    if config.USE_TP_SL and entry_atr > 0 and price_now >= entry_price + config.TP_ATR_MULT * entry_atr:
-                        return "close_long"
-                    # SL
-                    if config.USE_TP_SL and entry_atr > 0 and price_now <= entry_price - config.SL_ATR_MULT * entry_atr:
-                        return "close_long"
-                    # trailing
-                    if config.USE_TRAILING and entry_atr > 0:
-                        if not paper_state.get("trail_active"):
-                            # activate trailing when profit >= R * atr
-                            if (price_now - entry_price) >= config.TRAIL_ACTIVATE_R * entry_atr:
-                                paper_state["trail_active"] = True
-                                paper_state["trail_stop"] = price_now - config.TRAIL_ATR_MULT * entry_atr
-                                logger.info(f"Trail activated, stop={paper_state['trail_stop']:.2f}")
-                        else:
-                            # update trail stop to max(current, new)
-                            candidate = price_now - config.TRAIL_ATR_MULT * entry_atr
-                            if candidate > float(paper_state.get("trail_stop", 0.0)):
-                                paper_state["trail_stop"] = candidate
-                            if price_now <= float(paper_state.get("trail_stop", 0.0)):
-                                return "close_long"
-
-                if state["position"] == "short":
-                    if config.USE_TP_SL and entry_atr > 0 and price_now <= entry_price - config.TP_ATR_MULT * entry_atr:
-                        return "close_short"
-                    if config.USE_TP_SL and entry_atr > 0 and price_now >= entry_price + config.SL_ATR_MULT * entry_atr:
-                        return "close_short"
-                    if config.USE_TRAILING and entry_atr > 0:
-                        if not paper_state.get("trail_active"):
-                            if (entry_price - price_now) >= config.TRAIL_ACTIVATE_R * entry_atr:
-                                paper_state["trail_active"] = True
-                                paper_state["trail_stop"] = price_now + config.TRAIL_ATR_MULT * entry_atr
-                                logger.info(f"Trail activated (short), stop={paper_state['trail_stop']:.2f}")
-                        else:
-                            candidate = price_now + config.TRAIL_ATR_MULT * entry_atr
-                            if candidate < float(paper_state.get("trail_stop", 0.0)) or float(paper_state.get("trail_stop", 0.0)) == 0.0:
-                                paper_state["trail_stop"] = candidate
-                            if price_now >= float(paper_state.get("trail_stop", 0.0)) and paper_state.get("trail_stop"):
-                                return "close_short"
-
-                return None
-
-            # allow strategy to request opens/closes, but check risk exits first for position closes
-            risk_action = risk_exit_check(float(ctx["close"]))
-            if risk_action == "close_long" and state["position"] == "long":
-                logger.info(f"[TRADE] CLOSE LONG (risk) @ {ctx['close']:.2f} strategy={strat_name}")
-                paper.close_long(state, float(ctx["close"]))
-                notify_summary(state, price_now, "📌 After CLOSE LONG (risk)")
-                state["cooldown_until_bar_ms"] = ctx["bar_close_ms"] + config.REENTRY_BARS * 5 * 60 * 1000
-                save_state(state)
-                time.sleep(config.POLL_SEC)
-                continue
-
-            if risk_action == "close_short" and state["position"] == "short":
-                logger.info(f"[TRADE] CLOSE SHORT (risk) @ {ctx['close']:.2f} strategy={strat_name}")
-                paper.close_short(state, float(ctx["close"]))
-                notify_summary(state, price_now, "📌 After CLOSE SHORT (risk)")
-                state["cooldown_until_bar_ms"] = ctx["bar_close_ms"] + config.REENTRY_BARS * 5 * 60 * 1000
-                save_state(state)
-                time.sleep(config.POLL_SEC)
+                metrics.observe("btc_bot_loop_seconds", time.perf_counter() - t_loop)
+                wait_next(stream, state)
                 continue
 
-            # execute strategy actions
-            if action == "open_long" and state["position"] == "flat":
-                if state.get("halt_today"):
-                    logger.info("Open blocked by kill switch (halt_today)")
-                    save_state(state)
-                else:
-                    logger.info(f"[TRADE] OPEN LONG @ {ctx['close']:.2f} strategy={strat_name}")
-                    paper.open_long(state, float(ctx["close"]), atr_at_entry=float(ctx.get("atr", 0.0) or 0.0))
-                    notify_summary(state, price_now, "📌 After OPEN LONG")
-                    state["cooldown_until_bar_ms"] = ctx["bar_close_ms"] + config.REENTRY_BARS * 5 * 60 * 1000
-                    save_state(state)
-
-            elif action == "open_short" and state["position"] == "flat":
-                if state.get("halt_today"):
-                    logger.info("Open blocked by kill switch (halt_today)")
-                    save_state(state)
-                else:
-                    logger.info(f"[TRADE] OPEN SHORT @ {ctx['close']:.2f} strategy={strat_name}")
-                    paper.open_short(state, float(ctx["close"]), atr_at_entry=float(ctx.get("atr", 0.0) or 0.0))
-                    notify_summary(state, price_now, "📌 After OPEN SHORT")
-                    state["cooldown_until_bar_ms"] = ctx["bar_close_ms"] + config.REENTRY_BARS * 5 * 60 * 1000
-                    save_state(state)
-
-            elif action == "close_long" and state["position"] == "long":
-                logger.info(f"[TRADE] CLOSE LONG @ {ctx['close']:.2f} strategy={strat_name}")
-                paper.close_long(state, float(ctx["close"]))
-                notify_summary(state, price_now, "📌 After CLOSE LONG")
-                state["cooldown_until_bar_ms"] = ctx["bar_close_ms"] + config.REENTRY_BARS * 5 * 60 * 1000
-                save_state(state)
-
-            elif action == "close_short" and state["position"] == "short":
-                logger.info(f"[TRADE] CLOSE SHORT @ {ctx['close']:.2f} strategy={strat_name}")
-                paper.close_short(state, float(ctx["close"]))
-                notify_summary(state, price_now, "📌 After CLOSE SHORT")
-                state["cooldown_until_bar_ms"] = ctx["bar_close_ms"] + config.REENTRY_BARS * 5 * 60 * 1000
-                save_state(state)
-
-            else:
-                save_state(state)
+            with metrics.timer("intrabar_path"):
+                path = intrabar_path(config.SYMBOL, bars, state)
+            step(state, strat, strat_name, ctx, price_now, allow_long, allow_short, path=path)
 
         except Exception:
+            metrics.inc("btc_bot_loop_errors_total")
             logger.exception("Unhandled exception")
             tg.send("⚠️ [ERROR] check logs")
-        time.sleep(config.POLL_SEC)
+        metrics.observe("btc_bot_loop_seconds", time.perf_counter() - t_loop)
+        wait_next(stream, state)
 
 if __name__ == "__main__":
     main()
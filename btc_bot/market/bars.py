@@ -0,0 +1,93 @@
+"""Array-backed OHLCV bars for consumers that do not need a DataFrame.
+
+Bars wraps BAR_DTYPE records (oldest first, int64 ms timestamps, float64 OHLCV): columns are
+numpy views, slicing does not copy, and to_frame() gives the binance_api.klines() DataFrame when
+pandas is wanted after all. loads() parses exchange responses with orjson when it is installed.
+"""
+import json
+import numpy as np
+import pandas as pd
+from .kline_store import BAR_DTYPE, rows_to_array, frame_to_array, to_frame
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib parser is only slower
+    orjson = None
+
+
+def loads(content):
+    """JSON bytes -> Python objects, via orjson when available."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class Bars:
+    __slots__ = ("data",)
+
+    def __init__(self, data: np.ndarray = None):
+        self.data = np.empty(0, dtype=BAR_DTYPE) if data is None else data
+
+    @classmethod
+    def from_rows(cls, rows) -> "Bars":
+        return cls(rows_to_array(rows))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "Bars":
+        return cls(frame_to_array(df))
+
+    @classmethod
+    def of(cls, bars) -> "Bars":
+        """`bars` as Bars; DataFrames (binance_api.klines() shape) are converted."""
+        if isinstance(bars, Bars):
+            return bars
+        if isinstance(bars, np.ndarray):
+            return cls(bars)
+        return cls.from_frame(bars)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, key):
+        # bars["close"] is a column, bars[-200:] a Bars sharing the same memory
+        if isinstance(key, str):
+            return self.data[key]
+        if isinstance(key, slice):
+            return Bars(self.data[key])
+        return self.data[key]
+
+    @property
+    def open_time(self) -> np.ndarray:
+        return self.data["open_time"]
+
+    @property
+    def open(self) -> np.ndarray:
+        return self.data["open"]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self.data["high"]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self.data["low"]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.data["close"]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self.data["volume"]
+
+    @property
+    def close_time(self) -> np.ndarray:
+        return self.data["close_time"]
+
+    def to_frame(self) -> pd.DataFrame:
+        return to_frame(self.data)
+
+    def __repr__(self) -> str:
+        if not len(self.data):
+            return "Bars(0)"
+        return f"Bars({len(self.data)}, {int(self.data['open_time'][0])}..{int(self.data['close_time'][-1])})"
@@ -1,17 +1,24 @@
+import os
+import time
+import threading
+import numpy as np
 import pandas as pd
+from .. import config
 from ..log_setup import setup_logger
-from ..http import get_session
+from ..http import shared_session, fan_out
+from .bars import Bars, loads
+from .kline_store import BAR_DTYPE, KlineStore, interval_ms, rows_to_array
 
 logger = setup_logger()
 
 
 def _session():
-    # module-level helper so callers get retries/backoff
-    return get_session()
+    # module-level helper so callers get retries/backoff over one long-lived keep-alive pool
+    return shared_session()
 
 
 def spot_price(symbol: str) -> float:
-    url = "https://api.binance.com/api/v3/ticker/price"
+    url = f"{config.BINANCE_REST_URL}/api/v3/ticker/price"
     s = _session()
     r = s.get(url, params={"symbol": symbol}, timeout=10)
     data = r.json()
@@ -20,58 +27,118 @@ def spot_price(symbol: str) -> float:
         raise RuntimeError(f"Binance price error: {data}")
 
     price = float(data["price"])
-    logger.info(f"[SCRAPE] {symbol} price = {price:,.2f} USDT")
+    logger.info(f"[SCRAPE] {symbol} price = {price:,.2f} USDT",
+                extra={"sample": f"scrape:{symbol}", "symbol": symbol, "price": price})
     return price
 
 
-def klines(symbol: str, interval: str, limit: int) -> pd.DataFrame:
-    url = "https://api.binance.com/api/v3/klines"
-    s = _session()
+def klines_url() -> str:
+    return f"{config.BINANCE_REST_URL}/api/v3/klines"
+
+
+def _get_klines_page(params: dict) -> np.ndarray:
+    r = _session().get(klines_url(), params=params, timeout=20)
+    data = loads(r.content)
+    if isinstance(data, dict) and "code" in data:
+        logger.error(f"Binance klines error: {data}")
+        raise RuntimeError(f"Binance klines error: {data}")
+    return rows_to_array(data)
+
+
+def _fetch_klines_parallel(symbol: str, interval: str, limit: int, end_time=None) -> np.ndarray:
+    # Page boundaries are known for fixed-length intervals, so all pages are requested at once
+    step = interval_ms(interval)
+    last_open = (int(end_time) if end_time is not None else int(time.time() * 1000)) // step * step
+    first_open = last_open - (limit - 1) * step
+    pages = []
+    for start in range(first_open, last_open + 1, 1000 * step):
+        params = {"symbol": symbol, "interval": interval, "limit": 1000, "startTime": start,
+                  "endTime": min(start + 1000 * step - 1, last_open + step - 1)}
+        pages.append(params)
+    results = np.concatenate(fan_out(*(lambda p=p: _get_klines_page(p) for p in pages)))
+
+    # exchange gaps (maintenance) leave us short: top up serially from the earliest bar we got
+    if len(results) and len(results) < limit:
+        older = _fetch_klines(symbol, interval, limit - len(results), end_time=int(results["open_time"][0]) - 1,
+                              parallel=False)
+        results = np.concatenate([older, results])
+    return results[-limit:]
+
+
+def _fetch_klines(symbol: str, interval: str, limit: int, start_time=None, end_time=None,
+                  parallel: bool = True) -> np.ndarray:
+    """Kline BAR_DTYPE records, oldest first.
+
+    With `start_time` a single forward page (limit <= 1000) is requested; otherwise pages backwards
+    from `end_time` (or now) until `limit` bars are collected, concurrently when the page time
+    ranges can be computed up front.
+    """
+    if start_time is not None:
+        params = {"symbol": symbol, "interval": interval, "limit": min(limit, 1000), "startTime": int(start_time)}
+        if end_time is not None:
+            params["endTime"] = int(end_time)
+        return _get_klines_page(params)
 
     # Binance caps klines per request (1000). If user requests more, page backwards
     max_per_request = 1000
-    results = []
-    end_time = None
-
-    while len(results) < limit:
-        req_limit = min(max_per_request, limit - len(results))
+    if parallel and limit > max_per_request and interval_ms(interval):
+        return _fetch_klines_parallel(symbol, interval, limit, end_time)
+
+    # pages arrive newest first; they are joined once at the end
+    pages = []
+    got = 0
+    while got < limit:
+        req_limit = min(max_per_request, limit - got)
         params = {"symbol": symbol, "interval": interval, "limit": req_limit}
         if end_time is not None:
             params["endTime"] = int(end_time)
 
-        r = s.get(url, params=params, timeout=20)
-        data = r.json()
-        if isinstance(data, dict) and "code" in data:
-            logger.error(f"Binance klines error: {data}")
-            raise RuntimeError(f"Binance klines error: {data}")
-
-        if not data:
+        data = _get_klines_page(params)
+        if not len(data):
             break
-
-        # First fetch (most recent): keep as-is. Subsequent older pages should be prepended
-        if end_time is None:
-            results = data
-        else:
-            results = data + results
+        pages.append(data)
+        got += len(data)
 
         # If we received fewer bars than requested, no more history available
         if len(data) < req_limit:
             break
 
         # Prepare next page: earliest open time in this batch minus 1 ms
-        earliest_open = int(data[0][0])
+        earliest_open = int(data["open_time"][0])
         end_time = earliest_open - 1
 
+    if not pages:
+        return np.empty(0, dtype=BAR_DTYPE)
     # Keep only the most recent `limit` bars
-    if len(results) > limit:
-        results = results[-limit:]
-
-    df = pd.DataFrame(results, columns=[
-        "open_time","open","high","low","close","volume",
-        "close_time","quote_av","trades","taker_base","taker_quote","ignore"
-    ])
-    for c in ["open","high","low","close","volume"]:
-        df[c] = df[c].astype(float)
-    df["open_time"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
-    df["close_time"] = pd.to_datetime(df["close_time"], unit="ms", utc=True)
-    return df
+    return np.concatenate(pages[::-1])[-limit:]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _kline_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            root = config.KLINE_STORE_DIR
+            try:
+                os.makedirs(root, exist_ok=True)
+            except PermissionError:
+                # same ./data fallback as the state and log files when /app is not mounted
+                root = os.path.join(os.getcwd(), "data", os.path.basename(root.rstrip("/\\")) or "klines")
+                config.KLINE_STORE_DIR = root
+            _store = KlineStore(root, _fetch_klines)
+        return _store
+
+
+def kline_bars(symbol: str, interval: str, limit: int) -> Bars:
+    """The last `limit` klines (the open one last) as Bars, without building a DataFrame."""
+    # Closed bars are served from the local store; only newer bars (plus the open one) are downloaded
+    if config.USE_KLINE_STORE and interval_ms(interval):
+        return Bars(_kline_store().tail(symbol, interval, limit))
+    return Bars(_fetch_klines(symbol, interval, limit))
+
+
+def klines(symbol: str, interval: str, limit: int) -> pd.DataFrame:
+    return kline_bars(symbol, interval, limit).to_frame()
@@ -0,0 +1,190 @@
+"""Indicators shared by every strategy evaluated on the same bars.
+
+A strategy declares the columns it reads as {name: spec}, e.g.
+
+    {"ema5m": ema(20), "atr": atr(14), "rsi": rsi(14), "bb": bollinger(20, 2.0)}
+
+Specs are plain tuples, so equal requests from different strategies are the same key.
+IndicatorGraph merges the declarations, expands each spec into the nodes it is built from
+(bollinger -> sma + std of its source, atr -> true range) and computes every distinct node once:
+as whole columns on a klines() frame (add_columns) or one closed bar at a time with the
+streaming indicators (live). Multi-output specs (bollinger) become `<name>_mid`, `<name>_up` and
+`<name>_lo` columns. Two strategies may not use one column name for different specs.
+"""
+import pandas as pd
+from . import indicators, streaming
+
+
+def ema(period: int, source: str = "close") -> tuple:
+    return ("ema", source, int(period))
+
+
+def sma(period: int, source: str = "close") -> tuple:
+    return ("sma", source, int(period))
+
+
+def std(period: int, source: str = "close") -> tuple:
+    return ("std", source, int(period))
+
+
+def true_range() -> tuple:
+    return ("tr",)
+
+
+def atr(period: int = 14) -> tuple:
+    return ("atr", int(period))
+
+
+def rsi(period: int = 14, source: str = "close") -> tuple:
+    return ("rsi", source, int(period))
+
+
+def bollinger(period: int = 20, mult: float = 2.0, source: str = "close") -> tuple:
+    return ("bollinger", source, int(period), float(mult))
+
+
+def prev(source: str = "close") -> tuple:
+    """The previous bar's `source` value."""
+    return ("prev", source)
+
+
+def _deps(spec) -> tuple:
+    kind = spec[0]
+    if kind == "atr":
+        return (true_range(),)
+    if kind == "bollinger":
+        _, source, period, _ = spec
+        return (sma(period, source), std(period, source))
+    return ()
+
+
+def merge(*declarations) -> dict:
+    """One {column: spec} from several strategies' declarations; a reused name must mean the same spec."""
+    columns = {}
+    for decl in declarations:
+        for name, spec in decl.items():
+            if columns.get(name, spec) != spec:
+                raise ValueError(f"indicator column {name!r} declared as both {columns[name]} and {spec}")
+            columns[name] = spec
+    return columns
+
+
+class IndicatorGraph:
+    def __init__(self, columns: dict):
+        self.columns = dict(columns)
+        # dependencies first; each spec once however many columns or strategies ask for it
+        self.order = []
+        for spec in self.columns.values():
+            self._add(spec)
+
+    def _add(self, spec):
+        if spec in self.order:
+            return
+        if spec[0] not in _BATCH:
+            raise ValueError(f"unknown indicator {spec}")
+        for dep in _deps(spec):
+            self._add(dep)
+        self.order.append(spec)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def add_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Compute every node over the whole frame and add the declared columns to it."""
+        values = {}
+        for spec in self.order:
+            values[spec] = _BATCH[spec[0]](df, values, spec)
+        for name, spec in self.columns.items():
+            v = values[spec]
+            if isinstance(v, dict):
+                for out, series in v.items():
+                    df[f"{name}_{out}"] = series
+            else:
+                df[name] = v
+        return df
+
+    def live(self) -> "LiveGraph":
+        return LiveGraph(self)
+
+
+class LiveGraph:
+    """IndicatorGraph evaluated one closed bar at a time (constant work per bar and node)."""
+
+    def __init__(self, graph: IndicatorGraph):
+        self.graph = graph
+        self.nodes = [(spec, _LIVE[spec[0]](spec)) for spec in graph.order]
+
+    def update(self, open_time_ms: int, high: float, low: float, close: float, volume: float,
+               close_ms: int) -> dict:
+        """Feed one closed bar; returns the row dict strategies' context(row) takes."""
+        row = {"open_time_ms": open_time_ms, "high": high, "low": low, "close": close, "volume": volume,
+               "bar_close_ms": close_ms}
+        values = {}
+        for spec, node in self.nodes:
+            values[spec] = node(row, values)
+        for name, spec in self.graph.columns.items():
+            v = values[spec]
+            if isinstance(v, dict):
+                for out, x in v.items():
+                    row[f"{name}_{out}"] = x
+            else:
+                row[name] = v
+        return row
+
+
+def closed_row(df: pd.DataFrame, i: int = -2) -> dict:
+    """Bar `i` of a frame with indicator columns as a context(row) dict (default: the last closed bar)."""
+    last = df.iloc[i]
+    row = last.to_dict()
+    row["open_time_ms"] = int(last["open_time"].value // 10**6)
+    row["bar_close_ms"] = int(last["close_time"].value // 10**6)
+    return row
+
+
+def _bands(mid, sd, mult: float) -> dict:
+    return {"mid": mid, "up": mid + mult * sd, "lo": mid - mult * sd}
+
+
+_BATCH = {
+    "ema": lambda df, v, s: indicators.ema(df[s[1]], s[2]),
+    "sma": lambda df, v, s: indicators.sma(df[s[1]], s[2]),
+    "std": lambda df, v, s: df[s[1]].rolling(s[2]).std(),
+    "tr": lambda df, v, s: indicators.true_range(df),
+    "atr": lambda df, v, s: v[true_range()].rolling(s[1]).mean(),
+    "rsi": lambda df, v, s: indicators.rsi(df[s[1]], s[2]),
+    "bollinger": lambda df, v, s: _bands(v[sma(s[2], s[1])], v[std(s[2], s[1])], s[3]),
+    "prev": lambda df, v, s: df[s[1]].shift(1),
+}
+
+
+def _live_source(cls, spec, *args):
+    ind, source = cls(*args), spec[1]
+    return lambda row, v: ind.update(row[source])
+
+
+def _live_atr(spec):
+    mean, tr = streaming.RollingMean(spec[1]), true_range()
+    return lambda row, v: mean.update(v[tr])
+
+
+def _live_tr(spec):
+    tr = streaming.TrueRange()
+    return lambda row, v: tr.update(row["high"], row["low"], row["close"])
+
+
+def _live_bollinger(spec):
+    _, source, period, mult = spec
+    mid, sd = sma(period, source), std(period, source)
+    return lambda row, v: _bands(v[mid], v[sd], mult)
+
+
+_LIVE = {
+    "ema": lambda s: _live_source(streaming.EMA, s, s[2]),
+    "sma": lambda s: _live_source(streaming.RollingMean, s, s[2]),
+    "std": lambda s: _live_source(streaming.RollingStd, s, s[2]),
+    "tr": _live_tr,
+    "atr": _live_atr,
+    "rsi": lambda s: _live_source(streaming.RSI, s, s[2]),
+    "bollinger": _live_bollinger,
+    "prev": lambda s: _live_source(streaming.Lag, s),
+}
@@ -3,14 +3,33 @@ import pandas as pd
 def ema(series: pd.Series, period: int) -> pd.Series:
     return series.ewm(span=period, adjust=False).mean()
 
-def atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
+def sma(series: pd.Series, period: int) -> pd.Series:
+    return series.rolling(period).mean()
+
+def true_range(df: pd.DataFrame) -> pd.Series:
     high = df["high"]
     low = df["low"]
     close = df["close"]
     prev_close = close.shift(1)
-    tr = pd.concat([
+    return pd.concat([
         (high - low),
         (high - prev_close).abs(),
         (low - prev_close).abs()
     ], axis=1).max(axis=1)
-    return tr.rolling(period).mean()
+
+def atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
+    return true_range(df).rolling(period).mean()
+
+def rsi(series: pd.Series, period: int = 14) -> pd.Series:
+    delta = series.diff()
+    gain = delta.clip(lower=0).rolling(period).mean()
+    loss = (-delta.clip(upper=0)).rolling(period).mean()
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+def bollinger(series: pd.Series, period: int = 20, mult: float = 2.0):
+    ma = series.rolling(period).mean()
+    sd = series.rolling(period).std()
+    upper = ma + mult * sd
+    lower = ma - mult * sd
+    return ma, upper, lower
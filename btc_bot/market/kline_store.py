@@ -0,0 +1,229 @@
+import os
+import time
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from ..log_setup import setup_logger
+
+logger = setup_logger()
+
+# One fixed-size little-endian record per closed candle (56 bytes); files are append-only.
+BAR_DTYPE = np.dtype([
+    ("open_time", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+    ("close_time", "<i8"),
+])
+
+_UNIT_MS = {"s": 1000, "m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000, "w": 7 * 24 * 60 * 60 * 1000}
+
+
+def interval_ms(interval: str):
+    """Length of a Binance interval in ms, or None for calendar intervals (1M) that have no fixed length."""
+    unit = interval[-1:]
+    if unit not in _UNIT_MS or not interval[:-1].isdigit():
+        return None
+    return int(interval[:-1]) * _UNIT_MS[unit]
+
+
+def rows_to_array(rows) -> np.ndarray:
+    """Convert raw Binance kline rows (lists of strings/ints) into BAR_DTYPE records.
+
+    Only the first seven fields are read; the rows are transposed once and each column is parsed
+    by numpy in one call.
+    """
+    arr = np.empty(len(rows), dtype=BAR_DTYPE)
+    if not len(rows):
+        return arr
+    cols = list(zip(*rows))
+    arr["open_time"] = cols[0]
+    for i, c in enumerate(("open", "high", "low", "close", "volume"), start=1):
+        arr[c] = np.array(cols[i], dtype=np.float64)
+    arr["close_time"] = cols[6]
+    return arr
+
+
+def frame_to_array(df: pd.DataFrame) -> np.ndarray:
+    arr = np.empty(len(df), dtype=BAR_DTYPE)
+    arr["open_time"] = df["open_time"].to_numpy(dtype="datetime64[ms]").astype("int64")
+    for c in ("open", "high", "low", "close", "volume"):
+        arr[c] = df[c].to_numpy(dtype=float)
+    arr["close_time"] = df["close_time"].to_numpy(dtype="datetime64[ms]").astype("int64")
+    return arr
+
+
+def to_frame(arr: np.ndarray) -> pd.DataFrame:
+    df = pd.DataFrame({c: arr[c] for c in ("open", "high", "low", "close", "volume")})
+    df.insert(0, "open_time", pd.to_datetime(arr["open_time"], unit="ms", utc=True))
+    df["close_time"] = pd.to_datetime(arr["close_time"], unit="ms", utc=True)
+    return df
+
+
+def _split_open(fresh: np.ndarray, now_ms: int):
+    """(closed, open) rows of a fetch that ran up to the current bar.
+
+    The newest row the exchange returned is its open bar, whatever the local clock says: a host
+    clock running ahead would otherwise store a still-forming bar as closed, for good. Rows the
+    local clock does not consider closed yet are kept out as well.
+    """
+    n = max(len(fresh) - 1, 0)
+    n = min(n, int(np.searchsorted(fresh["close_time"], now_ms)))
+    return fresh[:n], fresh[n:]
+
+
+class KlineStore:
+    """On-disk store of closed candles per (symbol, interval) with incremental sync.
+
+    `fetch(symbol, interval, limit, start_time=None, end_time=None)` must return BAR_DTYPE records
+    (oldest first). Only bars after the last stored open_time are requested from the network; the
+    still-open bar is returned to the caller but never written to disk. One (symbol, interval) is
+    synced and written by one thread at a time (lock()); other threads wait and then find the bars
+    already stored.
+    """
+
+    def __init__(self, root: str, fetch):
+        self.root = root
+        self.fetch = fetch
+        # {(symbol, interval): [buffer, n]}: bars are buffer[:n]; spare capacity takes appends
+        self._cache = {}
+        self._gaps_checked = set()
+        self._unfillable = set()
+        self._history_exhausted = set()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, f"{symbol.upper()}_{interval}.bin")
+
+    def lock(self, symbol: str, interval: str) -> threading.RLock:
+        """The lock a read-modify-write of one (symbol, interval) file must hold."""
+        with self._locks_guard:
+            return self._locks.setdefault((symbol, interval), threading.RLock())
+
+    def read(self, symbol: str, interval: str) -> np.ndarray:
+        key = (symbol, interval)
+        with self.lock(symbol, interval):
+            if key not in self._cache:
+                p = self.path(symbol, interval)
+                arr = np.fromfile(p, dtype=BAR_DTYPE) if os.path.exists(p) else np.empty(0, dtype=BAR_DTYPE)
+                self._cache[key] = [arr, len(arr)]
+            buf, n = self._cache[key]
+            # rows below n are never modified, so views handed out earlier stay valid
+            return buf[:n]
+
+    def append(self, symbol: str, interval: str, new: np.ndarray):
+        with self.lock(symbol, interval):
+            arr = self.read(symbol, interval)
+            if len(arr):
+                new = new[new["open_time"] > arr["open_time"][-1]]
+            if not len(new):
+                return arr
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.path(symbol, interval), "ab") as f:
+                new.tofile(f)
+            entry = self._cache[(symbol, interval)]
+            buf, n = entry
+            if n + len(new) > len(buf):
+                # grow by doubling: a poll's append costs the new rows, not the whole history
+                grown = np.empty(max(2 * len(buf), n + len(new), 1024), dtype=BAR_DTYPE)
+                grown[:n] = buf[:n]
+                buf = entry[0] = grown
+            buf[n:n + len(new)] = new
+            entry[1] = n + len(new)
+            return buf[:entry[1]]
+
+    def write(self, symbol: str, interval: str, arr: np.ndarray):
+        # Full rewrite, only needed when older history or gap bars are inserted
+        with self.lock(symbol, interval):
+            os.makedirs(self.root, exist_ok=True)
+            target = self.path(symbol, interval)
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=os.path.basename(target) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    arr.tofile(f)
+                os.replace(tmp_path, target)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._cache[(symbol, interval)] = [arr, len(arr)]
+            return arr
+
+    def _fetch_forward(self, symbol: str, interval: str, start_time: int, end_time=None, page: int = 1000):
+        pages = []
+        while True:
+            data = self.fetch(symbol, interval, page, start_time=start_time, end_time=end_time)
+            pages.append(data)
+            if len(data) < page:
+                return np.concatenate(pages) if len(pages) > 1 else data
+            start_time = int(data["open_time"][-1]) + 1
+
+    def _fill_gaps(self, symbol: str, interval: str, arr: np.ndarray, step: int) -> np.ndarray:
+        gaps = np.flatnonzero(np.diff(arr["open_time"]) != step)
+        filled = []
+        for g in gaps:
+            lo, hi = int(arr["open_time"][g]) + step, int(arr["open_time"][g + 1]) - 1
+            if (symbol, interval, lo) in self._unfillable:
+                continue
+            got = self._fetch_forward(symbol, interval, lo, end_time=hi)
+            if len(got):
+                filled.append(got)
+                logger.info(f"[KLINES] filled gap {symbol} {interval}: {len(got)} bars from {lo}")
+            else:
+                # exchange has no data for this range (e.g. maintenance); don't ask again
+                self._unfillable.add((symbol, interval, lo))
+        if not filled:
+            return arr
+        merged = np.concatenate([arr] + filled)
+        merged = merged[np.argsort(merged["open_time"], kind="stable")]
+        return self.write(symbol, interval, merged)
+
+    def sync(self, symbol: str, interval: str, limit: int):
+        """Bring the store up to date and return (closed_bars, open_bars) covering the last `limit` bars."""
+        with self.lock(symbol, interval):
+            return self._sync(symbol, interval, limit)
+
+    def _sync(self, symbol: str, interval: str, limit: int):
+        step = interval_ms(interval)
+        key = (symbol, interval)
+        now_ms = int(time.time() * 1000)
+        arr = self.read(symbol, interval)
+
+        if not len(arr):
+            fresh = self.fetch(symbol, interval, limit)
+            if len(fresh) < limit:
+                self._history_exhausted.add(key)
+            closed, open_bars = _split_open(fresh, now_ms)
+            return self.write(symbol, interval, closed), open_bars
+
+        if key not in self._gaps_checked:
+            arr = self._fill_gaps(symbol, interval, arr, step)
+            self._gaps_checked.add(key)
+
+        # older history, when the caller asks for more than we have (the open bar fills the last slot)
+        missing = limit - 1 - len(arr)
+        if missing > 0 and key not in self._history_exhausted:
+            older = self.fetch(symbol, interval, missing, end_time=int(arr["open_time"][0]) - 1)
+            if len(older) < missing:
+                self._history_exhausted.add(key)
+            if len(older):
+                arr = self.write(symbol, interval, np.concatenate([older, arr]))
+
+        # only bars after the last stored one cross the network
+        fresh = self._fetch_forward(symbol, interval, int(arr["open_time"][-1]) + step)
+        if len(fresh) and int(fresh["open_time"][0]) != int(arr["open_time"][-1]) + step:
+            logger.warning(f"[KLINES] exchange gap {symbol} {interval} after {int(arr['open_time'][-1])}")
+        closed, open_bars = _split_open(fresh, now_ms)
+        return self.append(symbol, interval, closed), open_bars
+
+    def tail(self, symbol: str, interval: str, limit: int) -> np.ndarray:
+        """The last `limit` bars including the open one, as BAR_DTYPE records."""
+        closed, open_bars = self.sync(symbol, interval, limit)
+        return np.concatenate([closed[-limit:], open_bars])[-limit:]
+
+    def klines(self, symbol: str, interval: str, limit: int) -> pd.DataFrame:
+        return to_frame(self.tail(symbol, interval, limit))
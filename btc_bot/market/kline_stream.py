@@ -0,0 +1,227 @@
+import os
+import ssl
+import json
+import time
+import base64
+import socket
+import struct
+import hashlib
+import threading
+from urllib.parse import urlparse
+from ..log_setup import setup_logger
+
+logger = setup_logger()
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+def accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def encode_frame(payload: bytes, opcode: int = OP_TEXT, mask: bool = True) -> bytes:
+    # RFC 6455: clients must mask, servers must not
+    head = bytearray([0x80 | opcode])
+    n = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if n < 126:
+        head.append(mask_bit | n)
+    elif n < 1 << 16:
+        head.append(mask_bit | 126)
+        head += struct.pack("!H", n)
+    else:
+        head.append(mask_bit | 127)
+        head += struct.pack("!Q", n)
+    if not mask:
+        return bytes(head) + payload
+    key = os.urandom(4)
+    return bytes(head) + key + bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+
+
+class FrameReader:
+    """Reads RFC 6455 frames from a socket, keeping bytes that arrived past the HTTP handshake."""
+
+    def __init__(self, sock, buf: bytes = b""):
+        self.sock = sock
+        self.buf = bytearray(buf)
+
+    def _exact(self, n: int) -> bytes:
+        while len(self.buf) < n:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("websocket closed by peer")
+            self.buf += chunk
+        out = bytes(self.buf[:n])
+        del self.buf[:n]
+        return out
+
+    def read_frame(self):
+        b0, b1 = self._exact(2)
+        fin, opcode = bool(b0 & 0x80), b0 & 0x0F
+        n = b1 & 0x7F
+        if n == 126:
+            n = struct.unpack("!H", self._exact(2))[0]
+        elif n == 127:
+            n = struct.unpack("!Q", self._exact(8))[0]
+        key = self._exact(4) if b1 & 0x80 else None
+        payload = self._exact(n)
+        if key:
+            payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+        return fin, opcode, payload
+
+
+def read_http_head(sock):
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("connection closed during websocket handshake")
+        data += chunk
+    head, rest = data.split(b"\r\n\r\n", 1)
+    return head, rest
+
+
+class WebSocket:
+    """Minimal blocking WebSocket client (text frames, ping/pong, close) on top of the stdlib."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        u = urlparse(url)
+        secure = u.scheme == "wss"
+        port = u.port or (443 if secure else 80)
+        sock = socket.create_connection((u.hostname, port), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=u.hostname)
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        sock.sendall((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {u.hostname}:{port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        head, rest = read_http_head(sock)
+        lines = head.decode("latin-1").split("\r\n")
+        if " 101 " not in lines[0] + " ":
+            sock.close()
+            raise ConnectionError(f"websocket upgrade refused: {lines[0]}")
+        headers = {k.strip().lower(): v.strip() for k, v in (l.split(":", 1) for l in lines[1:] if ":" in l)}
+        if headers.get("sec-websocket-accept") != accept_key(key):
+            sock.close()
+            raise ConnectionError("bad Sec-WebSocket-Accept")
+
+        self.sock = sock
+        self.reader = FrameReader(sock, rest)
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def send(self, text: str):
+        self.sock.sendall(encode_frame(text.encode(), OP_TEXT))
+
+    def recv(self) -> str:
+        """Next text/binary message; answers pings, raises ConnectionError on close."""
+        parts = []
+        while True:
+            fin, opcode, payload = self.reader.read_frame()
+            if opcode == OP_PING:
+                self.sock.sendall(encode_frame(payload, OP_PONG))
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                raise ConnectionError("websocket closed by server")
+            parts.append(payload)
+            if fin:
+                return b"".join(parts).decode("utf-8")
+
+    def close(self):
+        try:
+            self.sock.sendall(encode_frame(b"", OP_CLOSE))
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class KlineStream:
+    """Background consumer of a Binance `<symbol>@kline_<interval>` push feed.
+
+    Keeps the latest trade price and the close time of the last bar the exchange marked closed
+    (`k.x`). `wait_closed(after_ms, timeout)` blocks until a newer bar closes. `healthy()` turns
+    false when no message arrived for `stale_sec`, so the caller can fall back to REST polling.
+    """
+
+    def __init__(self, base_url: str, symbol: str, interval: str, stale_sec: float = 30.0):
+        self.url = f"{base_url.rstrip('/')}/ws/{symbol.lower()}@kline_{interval}"
+        self.stale_sec = stale_sec
+        self.last_price = None
+        self.last_closed_ms = 0
+        self.last_closed_bar = None
+        self.last_msg_ts = 0.0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._ws = None
+        self._thread = threading.Thread(target=self._run, name="kline-stream", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            ws.close()
+        self._thread.join(timeout=5)
+
+    def healthy(self) -> bool:
+        return (time.time() - self.last_msg_ts) < self.stale_sec
+
+    def price(self):
+        return self.last_price if self.healthy() else None
+
+    def wait_closed(self, after_ms: int, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.last_closed_ms > after_ms, timeout=timeout)
+
+    def on_message(self, text: str):
+        msg = json.loads(text)
+        k = msg.get("k") if isinstance(msg, dict) else None
+        self.last_msg_ts = time.time()
+        if not k:
+            return
+        self.last_price = float(k["c"])
+        if k.get("x"):
+            with self._cond:
+                self.last_closed_ms = int(k["T"])
+                self.last_closed_bar = k
+                self._cond.notify_all()
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._ws = WebSocket(self.url)
+                # a read timeout doubles as the staleness watchdog
+                self._ws.settimeout(self.stale_sec)
+                logger.info(f"[STREAM] connected {self.url}")
+                backoff = 1.0
+                while not self._stop.is_set():
+                    self.on_message(self._ws.recv())
+            except Exception as exc:
+                if self._stop.is_set():
+                    break
+                logger.warning(f"[STREAM] {self.url} disconnected ({exc}); retry in {backoff:.0f}s")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except OSError:
+                        pass
+                    self._ws = None
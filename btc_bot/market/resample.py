@@ -0,0 +1,198 @@
+"""Higher-timeframe bars built locally from the base interval series.
+
+resample_bars() aggregates a whole history at once (backtests). Resampler does the same one
+closed base bar at a time, and Timeframes keeps one Resampler per interval for a symbol, fed by
+the bars the live loop already fetched. Extra timeframes then cost no requests and never run
+ahead of or behind the base series.
+
+Semantics are the exchange's: buckets are aligned to UTC epoch multiples of the interval; open
+is the first base open, high/low the extremes, close the last base close, volume the sum. With
+closed_only a bucket is only emitted once its final base bar has closed (by now_ms, default the
+current time), so a still-open base bar at the end of the input never yields a partial bucket.
+A bucket whose final base bar is missing (exchange gap) is dropped, while gaps inside a bucket are
+aggregated over what is there.
+"""
+import time
+import threading
+import numpy as np
+from .. import config
+from .bars import Bars
+from .kline_store import BAR_DTYPE, interval_ms
+
+
+def _step(interval: str) -> int:
+    step = interval_ms(interval)
+    if step is None:
+        raise ValueError(f"cannot resample to calendar interval {interval}")
+    return step
+
+
+def resample_bars(arr: np.ndarray, interval: str, closed_only: bool = True, now_ms: int = None) -> np.ndarray:
+    """Aggregate BAR_DTYPE base bars (oldest first) into `interval` BAR_DTYPE bars."""
+    step = _step(interval)
+    if closed_only:
+        # the open base bar (klines()/kline_bars() end with it) must not complete its bucket
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        arr = arr[arr["close_time"] < now_ms]
+    if not len(arr):
+        return np.empty(0, dtype=BAR_DTYPE)
+    bucket = arr["open_time"] // step * step
+    starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    ends = np.concatenate((starts[1:], [len(arr)])) - 1
+
+    out = np.empty(len(starts), dtype=BAR_DTYPE)
+    out["open_time"] = bucket[starts]
+    out["open"] = arr["open"][starts]
+    out["high"] = np.maximum.reduceat(arr["high"], starts)
+    out["low"] = np.minimum.reduceat(arr["low"], starts)
+    out["close"] = arr["close"][ends]
+    out["volume"] = np.add.reduceat(arr["volume"], starts)
+    out["close_time"] = out["open_time"] + step - 1
+    if closed_only:
+        out = out[arr["close_time"][ends] == out["close_time"]]
+    return out
+
+
+class Resampler:
+    """One higher timeframe, updated one closed base bar at a time.
+
+    Keeps the last `keep` closed bars (plus the bucket being built) in a preallocated buffer;
+    `bars()` returns copies, so callers may hold on to them.
+    """
+
+    def __init__(self, interval: str, keep: int = 1000):
+        self.interval = interval
+        self.step = _step(interval)
+        self.keep = keep
+        self.last_base_ms = None
+        self._buf = np.empty(2 * keep, dtype=BAR_DTYPE)
+        self._n = 0
+        self.partial = None  # [open_time, open, high, low, close, volume] of the unfinished bucket
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _append(self, rec):
+        if self._n == len(self._buf):
+            # drop the oldest half instead of growing: only the last `keep` are ever served
+            self._buf[:self.keep] = self._buf[self._n - self.keep:self._n]
+            self._n = self.keep
+        self._buf[self._n] = rec
+        self._n += 1
+
+    def seed(self, base: np.ndarray):
+        """Start over from a block of closed base bars (batch resample, then the open bucket)."""
+        done = resample_bars(base, self.interval)[-self.keep:]
+        self._n = len(done)
+        self._buf[:self._n] = done
+        self.partial = None
+        self.last_base_ms = None
+        if len(base):
+            last_bucket = int(base["open_time"][-1]) // self.step * self.step
+            tail = base[base["open_time"] >= last_bucket]
+            if int(tail["close_time"][-1]) != last_bucket + self.step - 1:
+                self.partial = [last_bucket, float(tail["open"][0]), float(tail["high"].max()),
+                                float(tail["low"].min()), float(tail["close"][-1]), float(tail["volume"].sum())]
+            self.last_base_ms = int(base["close_time"][-1])
+
+    def on_bar(self, open_ms: int, open_: float, high: float, low: float, close: float, volume: float,
+               close_ms: int) -> bool:
+        """Fold in one closed base bar; True when it completed a higher-timeframe bar."""
+        self.last_base_ms = close_ms
+        bucket = open_ms // self.step * self.step
+        p = self.partial
+        if p is None or p[0] != bucket:
+            # a bucket still open here never saw its final base bar: dropped, as in resample_bars
+            p = self.partial = [bucket, open_, high, low, close, volume]
+        else:
+            if high > p[2]:
+                p[2] = high
+            if low < p[3]:
+                p[3] = low
+            p[4] = close
+            p[5] += volume
+        if close_ms == bucket + self.step - 1:
+            self._append((p[0], p[1], p[2], p[3], p[4], p[5], close_ms))
+            self.partial = None
+            return True
+        return False
+
+    def update(self, base: np.ndarray) -> int:
+        """Feed the closed base bars newer than the last one seen; returns the bars completed."""
+        if self.last_base_ms is not None:
+            base = base[base["close_time"] > self.last_base_ms]
+        completed = 0
+        for row in base.tolist():
+            completed += self.on_bar(*row)
+        return completed
+
+    def bars(self, limit: int = None) -> Bars:
+        start = max(0, self._n - min(limit or self.keep, self.keep))
+        return Bars(self._buf[start:self._n].copy())
+
+
+class Timeframes:
+    """Higher timeframes of one symbol, built from its `base_interval` bars in memory.
+
+    update(bars) takes what the live loop fetched (the last row is the still-open base bar).
+    bars(interval, limit) creates the timeframe on first use, seeding it once from `fetch`
+    (binance_api.kline_bars by default, i.e. the kline store) with enough base history, and
+    afterwards only folds in fed bars. If the fed history does not connect to what was seen
+    (restart, long outage) the timeframes are re-seeded on their next read.
+    """
+
+    def __init__(self, symbol: str, base_interval: str, fetch=None, keep: int = 1000):
+        self.symbol = symbol
+        self.base_interval = base_interval
+        self.base_step = _step(base_interval)
+        self.fetch = fetch
+        self.keep = keep
+        self._frames = {}
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    def _fetch(self, limit: int) -> np.ndarray:
+        fetch = self.fetch
+        if fetch is None:
+            from .binance_api import kline_bars as fetch
+        return Bars.of(fetch(self.symbol, self.base_interval, limit)).data[:-1]
+
+    def update(self, bars) -> None:
+        closed = Bars.of(bars).data[:-1]
+        if not len(closed):
+            return
+        with self._lock:
+            for interval, r in self._frames.items():
+                if r.last_base_ms is not None and int(closed["close_time"][0]) > r.last_base_ms + self.base_step:
+                    self._stale.add(interval)
+                    continue
+                r.update(closed)
+
+    def bars(self, interval: str, limit: int) -> Bars:
+        """The last `limit` closed `interval` bars."""
+        with self._lock:
+            r = self._frames.get(interval)
+            if r is None or interval in self._stale or r.keep < limit:
+                step = _step(interval)
+                if step % self.base_step:
+                    raise ValueError(f"{interval} is not a multiple of {self.base_interval}")
+                r = self._frames[interval] = Resampler(interval, max(self.keep, limit))
+                # +1 bucket so the oldest one is complete, +1 for the open base bar
+                r.seed(self._fetch((limit + 1) * (step // self.base_step) + 1))
+                self._stale.discard(interval)
+            return r.bars(limit)
+
+
+_timeframes = {}
+_lock = threading.Lock()
+
+
+def timeframes(symbol: str, base_interval: str = None) -> Timeframes:
+    """Process-wide Timeframes for `symbol` over KLINE_INTERVAL (or `base_interval`)."""
+    base_interval = base_interval or config.KLINE_INTERVAL
+    key = (symbol, base_interval)
+    with _lock:
+        tf = _timeframes.get(key)
+        if tf is None:
+            tf = _timeframes[key] = Timeframes(symbol, base_interval)
+        return tf
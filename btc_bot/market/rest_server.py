@@ -0,0 +1,149 @@
+"""Local stand-in for the Binance REST klines/ticker endpoints (and Telegram), for testing offline.
+
+    python -m btc_bot.market.rest_server --port 9444 --history 300000 --fail-rate 0.05
+
+then point the client at it with BINANCE_REST_URL=http://127.0.0.1:9444. Data comes from a
+SyntheticExchange (market.synthetic). Like the real API it reports the request weight used in
+the current minute (X-MBX-USED-WEIGHT-1M) and answers 429 with Retry-After once --weight-limit is
+exceeded; --fail-rate injects random 503s and --latency-ms a per-request delay. POSTs to
+/bot<token>/sendMessage are answered like the Telegram Bot API and kept in `messages`
+(TELEGRAM_API_URL=http://127.0.0.1:9444).
+"""
+import time
+import json
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .synthetic import FakeResponse, SyntheticExchange
+
+
+class WallClock:
+    """SyntheticExchange clock that follows real time, so new bars appear as they would live."""
+
+    def now_ms(self) -> int:
+        return int(time.time() * 1000)
+
+
+class RestServer:
+    def __init__(self, exchange: SyntheticExchange, host: str = "127.0.0.1", port: int = 0,
+                 weight_limit: int = 6000, request_weight: int = 2, fail_rate: float = 0.0,
+                 latency_ms: float = 0.0, seed: int = None):
+        self.exchange = exchange
+        self.weight_limit = weight_limit
+        self.request_weight = request_weight
+        self.fail_rate = fail_rate
+        self.latency_ms = latency_ms
+        self.rejected = 0
+        self.failed = 0
+        self.messages = []
+        self._rng = random.Random(seed)
+        self._minute = None
+        self._used = 0
+        self._lock = threading.Lock()
+        rest = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out as separate writes; without this keep-alive requests stall ~40ms
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self.reply(rest.handle(self.path))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                self.reply(rest.handle_post(self.path, body))
+
+            def reply(self, r):
+                self.send_response(r.status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(r.content)))
+                for k, v in r.headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(r.content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        host = self.server.server_address[0]
+        return f"http://{host}:{self.port}"
+
+    def _charge(self, weight: int):
+        """Add `weight` to the current minute; returns (used, seconds to the next minute)."""
+        now = time.time()
+        minute = int(now // 60)
+        with self._lock:
+            if minute != self._minute:
+                self._minute, self._used = minute, 0
+            self._used += weight
+            return self._used, 60.0 - now % 60
+
+    def handle(self, path: str) -> FakeResponse:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000.0)
+        parts = urlsplit(path)
+        used, reset_sec = self._charge(self.request_weight)
+        headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+        if used > self.weight_limit:
+            self.rejected += 1
+            headers["Retry-After"] = str(int(reset_sec) + 1)
+            return FakeResponse(b'{"code":-1003,"msg":"Too many requests."}', 429, headers)
+        if self.fail_rate > 0 and self._rng.random() < self.fail_rate:
+            self.failed += 1
+            return FakeResponse(b'{"code":-1001,"msg":"Internal error."}', 503, headers)
+        r = self.exchange.handle(parts.path, dict(parse_qsl(parts.query)))
+        r.headers.update(headers)
+        return r
+
+    def handle_post(self, path: str, body: bytes) -> FakeResponse:
+        if not urlsplit(path).path.endswith("/sendMessage"):
+            return FakeResponse(b'{"ok":false,"error_code":404,"description":"Not Found"}', 404)
+        msg = json.loads(body or b"{}")
+        with self._lock:
+            self.messages.append({"ms": int(time.time() * 1000), "chat_id": msg.get("chat_id"),
+                                  "text": msg.get("text", "")})
+            message_id = len(self.messages)
+        return FakeResponse(json.dumps({"ok": True, "result": {"message_id": message_id}}).encode())
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="rest-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local stand-in for the Binance REST klines endpoints")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9444)
+    ap.add_argument("--history", type=int, default=300000, help="bars of history per symbol/interval")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--price", type=float, default=30000.0)
+    ap.add_argument("--weight-limit", type=int, default=6000, help="request weight per minute before 429s")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 503")
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    exchange = SyntheticExchange(WallClock(), history=args.history, seed=args.seed, price=args.price)
+    server = RestServer(exchange, args.host, args.port, weight_limit=args.weight_limit,
+                        fail_rate=args.fail_rate, latency_ms=args.latency_ms, seed=args.seed)
+    print(f"serving klines on {server.url} (BINANCE_REST_URL={server.url})")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Local stand-in for the Binance kline WebSocket feed, for testing the stream mode offline.
+
+    python -m btc_bot.market.stream_server --port 9443 --bar-sec 5
+
+then run the bot with USE_KLINE_STREAM=true KLINE_STREAM_URL=ws://127.0.0.1:9443.
+"""
+import json
+import time
+import queue
+import random
+import argparse
+import threading
+import socketserver
+from .kline_stream import FrameReader, accept_key, encode_frame, read_http_head, OP_CLOSE, OP_PING, OP_PONG, OP_TEXT
+
+
+def kline_event(symbol: str, interval: str, bar: dict, closed: bool) -> dict:
+    # same shape as Binance's <symbol>@kline_<interval> payload (fields the bot reads)
+    return {
+        "e": "kline",
+        "E": int(time.time() * 1000),
+        "s": symbol.upper(),
+        "k": {
+            "t": bar["open_time"], "T": bar["close_time"], "s": symbol.upper(), "i": interval,
+            "o": f"{bar['open']:.2f}", "h": f"{bar['high']:.2f}", "l": f"{bar['low']:.2f}",
+            "c": f"{bar['close']:.2f}", "v": f"{bar['volume']:.5f}", "x": closed,
+        },
+    }
+
+
+class FeedServer:
+    """Threaded WebSocket server that broadcasts whatever is passed to `publish`."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._clients = set()
+        self._lock = threading.Lock()
+        feed = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                head, rest = read_http_head(self.request)
+                lines = head.decode("latin-1").split("\r\n")
+                headers = {k.strip().lower(): v.strip() for k, v in (l.split(":", 1) for l in lines[1:] if ":" in l)}
+                self.request.sendall((
+                    "HTTP/1.1 101 Switching Protocols\r\n"
+                    "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                    f"Sec-WebSocket-Accept: {accept_key(headers.get('sec-websocket-key', ''))}\r\n\r\n"
+                ).encode())
+                q = queue.Queue(maxsize=1000)
+                with feed._lock:
+                    feed._clients.add(q)
+                reader = threading.Thread(target=self._drain, args=(FrameReader(self.request, rest), q), daemon=True)
+                reader.start()
+                try:
+                    while True:
+                        item = q.get()
+                        if item is None:
+                            break
+                        self.request.sendall(encode_frame(item, OP_TEXT, mask=False))
+                except OSError:
+                    pass
+                finally:
+                    with feed._lock:
+                        feed._clients.discard(q)
+
+            def _drain(self, reader, q):
+                # answer pings, stop the writer when the client goes away
+                try:
+                    while True:
+                        _, opcode, payload = reader.read_frame()
+                        if opcode == OP_PING:
+                            self.request.sendall(encode_frame(payload, OP_PONG, mask=False))
+                        elif opcode == OP_CLOSE:
+                            break
+                except (OSError, ConnectionError):
+                    pass
+                q.put(None)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address[:2]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="feed-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            for q in self._clients:
+                q.put(None)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def clients(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+    def publish(self, msg: dict):
+        data = json.dumps(msg).encode()
+        with self._lock:
+            for q in self._clients:
+                try:
+                    q.put_nowait(data)
+                except queue.Full:
+                    pass
+
+
+def run_synthetic(feed: FeedServer, symbol: str, interval: str, bar_sec: float, ticks: int, price: float):
+    """Random-walk bars on an accelerated clock: `ticks` updates per bar, the last one marked closed."""
+    bar_ms = int(bar_sec * 1000)
+    open_time = int(time.time() * 1000) // bar_ms * bar_ms
+    while True:
+        bar = {"open_time": open_time, "close_time": open_time + bar_ms - 1,
+               "open": price, "high": price, "low": price, "close": price, "volume": 0.0}
+        for t in range(ticks):
+            price *= 1 + random.gauss(0, 0.0008)
+            bar["close"] = price
+            bar["high"] = max(bar["high"], price)
+            bar["low"] = min(bar["low"], price)
+            bar["volume"] += random.expovariate(1.0)
+            feed.publish(kline_event(symbol, interval, bar, closed=(t == ticks - 1)))
+            time.sleep(bar_sec / ticks)
+        open_time += bar_ms
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local stand-in for the Binance kline WebSocket feed")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9443)
+    ap.add_argument("--symbol", default="BTCUSDT")
+    ap.add_argument("--interval", default="5m")
+    ap.add_argument("--bar-sec", type=float, default=5.0, help="wall-clock seconds per bar")
+    ap.add_argument("--ticks", type=int, default=5, help="updates per bar")
+    ap.add_argument("--price", type=float, default=60000.0)
+    args = ap.parse_args()
+
+    feed = FeedServer(args.host, args.port).start()
+    print(f"feed listening on {feed.url}/ws/{args.symbol.lower()}@kline_{args.interval}")
+    try:
+        run_synthetic(feed, args.symbol, args.interval, args.bar_sec, args.ticks, args.price)
+    except KeyboardInterrupt:
+        feed.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Constant-time streaming versions of the indicators in market.indicators and the strategies.
+
+Each object keeps only its running state, is fed one closed bar at a time via `update(...)` and can be
+seeded from history with `seed(...)`. Values follow the pandas definitions used elsewhere in the bot
+(NaN until the window is full) and agree with them to floating-point tolerance.
+"""
+import math
+from collections import deque
+
+NAN = float("nan")
+
+
+class EMA:
+    """Same recursion as `series.ewm(span=period, adjust=False).mean()`."""
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, period: int):
+        self.alpha = 2.0 / (period + 1.0)
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if math.isnan(self.value):
+            self.value = x
+        else:
+            self.value = self.value + self.alpha * (x - self.value)
+        return self.value
+
+    def seed(self, values):
+        for x in values:
+            self.update(x)
+        return self.value
+
+
+class RollingMean:
+    """`series.rolling(period).mean()`; the running sum is re-summed once per window to stop drift."""
+    __slots__ = ("period", "window", "total", "_since_resum", "value")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+        self._since_resum = 0
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(x)
+        self.total += x
+        self._since_resum += 1
+        if self._since_resum >= self.period:
+            self.total = math.fsum(self.window)
+            self._since_resum = 0
+        self.value = self.total / self.period if len(self.window) == self.period else NAN
+        return self.value
+
+    def seed(self, values):
+        for x in values:
+            self.update(x)
+        return self.value
+
+
+class RollingStd:
+    """`series.rolling(period).std()` (ddof=1), plus the matching mean.
+
+    Welford add/remove updates, with an exact two-pass recompute once per window to stop drift.
+    """
+    __slots__ = ("period", "window", "_mean", "_m2", "_since_resum", "mean", "value")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._since_resum = 0
+        self.mean = NAN
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if len(self.window) == self.period:
+            old = self.window[0]
+            n = self.period - 1
+            delta = old - self._mean
+            self._mean -= delta / n
+            self._m2 -= delta * (old - self._mean)
+        self.window.append(x)
+        n = len(self.window)
+        delta = x - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (x - self._mean)
+        self._since_resum += 1
+        if self._since_resum >= self.period:
+            self._mean = math.fsum(self.window) / n
+            self._m2 = math.fsum((v - self._mean) ** 2 for v in self.window)
+            self._since_resum = 0
+
+        if n < self.period:
+            self.mean = self.value = NAN
+            return self.value
+        self.mean = self._mean
+        self.value = math.sqrt(self._m2 / (n - 1)) if self._m2 > 0 else 0.0
+        return self.value
+
+    def seed(self, values):
+        for x in values:
+            self.update(x)
+        return self.value
+
+
+class RSI:
+    """RSI over rolling-mean gains/losses, as `indicators.rsi`."""
+    __slots__ = ("prev", "_gain", "_loss", "value")
+
+    def __init__(self, period: int = 14):
+        self.prev = NAN
+        self._gain = RollingMean(period)
+        self._loss = RollingMean(period)
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        prev, self.prev = self.prev, x
+        if math.isnan(prev):
+            return self.value
+        delta = x - prev
+        gain = self._gain.update(delta if delta > 0 else 0.0)
+        loss = self._loss.update(-delta if delta < 0 else 0.0)
+        if math.isnan(gain) or math.isnan(loss):
+            self.value = NAN
+        elif loss == 0.0:
+            # pandas: gain/0 -> inf -> 100, 0/0 -> NaN
+            self.value = 100.0 if gain > 0 else NAN
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + gain / loss)
+        return self.value
+
+    def seed(self, values):
+        for x in values:
+            self.update(x)
+        return self.value
+
+
+class TrueRange:
+    """`indicators.true_range`: high - low, widened to the previous close once there is one."""
+    __slots__ = ("prev_close", "value")
+
+    def __init__(self):
+        self.prev_close = NAN
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tr = high - low
+        if not math.isnan(self.prev_close):
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self.value = tr
+        return tr
+
+
+class Lag:
+    """The previous input (`series.shift(1)`); NaN on the first update."""
+    __slots__ = ("prev", "value")
+
+    def __init__(self):
+        self.prev = NAN
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        self.value, self.prev = self.prev, x
+        return self.value
@@ -0,0 +1,273 @@
+"""Deterministic synthetic market data and an offline stand-in for the Binance REST API.
+
+bars()/frame() generate a seeded random-walk OHLCV history. SyntheticExchange serves one such
+walk per symbol (1m bars; every other interval and the ticker are derived from it) in the
+exchange's wire format (klines with symbol/interval/limit/startTime/endTime, ticker/price) through
+a requests-like session, so the real client code (binance_api, kline store, pagination) runs
+unchanged but offline. RecordedExchange does the same over recorded history. SimClock replaces
+time.time() while installed, to step through bars faster than real time.
+"""
+import json
+import time
+import zlib
+import threading
+from contextlib import contextmanager
+from unittest import mock
+import numpy as np
+from .kline_store import BAR_DTYPE, interval_ms, to_frame
+
+
+def bars(n: int, interval: str = "5m", seed: int = 1, end_ms: int = None, price: float = 30000.0,
+         vol: float = 0.004) -> np.ndarray:
+    """`n` BAR_DTYPE records, aligned to the interval; the last one opens at or before `end_ms` (default now)."""
+    step = interval_ms(interval)
+    end_ms = int(time.time() * 1000) if end_ms is None else int(end_ms)
+    first_open = end_ms // step * step - (n - 1) * step
+    return _walk(np.random.default_rng(seed), n, first_open, step, price, vol)
+
+
+def frame(n: int, interval: str = "5m", seed: int = 1, end_ms: int = None, price: float = 30000.0):
+    """Same as bars() as a DataFrame shaped like binance_api.klines()."""
+    return to_frame(bars(n, interval, seed, end_ms, price))
+
+
+def _walk(rng, n: int, first_open: int, step: int, price: float, vol: float) -> np.ndarray:
+    arr = np.empty(n, dtype=BAR_DTYPE)
+    if n == 0:
+        return arr
+    close = price * np.exp(np.cumsum(rng.normal(0.0, vol, n)))
+    open_ = np.concatenate(([price], close[:-1]))
+    arr["open_time"] = first_open + np.arange(n, dtype=np.int64) * step
+    arr["open"] = open_
+    arr["high"] = np.maximum(open_, close) * (1.0 + rng.uniform(0.0, vol * 0.75, n))
+    arr["low"] = np.minimum(open_, close) * (1.0 - rng.uniform(0.0, vol * 0.75, n))
+    arr["close"] = close
+    arr["volume"] = rng.lognormal(3.0, 0.6, n)
+    arr["close_time"] = arr["open_time"] + step - 1
+    return arr
+
+
+def kline_rows(arr: np.ndarray) -> list:
+    """BAR_DTYPE records -> raw Binance kline rows (prices and volumes as strings)."""
+    out = []
+    for ot, o, h, l, c, v, ct in arr.tolist():
+        out.append([ot, f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", f"{v:.5f}", ct,
+                    f"{v * c:.4f}", 100, f"{v / 2:.5f}", f"{v * c / 2:.4f}", "0"])
+    return out
+
+
+class SimClock:
+    """Settable clock in epoch ms; while install()ed, time.time() returns it."""
+
+    def __init__(self, start_ms: int = None):
+        self.ms = int(time.time() * 1000) if start_ms is None else int(start_ms)
+
+    def now_ms(self) -> int:
+        return self.ms
+
+    def advance(self, ms: int):
+        self.ms += int(ms)
+
+    @contextmanager
+    def install(self):
+        with mock.patch("time.time", lambda: self.ms / 1000.0):
+            yield self
+
+
+class FakeResponse:
+    def __init__(self, content: bytes, status_code: int = 200, headers: dict = None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+# SyntheticExchange's base series: 1m bars, generated one UTC day at a time
+_BASE_INTERVAL = "1m"
+_BASE_STEP = 60 * 1000
+_BLOCK_BARS = 1440
+_BLOCK_MS = _BLOCK_BARS * _BASE_STEP
+# per-1m volatility, about the 0.004 per 5m bar of bars()
+_BASE_VOL = 0.0018
+# history served before the origin, whatever `history` asks for
+MAX_HISTORY_DAYS = 1500
+
+
+class SyntheticExchange:
+    """Offline Binance spot REST subset over one synthetic market per symbol.
+
+    Each symbol is a seeded 1m random walk; every interval is resampled from it and the ticker is
+    its latest close, so all intervals and the price agree at any time. Each series starts
+    `history` bars before the clock's time at construction (at most MAX_HISTORY_DAYS back) and
+    grows as the clock moves forward. The bar containing the current time is the open one. The walk
+    is generated in day blocks, each seeded by its index, so the data does not depend on the order
+    or size of requests.
+    """
+
+    def __init__(self, clock: SimClock = None, history: int = 5000, seed: int = 1, price: float = 30000.0):
+        self.clock = clock or SimClock()
+        self.history = history
+        self.seed = seed
+        self.price = price
+        self.origin_ms = self.clock.now_ms()
+        self.requests = 0
+        self._day0 = self.origin_ms // _BLOCK_MS * _BLOCK_MS
+        self._blocks = {}
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _block(self, symbol: str, k: int) -> np.ndarray:
+        """Base bars of day block `k` (0 holds the origin)."""
+        blocks = self._blocks.setdefault(symbol, {})
+        # generated outwards from block 0, so each block continues the price of its neighbour
+        while k not in blocks:
+            if not blocks:
+                i = 0
+            elif k > 0:
+                i = max(blocks) + 1
+            else:
+                i = min(blocks) - 1
+            rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), i & 0xFFFFFFFF])
+            first_open = self._day0 + i * _BLOCK_MS
+            if i >= 0:
+                start = self.price if i == 0 else float(blocks[i - 1]["close"][-1])
+                blocks[i] = _walk(rng, _BLOCK_BARS, first_open, _BASE_STEP, start, _BASE_VOL)
+            else:
+                # backwards: scaled to end where the next block opens
+                arr = _walk(rng, _BLOCK_BARS, first_open, _BASE_STEP, 1.0, _BASE_VOL)
+                scale = float(blocks[i + 1]["open"][0]) / float(arr["close"][-1])
+                for c in ("open", "high", "low", "close"):
+                    arr[c] *= scale
+                blocks[i] = arr
+        return blocks[k]
+
+    def _base(self, symbol: str, lo_ms: int, hi_ms: int) -> np.ndarray:
+        """Base bars opening in [lo_ms, hi_ms]."""
+        k_lo, k_hi = (lo_ms - self._day0) // _BLOCK_MS, (hi_ms - self._day0) // _BLOCK_MS
+        arr = np.concatenate([self._block(symbol, k) for k in range(k_lo, k_hi + 1)])
+        open_ms = arr["open_time"]
+        return arr[int(np.searchsorted(open_ms, lo_ms)):int(np.searchsorted(open_ms, hi_ms, side="right"))]
+
+    def series(self, symbol: str, interval: str) -> np.ndarray:
+        """All bars of (symbol, interval) from the start of history up to the open bar."""
+        from .resample import resample_bars
+        step = interval_ms(interval)
+        symbol = symbol.upper()
+        now = self.clock.now_ms()
+        with self._lock:
+            entry = self._series.get((symbol, interval))
+            if entry is None:
+                first = self.origin_ms // step * step - (self.history - 1) * step
+                oldest = self._day0 - MAX_HISTORY_DAYS * _BLOCK_MS
+                entry = self._series[(symbol, interval)] = [max(first, -(-oldest // step) * step),
+                                                            np.empty(0, dtype=BAR_DTYPE)]
+            # closed bars are kept; only the ones from entry[0] on are resampled again
+            fresh = resample_bars(self._base(symbol, entry[0], now), interval, closed_only=False)
+            done = fresh["close_time"] < now
+            if done.any():
+                entry[1] = np.concatenate((entry[1], fresh[done]))
+                entry[0] = int(entry[1]["open_time"][-1]) + step
+            return np.concatenate((entry[1], fresh[~done]))
+
+    def klines(self, symbol: str, interval: str, limit: int = 500, startTime=None, endTime=None) -> list:
+        arr = self.series(symbol, interval)
+        limit = min(int(limit), 1000)
+        open_ms = arr["open_time"]
+        if startTime is not None:
+            lo = int(np.searchsorted(open_ms, int(startTime), side="left"))
+            hi = int(np.searchsorted(open_ms, int(endTime), side="right")) if endTime is not None else len(arr)
+            return kline_rows(arr[lo:min(hi, lo + limit)])
+        hi = int(np.searchsorted(open_ms, int(endTime), side="right")) if endTime is not None else len(arr)
+        return kline_rows(arr[max(0, hi - limit):hi])
+
+    def ticker_price(self, symbol: str) -> dict:
+        arr = self.series(symbol, _BASE_INTERVAL)
+        return {"symbol": symbol.upper(), "price": f"{float(arr['close'][-1]):.2f}"}
+
+    def handle(self, url: str, params: dict = None):
+        self.requests += 1
+        params = params or {}
+        if url.endswith("/api/v3/klines"):
+            body = self.klines(params["symbol"], params["interval"], params.get("limit", 500),
+                               params.get("startTime"), params.get("endTime"))
+        elif url.endswith("/api/v3/ticker/price"):
+            body = self.ticker_price(params["symbol"])
+        else:
+            return FakeResponse(json.dumps({"code": -1, "msg": f"unknown path {url}"}).encode(), 404)
+        return FakeResponse(json.dumps(body, separators=(",", ":")).encode())
+
+    def session(self):
+        return _FakeSession(self)
+
+    @contextmanager
+    def install(self):
+        """Route the shared HTTP session (binance_api and everything on it) to this exchange."""
+        from .. import http
+        with mock.patch.object(http, "_shared", self.session()):
+            yield self
+
+
+class RecordedExchange(SyntheticExchange):
+    """SyntheticExchange over recorded bars instead of generated ones.
+
+    `recorded` maps (symbol, interval) to BAR_DTYPE arrays, e.g. the kline store filled by
+    python -m btc_bot.history. Only bars that have opened by the clock's time are served. The one
+    containing it is the open bar, flattened to its open price so nothing after the clock leaks,
+    and the ticker is that price. Intervals without a recording are resampled from the finest
+    recorded one of the symbol.
+    """
+
+    def __init__(self, clock: SimClock, recorded: dict):
+        super().__init__(clock, history=0)
+        self.recorded = {(symbol.upper(), interval): arr for (symbol, interval), arr in recorded.items()}
+
+    def _finest(self, symbol: str, interval: str = None):
+        candidates = [i for s, i in self.recorded if s == symbol.upper() and interval_ms(i)
+                      and (interval is None or interval_ms(interval) % interval_ms(i) == 0)]
+        if not candidates:
+            raise ValueError(f"no recording of {symbol} to serve {interval or 'a price'} from")
+        return min(candidates, key=interval_ms)
+
+    def series(self, symbol: str, interval: str) -> np.ndarray:
+        from .resample import resample_bars
+        now = self.clock.now_ms()
+        arr = self.recorded.get((symbol.upper(), interval))
+        if arr is None:
+            base = self.series(symbol, self._finest(symbol, interval))
+            return resample_bars(base, interval, closed_only=False)
+        return arr[:int(np.searchsorted(arr["open_time"], now, side="right"))]
+
+    def klines(self, symbol: str, interval: str, limit: int = 500, startTime=None, endTime=None) -> list:
+        rows = super().klines(symbol, interval, limit, startTime, endTime)
+        if rows and rows[-1][6] >= self.clock.now_ms():
+            first = rows[-1]
+            rows[-1] = [first[0]] + [first[1]] * 4 + ["0.00000", first[6], "0.0000", 0, "0.00000", "0.0000", "0"]
+        return rows
+
+    def ticker_price(self, symbol: str) -> dict:
+        arr = self.series(symbol, self._finest(symbol))
+        return {"symbol": symbol.upper(), "price": f"{float(arr['open'][-1]):.2f}"}
+
+
+class _FakeSession:
+    def __init__(self, exchange: SyntheticExchange):
+        self.exchange = exchange
+
+    def get(self, url, params=None, timeout=None, **kw):
+        return self.exchange.handle(url, params)
+
+    def post(self, url, json=None, timeout=None, **kw):
+        return FakeResponse(b'{"ok":true}')
+
+    def close(self):
+        pass
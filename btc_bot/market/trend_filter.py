@@ -0,0 +1,99 @@
+import time
+import numpy as np
+import pandas as pd
+from .. import config
+from ..log_setup import setup_logger
+from .bars import Bars
+from .binance_api import kline_bars
+from .indicators import ema
+from .resample import resample_bars, timeframes
+
+logger = setup_logger()
+
+HOUR_MS = 60 * 60 * 1000
+
+
+class Ema1hFilter:
+    """1h EMA trend filter that only does real work when a new 1h bar closes.
+
+    The EMA over closed 1h bars is cached; the still-open 1h bar is folded in per call with one
+    EMA step using the current price, which is what ema(klines(1h)).iloc[-1] computed on every poll.
+    source="rest" refreshes from 1h klines, source="resample" reads the 1h bars that
+    resample.timeframes() builds from the base-interval bars the loop already fetched, so no
+    separate 1h request stream is needed.
+    """
+
+    def __init__(self, symbol: str, period: int = None, limit: int = None, source: str = None):
+        self.symbol = symbol
+        self.period = period or config.EMA_1H_PERIOD
+        self.limit = limit or config.EMA_1H_KLINES_LIMIT
+        self.source = source or config.EMA_1H_SOURCE
+        self.alpha = 2.0 / (self.period + 1.0)
+        self.ema_closed = None
+        self.closed_bars = 0
+        self.next_refresh_ms = 0
+
+    def _closed_1h(self, now_ms: int) -> Bars:
+        if self.source == "resample":
+            return timeframes(self.symbol).bars("1h", self.limit)
+        h = kline_bars(self.symbol, "1h", self.limit)
+        return Bars(h.data[h.close_time < now_ms])
+
+    def refresh(self, now_ms: int):
+        h = self._closed_1h(now_ms)
+        self.closed_bars = len(h)
+        if not len(h):
+            self.ema_closed = None
+            self.next_refresh_ms = now_ms + 60 * 1000
+            return
+        self.ema_closed = float(ema(pd.Series(h.close), self.period).iloc[-1])
+        last_close_ms = int(h.close_time[-1])
+        # if the exchange has not published the newest closed bar yet this stays in the past and we retry
+        self.next_refresh_ms = last_close_ms + HOUR_MS
+        logger.info(f"[EMA1H] refreshed {self.symbol} ema{self.period}={self.ema_closed:.2f} bars={len(h)} source={self.source}")
+
+    def maybe_refresh(self):
+        """Re-read 1h data if a new 1h bar has closed since the last refresh (cheap no-op otherwise)."""
+        now_ms = int(time.time() * 1000)
+        if now_ms > self.next_refresh_ms:
+            self.refresh(now_ms)
+
+    def allow(self, price: float, refresh: bool = True):
+        """(allow_long, allow_short, ema) at `price`; refresh=False uses the cached EMA as is (no I/O)."""
+        if refresh:
+            self.maybe_refresh()
+
+        # +1 counts the open 1h bar, as len(klines(1h)) did
+        if self.ema_closed is None or self.closed_bars + 1 < self.period + 5:
+            return True, True, None
+        e = self.ema_closed + self.alpha * (price - self.ema_closed)
+        return price > e, price < e, e
+
+
+def ema1h_allow_arrays(df, period: int = None):
+    """Backtest version of Ema1hFilter: per-bar (allow_long, allow_short) for bar i as last closed bar.
+
+    The 1h bars are resampled from `df` itself; the EMA runs over the whole history rather than a
+    sliding EMA_1H_KLINES_LIMIT window.
+    """
+    period = period or config.EMA_1H_PERIOD
+    alpha = 2.0 / (period + 1.0)
+    n = len(df)
+    bars = Bars.of(df)
+    h = resample_bars(bars.data, "1h")
+    if len(h) == 0:
+        return np.ones(n, dtype=bool), np.ones(n, dtype=bool)
+
+    ema_h = ema(pd.Series(h["close"]), period).to_numpy(dtype=float)
+    h_close_ms = h["close_time"]
+    close_ms = bars.close_time
+    close = bars.close
+
+    # latest 1h bar already closed when bar i closes
+    idx = np.searchsorted(h_close_ms, close_ms, side="right") - 1
+    prev = ema_h[np.clip(idx, 0, None)]
+    e = prev + alpha * (close - prev)
+    ready = (idx + 2) >= period + 5
+    allow_long = np.where(ready, close > e, True)
+    allow_short = np.where(ready, close < e, True)
+    return allow_long, allow_short
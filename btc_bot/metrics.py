@@ -0,0 +1,175 @@
+"""Latency histograms and counters for the live loop, served in Prometheus text format.
+
+Off unless start_server() was called (METRICS_PORT > 0): timer()/wrap() then hand back a shared
+no-op context / the function itself, and inc()/observe()/set_gauge() return at the first check.
+
+    METRICS_PORT=9108 python -m btc_bot.main
+    curl -s 127.0.0.1:9108/metrics
+"""
+import time
+import threading
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = False
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DELAY_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "btc_bot_stage_seconds": ("histogram", "Time spent per live-loop stage", SECONDS_BUCKETS),
+    "btc_bot_loop_seconds": ("histogram", "Wall time of one live-loop iteration (excluding the wait)", SECONDS_BUCKETS),
+    "btc_bot_bar_decision_delay_seconds": ("histogram", "Bar close to trading decision", DELAY_BUCKETS),
+    "btc_bot_loop_errors_total": ("counter", "Live-loop iterations that raised", None),
+    "btc_bot_fills_total": ("counter", "Paper fills", None),
+    "btc_bot_http_requests_total": ("counter", "HTTP responses received", None),
+    "btc_bot_http_request_seconds": ("histogram", "HTTP time to response headers", SECONDS_BUCKETS),
+    "btc_bot_http_retries_total": ("counter", "HTTP retries done by the session retry policy", None),
+    "btc_bot_telegram_messages_total": ("counter", "Telegram messages by result (sent, failed, dropped, coalesced)", None),
+    "btc_bot_log_records_total": ("counter", "Log records not written, by result (suppressed, dropped)", None),
+    "btc_bot_binance_used_weight": ("gauge", "Binance X-MBX-USED-WEIGHT-1M from the latest response", None),
+    "btc_bot_weight_backoff_seconds_total": ("counter", "Time polling was held back for the Binance weight limit", None),
+}
+
+_NULL = nullcontext()
+_lock = threading.Lock()
+# name -> {label tuple: value | [bucket counts..., sum, count]}
+_values = {name: {} for name in METRICS}
+
+
+def _key(labels: dict):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    if not ENABLED:
+        return
+    k = _key(labels)
+    with _lock:
+        series = _values[name]
+        series[k] = series.get(k, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _values[name][_key(labels)] = float(value)
+
+
+def observe(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    buckets = METRICS[name][2]
+    k = _key(labels)
+    with _lock:
+        h = _values[name].get(k)
+        if h is None:
+            h = _values[name][k] = [0] * len(buckets) + [0.0, 0]
+        for i, b in enumerate(buckets):
+            if value <= b:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+def timer(stage: str, name: str = "btc_bot_stage_seconds", **labels):
+    """`with metrics.timer("klines"): ...` records the block's duration (no-op when disabled)."""
+    if not ENABLED:
+        return _NULL
+    return _Timer(name, {"stage": stage, **labels} if name == "btc_bot_stage_seconds" else labels)
+
+
+def wrap(stage: str, fn):
+    """`fn` timed as `stage` on every call; `fn` itself when disabled."""
+    if not ENABLED:
+        return fn
+
+    def timed(*args, **kwargs):
+        with timer(stage):
+            return fn(*args, **kwargs)
+    return timed
+
+
+def observe_response(r):
+    """requests response hook (see http.get_session): counts, latency and Binance used weight."""
+    if not ENABLED:
+        return
+    host = r.url.split("/")[2] if "://" in r.url else ""
+    # only the last path segment: Telegram puts the bot token in the path
+    endpoint = r.url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+    inc("btc_bot_http_requests_total", host=host, endpoint=endpoint, status=str(r.status_code))
+    if r.elapsed is not None:
+        observe("btc_bot_http_request_seconds", r.elapsed.total_seconds(), endpoint=endpoint)
+    weight = r.headers.get("x-mbx-used-weight-1m")
+    if weight is not None:
+        set_gauge("btc_bot_binance_used_weight", float(weight))
+
+
+def _fmt_labels(k, extra=()):
+    items = list(k) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{n}="{str(v)}"' for n, v in items) + "}"
+
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for name, (kind, help_, buckets) in METRICS.items():
+            series = _values[name]
+            lines.append(f"# HELP {name} {help_}")
+            lines.append(f"# TYPE {name} {kind}")
+            for k, v in sorted(series.items()):
+                if kind != "histogram":
+                    lines.append(f"{name}{_fmt_labels(k)} {v:g}")
+                    continue
+                for b, c in zip(buckets, v):
+                    lines.append(f"{name}_bucket{_fmt_labels(k, [('le', f'{b:g}')])} {c}")
+                lines.append(f"{name}_bucket{_fmt_labels(k, [('le', '+Inf')])} {v[-1]}")
+                lines.append(f"{name}_sum{_fmt_labels(k)} {v[-2]:g}")
+                lines.append(f"{name}_count{_fmt_labels(k)} {v[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(port: int, host: str = "127.0.0.1"):
+    """Enable collection and serve /metrics from a daemon thread; returns the server."""
+    global ENABLED
+    ENABLED = True
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,175 @@
+"""Monte Carlo robustness check of a backtest's trade list.
+
+    python -m btc_bot.montecarlo --strategy trend --limit 30000 --paths 10000
+    python -m btc_bot.montecarlo --method shuffle --slippage 1:3 --fee 1:1.5 --ruin-pct 30
+
+The backtest's fills are paired into round trips. Each round trip becomes the factor it
+multiplied the account by: ORDER_PCT of equity in, fee and slippage on both legs, as PaperBook
+books them. Every path then redraws the trade sequence, either bootstrapped (with replacement)
+or shuffled (same trades, new order). Each leg's slippage is redrawn as SLIPPAGE_RATE times a
+uniform --slippage multiplier, and each path's fee is FEE_RATE times a uniform --fee multiplier.
+Paths are evaluated as whole arrays in batches spread over worker processes. The report gives
+the return and max-drawdown distributions and the probability of ruin (equity ever falling
+--ruin-pct below the start). The seed fixes the results, whatever the number of workers.
+Strategy rules that depend on the path (kill switch, cooldown) are not replayed.
+"""
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from . import config
+from .log_setup import setup_logger
+from . import backtest, strategy
+
+logger = setup_logger()
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def trades_from_fills(fills) -> dict:
+    """Closed round trips from backtest fills as arrays: side (+1 long, -1 short) and the exit /
+    entry ratio of the prices before slippage. An open position at the end is left out."""
+    s = config.SLIPPAGE_RATE
+    side, ratio, entry_ms, exit_ms = [], [], [], []
+    entry = None
+    for f in fills:
+        action = f["action"]
+        if action in ("open_long", "open_short"):
+            # PaperBook fills at price * (1 +- SLIPPAGE_RATE); undo it to get the traded price
+            raw = f["fill"] / (1 + s) if action == "open_long" else f["fill"] / (1 - s)
+            entry = (1 if action == "open_long" else -1, raw, f["bar_close_ms"])
+        elif entry is not None:
+            raw = f["fill"] / (1 - s) if action == "close_long" else f["fill"] / (1 + s)
+            side.append(entry[0])
+            ratio.append(raw / entry[1])
+            entry_ms.append(entry[2])
+            exit_ms.append(f["bar_close_ms"])
+            entry = None
+    return {"side": np.array(side, dtype=np.int8), "ratio": np.array(ratio, dtype=float),
+            "entry_ms": np.array(entry_ms, dtype=np.int64), "exit_ms": np.array(exit_ms, dtype=np.int64)}
+
+
+def trade_returns(side, ratio, slip_in, slip_out, fee, order_pct):
+    """Equity return of each trade (broadcasts), the same arithmetic as PaperBook open/close."""
+    long_r = (1 - fee) ** 2 * ratio * (1 - slip_out) / (1 + slip_in) - 1
+    short_r = (1 - fee) * (1 - ratio * (1 + slip_out) * (1 + fee) / (1 - slip_in))
+    return order_pct * np.where(side > 0, long_r, short_r)
+
+
+def path_stats(returns) -> dict:
+    """Per-path total return, max drawdown and lowest equity (fractions of the start) of a
+    (paths, trades) return matrix."""
+    equity = np.cumprod(1.0 + returns, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+    drawdown = 1.0 - equity / peak
+    return {"return": equity[:, -1] - 1.0, "max_dd": drawdown.max(axis=1),
+            "min_equity": np.minimum(equity.min(axis=1), 1.0)}
+
+
+def run_batch(trades: dict, paths: int, seed, method: str, slippage, fee, order_pct: float) -> dict:
+    """One batch of resampled paths; `seed` is a numpy SeedSequence (or int)."""
+    rng = np.random.default_rng(seed)
+    n = len(trades["ratio"])
+    if method == "bootstrap":
+        idx = rng.integers(0, n, size=(paths, n))
+    elif method == "shuffle":
+        idx = rng.permuted(np.broadcast_to(np.arange(n), (paths, n)), axis=1)
+    else:
+        raise ValueError("method must be 'bootstrap' or 'shuffle'")
+    s = config.SLIPPAGE_RATE
+    slip_in = s * rng.uniform(slippage[0], slippage[1], size=(paths, n))
+    slip_out = s * rng.uniform(slippage[0], slippage[1], size=(paths, n))
+    fee_rate = config.FEE_RATE * rng.uniform(fee[0], fee[1], size=(paths, 1))
+    returns = trade_returns(trades["side"][idx], trades["ratio"][idx], slip_in, slip_out, fee_rate, order_pct)
+    return path_stats(returns)
+
+
+def _batch_task(args):
+    trades, paths, seed, method, slippage, fee, order_pct, settings = args
+    # worker processes start from the environment's config; carry over the run's settings
+    for name, value in settings.items():
+        setattr(config, name, value)
+    return run_batch(trades, paths, seed, method, slippage, fee, order_pct)
+
+
+def simulate(trades: dict, paths: int = 10000, method: str = "bootstrap", slippage=(1.0, 1.0), fee=(1.0, 1.0),
+             seed: int = 0, workers: int = None, batch: int = 1000) -> dict:
+    """Stats of `paths` resampled paths, concatenated over batches (run in parallel when workers > 1)."""
+    order_pct = max(0.0, min(config.ORDER_PCT, 1.0))
+    sizes = [min(batch, paths - i) for i in range(0, paths, batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    settings = {"SLIPPAGE_RATE": config.SLIPPAGE_RATE, "FEE_RATE": config.FEE_RATE}
+    tasks = [(trades, m, sd, method, slippage, fee, order_pct, settings) for m, sd in zip(sizes, seeds)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        parts = [_batch_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_batch_task, tasks))
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def report(stats: dict, ruin_pct: float) -> dict:
+    out = {"paths": int(len(stats["return"]))}
+    for name in ("return", "max_dd"):
+        values = stats[name] * 100.0
+        out[name] = {"mean": float(values.mean()),
+                     **{f"p{q}": float(v) for q, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}}
+    out["prob_loss"] = float((stats["return"] < 0).mean())
+    out["ruin_pct"] = ruin_pct
+    out["prob_ruin"] = float((stats["min_equity"] <= 1.0 - ruin_pct / 100.0).mean())
+    return out
+
+
+def parse_range(value: str):
+    """"1:2" -> (1.0, 2.0); "1.5" -> (1.5, 1.5)."""
+    lo, _, hi = value.partition(":")
+    return float(lo), float(hi or lo)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Monte Carlo resampling of a backtest's trades")
+    ap.add_argument("--strategy", choices=strategy.names(), default="trend")
+    ap.add_argument("--limit", type=int, default=config.BACKTEST_KLINES_LIMIT)
+    ap.add_argument("--paths", type=int, default=10000)
+    ap.add_argument("--method", choices=["bootstrap", "shuffle"], default="bootstrap")
+    ap.add_argument("--slippage", default="0.5:2", help="SLIPPAGE_RATE multiplier range, drawn per fill")
+    ap.add_argument("--fee", default="1:1.25", help="FEE_RATE multiplier range, drawn per path")
+    ap.add_argument("--ruin-pct", type=float, default=50.0, help="drawdown from the start counted as ruin")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--batch", type=int, default=1000, help="paths per batch (one array operation each)")
+    ap.add_argument("--out", default="", help="write the report as JSON")
+    args = ap.parse_args()
+
+    result = backtest.run_backtest(args.strategy, args.limit)
+    trades = trades_from_fills(result["fills"])
+    if not len(trades["ratio"]):
+        print("no closed trades to resample")
+        return
+    base = path_stats(trade_returns(trades["side"], trades["ratio"], config.SLIPPAGE_RATE, config.SLIPPAGE_RATE,
+                                    config.FEE_RATE, max(0.0, min(config.ORDER_PCT, 1.0)))[None, :])
+    stats = simulate(trades, args.paths, args.method, parse_range(args.slippage), parse_range(args.fee),
+                     args.seed, args.workers, args.batch)
+    rep = report(stats, args.ruin_pct)
+    rep.update(strategy=args.strategy, bars=args.limit, trades=int(len(trades["ratio"])), method=args.method,
+               backtest={"return": float(base["return"][0] * 100.0), "max_dd": float(base["max_dd"][0] * 100.0)})
+    logger.info(f"Monte Carlo done. strategy={args.strategy} trades={rep['trades']} paths={args.paths} method={args.method}")
+
+    print(f"{rep['trades']} trades, {args.paths} {args.method} paths "
+          f"(slippage x{args.slippage}, fee x{args.fee}); backtest return={rep['backtest']['return']:+.2f}% "
+          f"max_dd={rep['backtest']['max_dd']:.2f}%")
+    print(f"{'':<10}{'mean':>9}" + "".join(f"{'p' + str(q):>9}" for q in PERCENTILES))
+    for name in ("return", "max_dd"):
+        row = rep[name]
+        print(f"{name + ' %':<10}{row['mean']:>9.2f}" + "".join(f"{row['p' + str(q)]:>9.2f}" for q in PERCENTILES))
+    print(f"P(loss)={rep['prob_loss'] * 100:.2f}%  P(ruin, -{args.ruin_pct:g}%)={rep['prob_ruin'] * 100:.2f}%")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
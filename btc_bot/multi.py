@@ -0,0 +1,136 @@
+"""Trade many symbols from one process.
+
+    SYMBOLS=BTCUSDT,ETHUSDT:range,SOLUSDT python -m btc_bot.multi
+
+Each symbol gets its own strategy, paper book and state file (state_store.state_file_for) and runs
+as one coroutine on a single asyncio loop. Network calls go to a shared I/O thread pool and
+indicator/decision work to a separate compute pool, so a slow symbol only delays itself. Symbols
+sleep until their next bar is due (scheduler.BarScheduler) instead of polling every POLL_SEC.
+"""
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from . import config
+from . import metrics
+from . import main as bot
+from .log_setup import setup_logger
+from .scheduler import BarScheduler
+from .state_store import load_state, save_state, state_file_for
+from .market.binance_api import kline_bars
+from .market.kline_store import interval_ms
+from .market.resample import timeframes
+from .market.trend_filter import Ema1hFilter
+
+logger = setup_logger()
+
+
+def parse_symbols(spec: str):
+    """"BTCUSDT,ETHUSDT:range" -> [("BTCUSDT", "trend"), ("ETHUSDT", "range")] (default strategy: STRATEGY)."""
+    out = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        symbol, _, strategy = item.partition(":")
+        out.append((symbol.strip().upper(), strategy.strip() or config.STRATEGY))
+    return out
+
+
+class SymbolRunner:
+    def __init__(self, symbol: str, strategy_name: str):
+        self.symbol = symbol
+        self.strat, self.strat_name = bot.pick_strategy(strategy_name)
+        self.state = load_state(state_file_for(symbol))
+        self.live = self.strat.live_context() if config.USE_STREAMING_INDICATORS else None
+        self.ema1h = Ema1hFilter(symbol) if config.EMA_FILTER_1H else None
+
+    def save(self, state):
+        save_state(state, state_file_for(self.symbol))
+
+    def fetch(self):
+        """Everything that may touch the network (io pool): klines, the 1h EMA refresh when due and the
+        intrabar path of a new closed bar; returns (bars, path) for process()."""
+        with metrics.timer("klines"):
+            bars = kline_bars(self.symbol, config.KLINE_INTERVAL, 800)
+        # first, so a 1h bar completed by these bars is in the refresh (EMA_1H_SOURCE=resample)
+        timeframes(self.symbol).update(bars)
+        if self.ema1h is not None:
+            with metrics.timer("ema1h_refresh"):
+                self.ema1h.maybe_refresh()
+        path = None
+        if len(bars) > 1 and int(bars.close_time[-2]) != int(self.state.get("last_bar_ms", 0)):
+            path = bot.intrabar_path(self.symbol, bars, self.state)
+        return bars, path
+
+    def process(self, bars, path=None) -> bool:
+        """Indicators + decision for the latest closed bar (compute only); False if that bar was already handled."""
+        # the open bar's close is the latest trade price
+        price_now = float(bars.close[-1])
+        allow_long, allow_short = True, True
+        if self.ema1h is not None:
+            with metrics.timer("ema1h_filter_allow"):
+                allow_long, allow_short, _ = self.ema1h.allow(price_now, refresh=False)
+
+        with metrics.timer("build_context"):
+            ctx = self.live.context(bars) if self.live else self.strat.build_context(bars.to_frame())
+        if ctx["bar_close_ms"] == int(self.state.get("last_bar_ms", 0)):
+            return False
+        bot.step(self.state, self.strat, self.strat_name, ctx, price_now, allow_long, allow_short,
+                 symbol=self.symbol, save=self.save, path=path)
+        return True
+
+
+async def run_symbol(runner: SymbolRunner, io_pool, cpu_pool):
+    loop = asyncio.get_running_loop()
+    scheduler = BarScheduler(config.KLINE_INTERVAL)
+    while True:
+        t_loop = time.perf_counter()
+        try:
+            bars, path = await loop.run_in_executor(io_pool, runner.fetch)
+            await loop.run_in_executor(cpu_pool, runner.process, bars, path)
+        except Exception:
+            metrics.inc("btc_bot_loop_errors_total")
+            logger.exception(f"[{runner.symbol}] Unhandled exception")
+            bot.tg.send(f"⚠️ [ERROR] {runner.symbol} check logs")
+        metrics.observe("btc_bot_loop_seconds", time.perf_counter() - t_loop)
+
+        # sleep until just after the next bar should have closed; poll tightly while it is late
+        await asyncio.sleep(scheduler.delay(int(runner.state.get("last_bar_ms", 0))))
+
+
+async def run(symbols):
+    runners = [SymbolRunner(sym, strat) for sym, strat in symbols]
+    io_pool = ThreadPoolExecutor(max_workers=config.MULTI_IO_WORKERS, thread_name_prefix="io")
+    cpu_pool = ThreadPoolExecutor(max_workers=config.MULTI_CPU_WORKERS, thread_name_prefix="cpu")
+    try:
+        await asyncio.gather(*(run_symbol(r, io_pool, cpu_pool) for r in runners))
+    finally:
+        io_pool.shutdown(wait=False)
+        cpu_pool.shutdown(wait=False)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the bot for several symbols in one process")
+    ap.add_argument("--symbols", default=config.SYMBOLS or config.SYMBOL,
+                    help="comma list, optional :strategy per symbol, e.g. BTCUSDT,ETHUSDT:range")
+    args = ap.parse_args()
+
+    config.validate_config()
+    if interval_ms(config.KLINE_INTERVAL) is None:
+        raise ValueError("multi runner needs a fixed-length KLINE_INTERVAL")
+    symbols = parse_symbols(args.symbols)
+    if not symbols:
+        raise ValueError("no symbols given (SYMBOLS or --symbols)")
+
+    if config.METRICS_PORT:
+        metrics.start_server(config.METRICS_PORT, config.METRICS_HOST)
+    names = ", ".join(f"{s}:{st}" for s, st in symbols)
+    logger.info(f"Multi runner starting {len(symbols)} symbols: {names}")
+    if bot.tg.enabled():
+        bot.tg.send(f"✅ multi bot started | {len(symbols)} symbols | interval={config.KLINE_INTERVAL}")
+    asyncio.run(run(symbols))
+
+
+if __name__ == "__main__":
+    main()
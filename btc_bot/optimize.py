@@ -0,0 +1,171 @@
+"""Parallel parameter sweep over one shared copy of the market data.
+
+    python -m btc_bot.optimize --strategy trend --limit 30000 \\
+        --grid SL_ATR_MULT=1.0,1.2,1.5 --grid VOL_SPIKE_MULT=1.2:2.0:0.2 --grid EMA_5M_PERIOD=10:30:5
+
+Klines are downloaded once, placed in shared memory and attached by every worker process, so
+tasks only carry their parameter dict. Names are looked up on the strategy module first
+(BB_PERIOD, RSI_BUY, ...) and then on config.
+"""
+import os
+import csv
+import argparse
+import itertools
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from . import config
+from .log_setup import setup_logger
+from .market.binance_api import klines
+from .market.kline_store import BAR_DTYPE, frame_to_array, to_frame
+from .market.trend_filter import ema1h_allow_arrays
+from .trading.intrabar import history_path
+from . import backtest, strategy
+
+logger = setup_logger()
+
+# per-worker state, set by _init_worker
+_worker = {}
+
+
+def parse_grid(specs, strat=None):
+    """["NAME=a,b,c", "NAME=start:stop:step"] -> {"NAME": [values...]} typed like the current setting."""
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        name = name.strip()
+        if not values:
+            raise ValueError(f"bad grid spec {spec!r}, expected NAME=v1,v2 or NAME=start:stop:step")
+        if ":" in values:
+            start, stop, step = (float(v) for v in values.split(":"))
+            raw = list(np.arange(start, stop + step / 2, step))
+        else:
+            raw = [v.strip() for v in values.split(",") if v.strip()]
+        grid[name] = [_cast(strat, name, v) for v in raw]
+    return grid
+
+
+def _cast(strat, name: str, v):
+    current = getattr(strat, name, None) if hasattr(strat, name) else getattr(config, name, None)
+    if isinstance(current, bool):
+        return v if isinstance(v, bool) else str(v).strip().lower() in ("1", "true", "yes", "y")
+    if isinstance(current, int):
+        return int(float(v))
+    return round(float(v), 10)
+
+
+def param_sets(grid):
+    names = list(grid)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+
+
+def apply_params(strat, params) -> dict:
+    """Set each parameter on the strategy module or config; returns the previous values."""
+    old = {}
+    for name, value in params.items():
+        target = strat if hasattr(strat, name) else config
+        if not hasattr(target, name):
+            raise ValueError(f"unknown parameter {name}")
+        old[name] = (target, getattr(target, name))
+        setattr(target, name, value)
+    return old
+
+
+def restore_params(old: dict):
+    for name, (target, value) in old.items():
+        setattr(target, name, value)
+
+
+def _init_worker(shm_name: str, n: int, strategy_name: str):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    bars = np.ndarray((n,), dtype=BAR_DTYPE, buffer=shm.buf)
+    df = to_frame(bars)
+    # workers only have the backtest bars, so INTRABAR_FILLS=1m falls back to the bars' high/low
+    path = history_path(df, "off" if config.INTRABAR_FILLS == "off" else "bar")
+    _worker.update(shm=shm, df=df, strat=backtest.pick_strategy(strategy_name), allow={}, path=path)
+
+
+def evaluate(params: dict) -> dict:
+    strat, df = _worker["strat"], _worker["df"]
+    old = apply_params(strat, params)
+    try:
+        book, fills = backtest.simulate(strat, df, worker_allow(), _worker["path"])
+        result = backtest.summarize(book, fills, float(df["close"].iloc[-1]))
+    finally:
+        restore_params(old)
+    result.pop("fills")
+    return {**params, **result}
+
+
+@contextmanager
+def shared_pool(strategy_name: str, df, workers: int = None):
+    """Process pool whose workers see `df` (via shared memory) as _worker["df"]."""
+    bars = frame_to_array(df)
+    shm = shared_memory.SharedMemory(create=True, size=max(bars.nbytes, 1))
+    try:
+        np.ndarray(bars.shape, dtype=BAR_DTYPE, buffer=shm.buf)[:] = bars
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker,
+                                 initargs=(shm.name, len(bars), strategy_name)) as pool:
+            yield pool
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def worker_allow():
+    """1h filter arrays for the worker's data; only depends on the period, so cached per worker."""
+    if not config.EMA_FILTER_1H:
+        return None
+    key = config.EMA_1H_PERIOD
+    if key not in _worker["allow"]:
+        _worker["allow"][key] = ema1h_allow_arrays(_worker["df"])
+    return _worker["allow"][key]
+
+
+def sweep(strategy_name: str, df, grid: dict, workers: int = None, chunksize: int = None):
+    sets = param_sets(grid)
+    workers = workers or os.cpu_count() or 1
+    chunk = chunksize or max(1, len(sets) // (workers * 4))
+    with shared_pool(strategy_name, df, workers) as pool:
+        results = list(pool.map(evaluate, sets, chunksize=chunk))
+    return sorted(results, key=lambda r: r["pnl_pct"], reverse=True)
+
+
+def format_table(results, names, top: int):
+    cols = names + ["trades", "win_rate", "pnl", "pnl_pct"]
+    rows = [[f"{r[c]:.4g}" if isinstance(r[c], float) else str(r[c]) for c in cols] for r in results[:top]]
+    widths = [max(len(c), *(len(row[i]) for row in rows)) if rows else len(c) for i, c in enumerate(cols)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(cols, widths))]
+    lines += ["  ".join(v.rjust(w) for v, w in zip(row, widths)) for row in rows]
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parallel parameter sweep over backtests")
+    ap.add_argument("--strategy", choices=strategy.names(), default="trend")
+    ap.add_argument("--limit", type=int, default=config.BACKTEST_KLINES_LIMIT)
+    ap.add_argument("--grid", action="append", required=True, help="NAME=v1,v2,... or NAME=start:stop:step")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--out", default="", help="write all results as CSV")
+    args = ap.parse_args()
+
+    config.validate_config()
+    grid = parse_grid(args.grid, backtest.pick_strategy(args.strategy))
+    df = klines(config.SYMBOL, config.KLINE_INTERVAL, args.limit)
+    logger.info(f"Sweep strategy={args.strategy} bars={len(df)} configs={len(param_sets(grid))}")
+
+    results = sweep(args.strategy, df, grid, workers=args.workers)
+    print(format_table(results, list(grid), args.top))
+
+    if args.out:
+        with open(args.out, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=list(results[0]) if results else list(grid))
+            w.writeheader()
+            w.writerows(results)
+        logger.info(f"Sweep results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""End-to-end replay of the live bot against a local mock exchange on an accelerated clock.
+
+    python -m btc_bot.replay --days 7
+    python -m btc_bot.replay --source store --start 2024-01-01 --days 30 --out replay.json
+    python -m btc_bot.replay --days 2 --compare replay.json
+
+main.main() runs unmodified. Its requests go over HTTP to a market.rest_server RestServer
+(klines, ticker/price and a Telegram sendMessage stand-in, with the exchange's used-weight
+headers), which serves either a SyntheticExchange or recorded bars from a kline store
+(RecordedExchange, e.g. filled by python -m btc_bot.history). The loop therefore exercises the
+real session, kline store, scheduler, state journal, ledger, risk exits and Telegram queue.
+Time is an AcceleratedClock: time.time() is simulated, and time.sleep() in the bot's thread
+advances it instead of waiting (or waits 1/--speed of it), so days of bars replay in seconds.
+State, ledger and the bot's kline store go to a temporary directory (--workdir to keep them).
+
+The report gives throughput (bars and simulated time per wall second), the wall time of each
+loop iteration (fetch + decide + save, p50/p95/p99/max), the simulated bar close to decision
+delay, request and Telegram counts and the paper result. --compare exits 1 if bars/s or the
+p95 iteration time regressed past --threshold against an earlier --out file.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from unittest import mock
+import numpy as np
+from . import config
+from . import http, ledger
+from . import main as bot
+from .log_setup import setup_logger
+from .history import parse_time
+from .state_store import load_state
+from .telegram_client import TelegramClient
+from .trading import paper
+from .market import binance_api, resample
+from .market.kline_store import KlineStore, interval_ms
+from .market.rest_server import RestServer
+from .market.synthetic import RecordedExchange, SimClock, SyntheticExchange
+
+logger = setup_logger()
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+class ReplayDone(BaseException):
+    """Ends main.main()'s endless loop at the replay's end (not caught by its `except Exception`)."""
+
+
+class AcceleratedClock(SimClock):
+    """SimClock whose time.sleep() in the installing thread advances simulated time.
+
+    speed=0 does not wait at all; otherwise each sleep also waits 1/speed of its length in real
+    time. Other threads (HTTP server, Telegram worker) keep real sleeps. The first sleep at or
+    past `end_ms` raises ReplayDone. `busy` collects the wall seconds between sleeps, i.e. the
+    duration of each loop iteration.
+    """
+
+    def __init__(self, start_ms: int, end_ms: int, speed: float = 0.0):
+        super().__init__(start_ms)
+        self.end_ms = int(end_ms)
+        self.speed = speed
+        self.busy = []
+
+    @contextmanager
+    def install(self):
+        owner = threading.current_thread()
+        real_sleep = time.sleep
+        mark = [time.perf_counter()]
+
+        def sleep(seconds):
+            if threading.current_thread() is not owner:
+                return real_sleep(seconds)
+            self.busy.append(time.perf_counter() - mark[0])
+            if self.ms >= self.end_ms:
+                raise ReplayDone()
+            self.advance(int(seconds * 1000))
+            if self.speed > 0:
+                real_sleep(seconds / self.speed)
+            mark[0] = time.perf_counter()
+
+        with super().install(), mock.patch("time.sleep", sleep):
+            yield self
+
+
+def recorded_exchange(clock: SimClock, store_dir: str, symbol: str, intervals) -> RecordedExchange:
+    store = KlineStore(store_dir, fetch=None)
+    recorded = {}
+    for interval in intervals:
+        arr = store.read(symbol, interval)
+        if len(arr):
+            recorded[(symbol, interval)] = arr
+    if not recorded:
+        raise ValueError(f"no recorded {symbol} klines in {store_dir} (python -m btc_bot.history)")
+    return RecordedExchange(clock, recorded)
+
+
+def _percentiles(values, qs=(50, 95, 99)) -> dict:
+    if not len(values):
+        return {}
+    out = {f"p{q}": float(v) for q, v in zip(qs, np.percentile(values, qs))}
+    out["max"] = float(np.max(values))
+    return out
+
+
+def run_replay(source: str = "synthetic", days: float = 1.0, start_ms: int = None, speed: float = 0.0,
+               seed: int = 1, history: int = 3000, store_dir: str = None, workdir: str = None,
+               weight_limit: int = 6000) -> dict:
+    """Run main.main() from `start_ms` for `days` of market time; returns the report dict."""
+    symbol, interval = config.SYMBOL, config.KLINE_INTERVAL
+    step = interval_ms(interval)
+    if not step:
+        raise ValueError("replay needs a fixed-length KLINE_INTERVAL")
+
+    clock = AcceleratedClock(0, 0, speed)
+    if source == "store":
+        exchange = recorded_exchange(clock, store_dir or config.KLINE_STORE_DIR, symbol, ("1m", interval))
+        clock.ms = 2 ** 62  # the whole recording, to find its range
+        base = exchange.series(symbol, interval)
+        # leave `history` bars before the start for the bot's warmup
+        first = int(base["open_time"][min(history, len(base) - 1)])
+        start = max(first, start_ms or first)
+        end = min(start + int(days * DAY_MS), int(base["close_time"][-1]))
+    else:
+        start = start_ms or int(time.time() * 1000) - int(days * DAY_MS)
+        end = start + int(days * DAY_MS)
+    # begin just after a bar close, as a freshly started bot would see it
+    clock.ms = start // step * step + config.BAR_CLOSE_DELAY_MS
+    clock.end_ms = end
+    if source == "synthetic":
+        exchange = SyntheticExchange(clock, history=history, seed=seed)
+
+    server = RestServer(exchange, weight_limit=weight_limit).start()
+    tmp = None
+    if workdir is None:
+        tmp = tempfile.TemporaryDirectory()
+        workdir = tmp.name
+    os.makedirs(workdir, exist_ok=True)
+    overrides = dict(BINANCE_REST_URL=server.url, TELEGRAM_API_URL=server.url, TG_BOT_TOKEN="replay",
+                     TG_CHAT_ID="0", USE_KLINE_STREAM=False, STATE_FILE=os.path.join(workdir, "state.json"),
+                     LEDGER_FILE=os.path.join(workdir, "ledger.sqlite"),
+                     KLINE_STORE_DIR=os.path.join(workdir, "klines"))
+    decision_delays = []
+    notifications = []
+    step_fn = bot.step
+
+    def step_timed(state, strat, strat_name, ctx, *args, **kwargs):
+        decision_delays.append(clock.ms / 1000.0 - ctx["bar_close_ms"] / 1000.0)
+        return step_fn(state, strat, strat_name, ctx, *args, **kwargs)
+
+    t0 = time.perf_counter()
+    sim_start = clock.ms
+    try:
+        with mock.patch.multiple(config, **overrides):
+            tg = TelegramClient()
+            send = tg.send
+            # sent messages can be fewer: the queue coalesces bursts within TG_COALESCE_SEC of real time
+            tg.send = lambda text: notifications.append(text) or send(text)
+            # fresh module-level caches, so nothing from an earlier run (or the real API) is reused
+            with clock.install(), mock.patch.object(bot, "tg", tg), mock.patch.object(bot, "step", step_timed), \
+                    mock.patch.object(http, "_shared", None), mock.patch.object(binance_api, "_store", None), \
+                    mock.patch.object(bot, "_ema1h_filters", {}), mock.patch.object(bot, "_scheduler", None), \
+                    mock.patch.object(resample, "_timeframes", {}), mock.patch.object(ledger, "_ledger", None):
+                try:
+                    bot.main()
+                except ReplayDone:
+                    pass
+                finally:
+                    if ledger._ledger is not None:
+                        ledger._ledger.close()
+                    tg.close()
+            wall = time.perf_counter() - t0
+            state = load_state(config.STATE_FILE)
+    finally:
+        server.stop()
+        if tmp is not None:
+            tmp.cleanup()
+
+    price = float(exchange.series(symbol, interval)["close"][-1])
+    pv = paper.portfolio_value(state["paper"], price)
+    start_cash = float(state["paper"]["start_cash"])
+    sim_sec = (clock.ms - sim_start) / 1000.0
+    bars = len(decision_delays)
+    # the first iteration loads the initial history; the rest is the steady state
+    busy = np.array(clock.busy[1:], dtype=float)
+    return {
+        "source": source, "symbol": symbol, "interval": interval, "strategy": config.STRATEGY,
+        "start_ms": sim_start, "end_ms": clock.ms, "days": sim_sec / 86400.0,
+        "bars": bars, "iterations": len(clock.busy), "wall_s": wall,
+        "bars_per_s": bars / wall if wall > 0 else 0.0, "speedup": sim_sec / wall if wall > 0 else 0.0,
+        "first_iteration_ms": clock.busy[0] * 1000.0 if clock.busy else None,
+        "iteration_ms": _percentiles(busy * 1000.0),
+        "decision_delay_s": _percentiles(np.array(decision_delays)),
+        "requests": exchange.requests, "rejected": server.rejected, "notifications": len(notifications),
+        "telegram_messages": len(server.messages),
+        "trades": int(state["paper"]["trades"]), "end_value": pv,
+        "pnl_pct": (pv - start_cash) / start_cash * 100.0 if start_cash > 0 else 0.0,
+    }
+
+
+def compare(report: dict, baseline_file: str, threshold: float) -> bool:
+    """Print throughput and p95 iteration time against a baseline report; True if either regressed."""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    regressed = False
+    checks = (("bars_per_s", report["bars_per_s"], base["bars_per_s"], False),
+              ("iteration_ms.p95", report["iteration_ms"].get("p95", 0.0), base["iteration_ms"].get("p95", 0.0), True))
+    for name, cur, old, higher_is_worse in checks:
+        ratio = cur / old if old > 0 else float("inf")
+        worse = ratio > 1.0 + threshold if higher_is_worse else ratio < 1.0 - threshold
+        regressed |= worse
+        print(f"{name:<20} {old:12.3f} -> {cur:12.3f}  x{ratio:.2f}" + ("  REGRESSION" if worse else ""))
+    return regressed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay the live bot against a local mock exchange on an accelerated clock")
+    ap.add_argument("--source", choices=["synthetic", "store"], default="synthetic",
+                    help="synthetic random walk, or recorded klines from --store-dir")
+    ap.add_argument("--days", type=float, default=1.0, help="market time to replay")
+    ap.add_argument("--start", default="", help="UTC date/time or epoch ms (default: --days before now / start of the recording)")
+    ap.add_argument("--speed", type=float, default=0.0, help="simulated seconds per real second (0: no waiting)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--history", type=int, default=3000, help="bars before the start (warmup)")
+    ap.add_argument("--store-dir", default="", help="kline store with the recording (default KLINE_STORE_DIR)")
+    ap.add_argument("--workdir", default="", help="keep state, ledger and klines here instead of a temp dir")
+    ap.add_argument("--weight-limit", type=int, default=6000, help="mock exchange request weight per minute")
+    ap.add_argument("--out", default="", help="write the report as JSON")
+    ap.add_argument("--compare", default="", help="earlier --out file to compare against")
+    ap.add_argument("--threshold", type=float, default=0.2, help="change ratio counted as a regression")
+    ap.add_argument("--verbose", action="store_true", help="keep the bot's per-bar INFO logging")
+    args = ap.parse_args()
+
+    config.validate_config()
+    level = logger.level
+    if not args.verbose:
+        logger.setLevel("WARNING")
+    try:
+        report = run_replay(args.source, args.days, parse_time(args.start) if args.start else None, args.speed,
+                            args.seed, args.history, args.store_dir or None, args.workdir or None, args.weight_limit)
+    finally:
+        logger.setLevel(level)
+    logger.info(f"Replay done. source={args.source} bars={report['bars']} wall={report['wall_s']:.1f}s")
+
+    it = report["iteration_ms"]
+    print(f"{report['symbol']} {report['interval']} {report['strategy']}: {report['days']:.2f} days, {report['bars']} bars "
+          f"in {report['wall_s']:.2f}s ({report['bars_per_s']:.0f} bars/s, x{report['speedup']:.0f} real time)")
+    if it:
+        print(f"iteration ms: p50={it['p50']:.2f} p95={it['p95']:.2f} p99={it['p99']:.2f} max={it['max']:.2f} "
+              f"(first {report['first_iteration_ms']:.0f})")
+    dd = report["decision_delay_s"]
+    if dd:
+        print(f"bar close -> decision (simulated): p50={dd['p50']:.2f}s max={dd['max']:.2f}s")
+    print(f"requests={report['requests']} rejected={report['rejected']} notifications={report['notifications']} "
+          f"telegram_posts={report['telegram_messages']} "
+          f"trades={report['trades']} end={report['end_value']:.2f} ({report['pnl_pct']:+.2f}%)")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare and compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""When the live loop should look for its next closed bar.
+
+Polling every POLL_SEC mostly finds that nothing has closed. BarScheduler instead sleeps until
+BAR_CLOSE_DELAY_MS after the next KLINE_INTERVAL close (the close that follows the last handled
+bar), and only polls at the tight CLOSE_POLL_SEC cadence inside the CLOSE_WINDOW_SEC window after
+it, while the exchange has not served the new bar yet. With 5m bars and POLL_SEC=5 that is
+1-2 polls per bar instead of 60. The first poll also lands right after the close, rather than up
+to POLL_SEC late. If nothing arrives within the window (maintenance, a stuck bar), the loop waits
+for the following close and tries again.
+
+Every delay is stretched by http.used_weight.backoff(): once the IP has used WEIGHT_BACKOFF_PCT
+of BINANCE_WEIGHT_LIMIT this minute (X-MBX-USED-WEIGHT-1M), or after a 418/429, polling resumes
+in the next minute or when the ban ends, before the exchange starts refusing requests.
+"""
+import time
+from . import config
+from . import metrics
+from .http import used_weight
+from .market.kline_store import interval_ms
+
+
+class BarScheduler:
+    def __init__(self, interval: str = None, close_delay_ms: int = None, close_poll_sec: float = None,
+                 close_window_sec: float = None):
+        self.interval = interval or config.KLINE_INTERVAL
+        # None for calendar intervals (1M): those fall back to POLL_SEC
+        self.step = interval_ms(self.interval)
+        self.close_delay_ms = config.BAR_CLOSE_DELAY_MS if close_delay_ms is None else close_delay_ms
+        self.close_poll_sec = close_poll_sec or config.CLOSE_POLL_SEC
+        self.close_window_sec = config.CLOSE_WINDOW_SEC if close_window_sec is None else close_window_sec
+
+    def next_due_ms(self, last_bar_ms: int, now_ms: int) -> int:
+        """When the bar after `last_bar_ms` (a close_time, 0 if none) should be available."""
+        if last_bar_ms:
+            boundary = last_bar_ms + 1 + self.step
+        else:
+            boundary = (now_ms // self.step + 1) * self.step
+        due = boundary + self.close_delay_ms
+        if now_ms >= due + self.close_window_sec * 1000:
+            # given up on that bar: aim at the next close from now instead of hammering the API
+            due = ((now_ms - self.close_delay_ms) // self.step + 1) * self.step + self.close_delay_ms
+        return due
+
+    def schedule_delay(self, last_bar_ms: int, now_ms: int = None) -> float:
+        """Seconds to the next poll, before any weight backoff."""
+        if not self.step:
+            return float(config.POLL_SEC)
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        due = self.next_due_ms(last_bar_ms, now_ms)
+        if now_ms < due:
+            return (due - now_ms) / 1000.0
+        # the bar should be closed but has not been served yet
+        return self.close_poll_sec
+
+    def backoff(self, now_ms: int = None) -> float:
+        """Seconds requests must wait for the exchange weight limit (0.0 with headroom)."""
+        return used_weight.backoff(config.BINANCE_WEIGHT_LIMIT, config.WEIGHT_BACKOFF_PCT,
+                                   None if now_ms is None else now_ms / 1000.0)
+
+    def delay(self, last_bar_ms: int, now_ms: int = None) -> float:
+        """Seconds to sleep before the next poll, including the used-weight backoff."""
+        wait = self.schedule_delay(last_bar_ms, now_ms)
+        backoff = self.backoff(now_ms)
+        if backoff > wait:
+            metrics.inc("btc_bot_weight_backoff_seconds_total", backoff - wait)
+            return backoff
+        return wait
+
+    def sleep(self, last_bar_ms: int) -> float:
+        wait = self.delay(last_bar_ms)
+        time.sleep(wait)
+        return wait
@@ -1,35 +1,161 @@
 import os
 import json
+import threading
 from . import config
 
-def load_state():
+def state_file_for(symbol: str) -> str:
+    """Per-symbol state file next to STATE_FILE, e.g. /app/data/state_ethusdt.json (multi-symbol runner)."""
+    base, ext = os.path.splitext(config.STATE_FILE)
+    return f"{base}_{symbol.lower()}{ext or '.json'}"
+
+# Last persisted copy per target file, for change detection: {path: (flat_state, journal_records)}
+_persisted = {}
+_lock = threading.Lock()
+
+def _flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict) and v:
+            out.update(_flatten(v, f"{prefix}{k}."))
+        else:
+            out[f"{prefix}{k}"] = v
+    return out
+
+def _apply_record(state: dict, record: dict):
+    # deletions first: a key can turn from {} into a dict with children (or back) in one record
+    for key in record.get("del", []):
+        *parents, leaf = key.split(".")
+        d = state
+        for p in parents:
+            d = d.get(p) if isinstance(d, dict) else None
+        if isinstance(d, dict):
+            d.pop(leaf, None)
+    for key, value in record.get("set", {}).items():
+        *parents, leaf = key.split(".")
+        d = state
+        for p in parents:
+            if not isinstance(d.get(p), dict):
+                d[p] = {}
+            d = d[p]
+        d[leaf] = value
+
+def _removed_keys(old: dict, flat: dict):
+    """Keys of `old` gone from `flat`, each collapsed to the outermost parent that vanished with it."""
+    removed = []
+    for key in old:
+        if key in flat:
+            continue
+        parts = key.split(".")
+        for i in range(1, len(parts) + 1):
+            prefix = ".".join(parts[:i])
+            if prefix not in flat and not any(k.startswith(prefix + ".") for k in flat):
+                break
+        if prefix not in removed:
+            removed.append(prefix)
+    return removed
+
+def journal_path(path: str) -> str:
+    return path + ".journal"
+
+def _read_journal(path: str):
+    records = []
+    try:
+        with open(journal_path(path), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # torn last line from a crash mid-append; everything before it is intact
+                    break
+    except FileNotFoundError:
+        pass
+    return records
+
+def load_state(path: str = None):
+    """Snapshot plus replay of the change journal written by save_state."""
+    path = path or config.STATE_FILE
     try:
-        with open(config.STATE_FILE, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             state = json.load(f)
     except Exception:
         state = {}
-    return normalize_state(state)
+    records = _read_journal(path) if config.STATE_JOURNAL else []
+    for record in records:
+        _apply_record(state, record)
+    state = normalize_state(state)
+    with _lock:
+        _persisted[path] = (_flatten(json.loads(json.dumps(state))), len(records))
+    return state
 
-def save_state(state):
-    # Write atomically: write to a temp file then replace the target file.
-    dirpath = os.path.dirname(config.STATE_FILE) or "."
+def _resolve_target(path: str = None) -> str:
+    target_file = path or config.STATE_FILE
+    dirpath = os.path.dirname(target_file) or "."
     try:
         os.makedirs(dirpath, exist_ok=True)
-        target_file = config.STATE_FILE
     except PermissionError:
         # Fallback to a local ./data directory if configured path is not writable.
         fallback_dir = os.path.join(os.getcwd(), "data")
         os.makedirs(fallback_dir, exist_ok=True)
-        target_file = os.path.join(fallback_dir, os.path.basename(config.STATE_FILE))
-        # update config so other parts of the app read/write the same file
-        config.STATE_FILE = target_file
+        target_file = os.path.join(fallback_dir, os.path.basename(target_file))
+        if dirpath == (os.path.dirname(config.STATE_FILE) or "."):
+            # update config so other parts of the app (and per-symbol files) use the same directory
+            config.STATE_FILE = os.path.join(fallback_dir, os.path.basename(config.STATE_FILE))
+    return target_file
 
+def _write_snapshot(state, target_file: str):
+    # Write atomically: write to a temp file then replace the target file.
     tmp_path = target_file + ".tmp"
     with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(state, f, ensure_ascii=False, indent=2)
+        if config.STATE_FSYNC:
+            f.flush()
+            os.fsync(f.fileno())
     # atomic replace (works on Windows and POSIX)
     os.replace(tmp_path, target_file)
 
+def save_state(state, path: str = None) -> bool:
+    """Persist `state` if it changed since the last load/save; returns True if anything was written.
+
+    Changes are appended to `<file>.journal` as one compact JSON record of changed/removed keys.
+    After STATE_COMPACT_EVERY records the journal is folded into a fresh snapshot. Replaying a
+    journal over a snapshot that already contains it is harmless, so a crash between writing the
+    snapshot and truncating the journal still recovers the exact state.
+    """
+    target_file = _resolve_target(path)
+    # a JSON round-trip gives a private copy with the types that will be read back
+    flat = _flatten(json.loads(json.dumps(state, ensure_ascii=False)))
+
+    with _lock:
+        prev = _persisted.get(target_file)
+        if prev is not None and prev[0] == flat and os.path.exists(target_file):
+            return False
+
+        if not config.STATE_JOURNAL or prev is None or not os.path.exists(target_file):
+            _write_snapshot(state, target_file)
+            if config.STATE_JOURNAL and os.path.exists(journal_path(target_file)):
+                os.remove(journal_path(target_file))
+            _persisted[target_file] = (flat, 0)
+            return True
+
+        old, n_records = prev
+        record = {"set": {k: v for k, v in flat.items() if k not in old or old[k] != v}}
+        removed = _removed_keys(old, flat)
+        if removed:
+            record["del"] = removed
+        with open(journal_path(target_file), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            if config.STATE_FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        n_records += 1
+
+        if n_records >= config.STATE_COMPACT_EVERY:
+            _write_snapshot(state, target_file)
+            os.remove(journal_path(target_file))
+            n_records = 0
+        _persisted[target_file] = (flat, n_records)
+        return True
+
 def normalize_state(state: dict) -> dict:
     state.setdefault("position", "flat")
     state.setdefault("last_bar_ms", 0)
@@ -0,0 +1,60 @@
+"""Strategy registry.
+
+A strategy is a module with:
+
+    indicator_specs()  {column: market.indicator_graph spec} it reads
+    context(row)       ctx dict for one closed bar from its indicator row
+    signals(df)        the same for every bar at once, from a frame with the indicator columns
+    decide(ctx, position, allow_long, allow_short) -> action
+
+plus build_context / build_signals / live_context for running it alone. The functions below
+evaluate several registered strategies on one feed: their indicators are merged into one
+IndicatorGraph, so an indicator asked for by N strategies is still computed once per bar.
+"""
+from ..market.indicator_graph import IndicatorGraph, closed_row, merge
+from .live_context import GraphLiveContext
+from . import trend_breakout_5m, range_reversion_5m
+
+STRATEGIES = {}
+
+
+def register(name: str, module):
+    STRATEGIES[name] = module
+    return module
+
+
+def get(name: str):
+    try:
+        return STRATEGIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown strategy {name!r}. Use one of: {', '.join(names())}") from None
+
+
+def names() -> list:
+    return sorted(STRATEGIES)
+
+
+def graph(strategy_names) -> IndicatorGraph:
+    return IndicatorGraph(merge(*(get(n).indicator_specs() for n in strategy_names)))
+
+
+def build_contexts(strategy_names, df) -> dict:
+    """{name: ctx} for the last closed bar of `df`, computing the shared indicators once."""
+    graph(strategy_names).add_columns(df)
+    row = closed_row(df)
+    return {n: get(n).context(row) for n in strategy_names}
+
+
+def build_signals(strategy_names, df) -> dict:
+    """{name: whole-history signals} over `df`, computing the shared indicators once."""
+    graph(strategy_names).add_columns(df)
+    return {n: get(n).signals(df) for n in strategy_names}
+
+
+def live_context(strategy_names) -> GraphLiveContext:
+    """Incremental build_contexts: one streaming graph fed per closed bar, ctx is {name: ctx}."""
+    return GraphLiveContext({n: get(n) for n in strategy_names})
+
+
+register("trend", trend_breakout_5m)
+register("range", range_reversion_5m)
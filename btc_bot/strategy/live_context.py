@@ -0,0 +1,64 @@
+from ..market.bars import Bars
+from ..market.indicator_graph import IndicatorGraph, merge
+
+
+class GraphLiveContext:
+    """Incremental replacement for `build_context(df)` in the live loop, for several strategies
+    ({name: module}) over one shared indicator graph.
+
+    Each closed bar updates every distinct indicator once; the ctx is {name: strategy.context(row)}.
+    `context(df)` feeds only the closed bars it has not seen yet and falls back to a full re-seed
+    when the history does not line up.
+    """
+
+    def __init__(self, strategies: dict):
+        self.strategies = dict(strategies)
+        self.last_close_ms = None
+        self.ctx = None
+        self.reset()
+
+    def reset(self):
+        self.last_close_ms = None
+        self.graph = IndicatorGraph(merge(*(s.indicator_specs() for s in self.strategies.values()))).live()
+
+    def on_bar(self, open_time_ms: int, high: float, low: float, close: float, volume: float, close_ms: int):
+        """Consume one closed bar; returns the ctx build_context would give with it as the last closed one."""
+        row = self.graph.update(open_time_ms, high, low, close, volume, close_ms)
+        return {name: s.context(row) for name, s in self.strategies.items()}
+
+    def context(self, df):
+        # Bars or a klines() DataFrame; the last row is the still-open bar, as in build_context's iloc[-2]
+        bars = Bars.of(df)
+        close_ms = bars.close_time[:-1]
+        if not len(close_ms):
+            raise ValueError("need at least one closed bar")
+
+        start = 0
+        if self.last_close_ms is not None:
+            seen = int(close_ms.searchsorted(self.last_close_ms))
+            if seen < len(close_ms) and int(close_ms[seen]) == self.last_close_ms:
+                start = seen + 1
+            else:
+                # history moved past what we hold (gap or restart): rebuild from scratch
+                self.reset()
+        if start >= len(close_ms):
+            return self.ctx
+
+        # plain Python numbers for the per-bar loop
+        rows = bars.data[start:len(close_ms)].tolist()
+        for open_ms, _, high, low, close, volume, bar_close_ms in rows:
+            self.ctx = self.on_bar(open_ms, high, low, close, volume, bar_close_ms)
+        self.last_close_ms = int(close_ms[-1])
+        return self.ctx
+
+
+class StrategyLiveContext(GraphLiveContext):
+    """GraphLiveContext of one strategy module; the ctx is that strategy's own dict."""
+
+    def __init__(self, module):
+        self.module = module
+        super().__init__({module.__name__: module})
+
+    def on_bar(self, open_time_ms, high, low, close, volume, close_ms):
+        row = self.graph.update(open_time_ms, high, low, close, volume, close_ms)
+        return self.module.context(row)
@@ -1,19 +1,8 @@
+import sys
 from .. import config
-import pandas as pd
-
-def rsi(series: pd.Series, period: int = 14) -> pd.Series:
-    delta = series.diff()
-    gain = delta.clip(lower=0).rolling(period).mean()
-    loss = (-delta.clip(upper=0)).rolling(period).mean()
-    rs = gain / loss
-    return 100 - (100 / (1 + rs))
-
-def bollinger(series: pd.Series, period: int = 20, mult: float = 2.0):
-    ma = series.rolling(period).mean()
-    sd = series.rolling(period).std()
-    upper = ma + mult * sd
-    lower = ma - mult * sd
-    return ma, upper, lower
+from ..market import indicator_graph as ind
+from ..market.indicators import rsi, bollinger  # noqa: F401  (defined here before; still importable)
+from .live_context import StrategyLiveContext
 
 # Tunables via env (optional)
 BB_PERIOD = int(config.env_int("BB_PERIOD", 20))
@@ -22,23 +11,46 @@ RSI_PERIOD = int(config.env_int("RSI_PERIOD", 14))
 RSI_BUY = float(config.env_float("RSI_BUY", 30))
 RSI_SELL = float(config.env_float("RSI_SELL", 70))
 
+def indicator_specs():
+    # "bb" becomes the bb_mid / bb_up / bb_lo columns
+    return {"rsi": ind.rsi(RSI_PERIOD), "bb": ind.bollinger(BB_PERIOD, BB_MULT)}
+
+def add_indicators(df):
+    return ind.IndicatorGraph(indicator_specs()).add_columns(df)
+
+def context(row):
+    return {
+        "bar_close_ms": int(row["bar_close_ms"]),
+        "close": float(row["close"]),
+        "bb_mid": float(row["bb_mid"]),
+        "bb_up": float(row["bb_up"]),
+        "bb_lo": float(row["bb_lo"]),
+        "rsi": float(row["rsi"]),
+    }
+
 def build_context(df):
-    df["rsi"] = rsi(df["close"], RSI_PERIOD)
-    mid, up, lo = bollinger(df["close"], BB_PERIOD, BB_MULT)
-    df["bb_mid"] = mid
-    df["bb_up"] = up
-    df["bb_lo"] = lo
+    add_indicators(df)
+    return context(ind.closed_row(df))
 
-    last = df.iloc[-2]  # closed
+def signals(df):
+    # Whole-history version of context(): row i is the ctx for bar i as last closed bar.
     return {
-        "bar_close_ms": int(last["close_time"].value // 10**6),
-        "close": float(last["close"]),
-        "bb_mid": float(last["bb_mid"]),
-        "bb_up": float(last["bb_up"]),
-        "bb_lo": float(last["bb_lo"]),
-        "rsi": float(last["rsi"]),
+        "bar_close_ms": df["close_time"].to_numpy(dtype="datetime64[ms]").astype("int64"),
+        "close": df["close"].to_numpy(dtype=float),
+        "bb_mid": df["bb_mid"].to_numpy(dtype=float),
+        "bb_up": df["bb_up"].to_numpy(dtype=float),
+        "bb_lo": df["bb_lo"].to_numpy(dtype=float),
+        "rsi": df["rsi"].to_numpy(dtype=float),
     }
 
+def build_signals(df):
+    add_indicators(df)
+    return signals(df)
+
+def live_context():
+    # build_context with O(1) work per new closed bar
+    return StrategyLiveContext(sys.modules[__name__])
+
 def decide(ctx, position, allow_long=True, allow_short=True):
     # mean-reversion:
     # open long when close < lower band and RSI low
@@ -1,41 +1,58 @@
+import sys
 from .. import config
-from ..market.indicators import ema, atr
+from ..market import indicator_graph as ind
+from .live_context import StrategyLiveContext
+import numpy as np
 
-def build_context(df):
-    df["ema5m"] = ema(df["close"], config.EMA_5M_PERIOD)
-    df["atr"] = atr(df, config.ATR_PERIOD)
-    df["vol_sma"] = df["volume"].rolling(config.VOL_SMA_PERIOD).mean()
+def indicator_specs():
+    # columns read by context/signals, computed by the shared indicator graph
+    cols = {
+        "ema5m": ind.ema(config.EMA_5M_PERIOD),
+        "atr": ind.atr(config.ATR_PERIOD),
+        "prev_high": ind.prev("high"),
+        "prev_low": ind.prev("low"),
+    }
+    if config.USE_VOL_FILTER:
+        cols["vol_sma"] = ind.sma(config.VOL_SMA_PERIOD, "volume")
+    return cols
 
-    last = df.iloc[-2]  # closed
-    prev = df.iloc[-3]
+def add_indicators(df):
+    return ind.IndicatorGraph(indicator_specs()).add_columns(df)
 
-    atr_v = float(last["atr"])
-    vol_sma_v = float(last["vol_sma"]) if config.USE_VOL_FILTER else float("nan")
+def context(row):
+    # ctx for one closed bar from its indicator row (closed_row / LiveGraph.update)
+    close = float(row["close"])
+    ema5m = float(row["ema5m"])
+    atr_v = float(row["atr"])
+    volume = float(row["volume"])
+    prev_high = float(row["prev_high"])
+    prev_low = float(row["prev_low"])
+    vol_sma_v = float(row["vol_sma"]) if config.USE_VOL_FILTER else float("nan")
 
-    breakout_up = (last["close"] > prev["high"]) and (last["close"] > last["ema5m"])
-    breakout_dn = (last["close"] < prev["low"]) and (last["close"] < last["ema5m"])
+    breakout_up = (close > prev_high) and (close > ema5m)
+    breakout_dn = (close < prev_low) and (close < ema5m)
 
     # exits
-    exit_long = (last["close"] < prev["low"]) or (config.USE_TRAILING and last["close"] < last["ema5m"])
-    exit_short = (last["close"] > prev["high"]) or (config.USE_TRAILING and last["close"] > last["ema5m"])
+    exit_long = (close < prev_low) or (config.USE_TRAILING and close < ema5m)
+    exit_short = (close > prev_high) or (config.USE_TRAILING and close > ema5m)
 
     # filters
     vol_ok = True
     if config.USE_VOL_FILTER:
-        vol_ok = float(last["volume"]) >= config.VOL_SPIKE_MULT * vol_sma_v
+        vol_ok = volume >= config.VOL_SPIKE_MULT * vol_sma_v
 
     atr_ok = True
     if config.USE_ATR_FILTER:
-        atr_ok = (atr_v / float(last["close"])) >= config.MIN_ATR_PCT
+        atr_ok = (atr_v / close) >= config.MIN_ATR_PCT
 
     return {
-        "bar_close_ms": int(last["close_time"].value // 10**6),
-        "close": float(last["close"]),
-        "prev_high": float(prev["high"]),
-        "prev_low": float(prev["low"]),
-        "ema5m": float(last["ema5m"]),
+        "bar_close_ms": int(row["bar_close_ms"]),
+        "close": close,
+        "prev_high": prev_high,
+        "prev_low": prev_low,
+        "ema5m": ema5m,
         "atr": atr_v,
-        "volume": float(last["volume"]),
+        "volume": volume,
         "vol_sma": vol_sma_v,
         "vol_ok": bool(vol_ok),
         "atr_ok": bool(atr_ok),
@@ -45,6 +62,60 @@ def build_context(df):
         "exit_short": bool(exit_short),
     }
 
+def build_context(df):
+    add_indicators(df)
+    return context(ind.closed_row(df))
+
+def signals(df):
+    # Whole-history version of context() over a frame that already has the indicator columns:
+    # row i holds the ctx for bar i as the last closed bar. Indicators are causal, so values match.
+    close = df["close"].to_numpy(dtype=float)
+    ema5m = df["ema5m"].to_numpy(dtype=float)
+    atr_v = df["atr"].to_numpy(dtype=float)
+    volume = df["volume"].to_numpy(dtype=float)
+    prev_high = df["prev_high"].to_numpy(dtype=float)
+    prev_low = df["prev_low"].to_numpy(dtype=float)
+    vol_sma = df["vol_sma"].to_numpy(dtype=float) if config.USE_VOL_FILTER else np.full(len(df), np.nan)
+
+    breakout_up = (close > prev_high) & (close > ema5m)
+    breakout_dn = (close < prev_low) & (close < ema5m)
+
+    exit_long = (close < prev_low) | (config.USE_TRAILING & (close < ema5m))
+    exit_short = (close > prev_high) | (config.USE_TRAILING & (close > ema5m))
+
+    vol_ok = np.ones(len(df), dtype=bool)
+    if config.USE_VOL_FILTER:
+        vol_ok = volume >= config.VOL_SPIKE_MULT * vol_sma
+
+    atr_ok = np.ones(len(df), dtype=bool)
+    if config.USE_ATR_FILTER:
+        atr_ok = (atr_v / close) >= config.MIN_ATR_PCT
+
+    return {
+        "bar_close_ms": df["close_time"].to_numpy(dtype="datetime64[ms]").astype("int64"),
+        "close": close,
+        "prev_high": prev_high,
+        "prev_low": prev_low,
+        "ema5m": ema5m,
+        "atr": atr_v,
+        "volume": volume,
+        "vol_sma": vol_sma,
+        "vol_ok": vol_ok,
+        "atr_ok": atr_ok,
+        "breakout_up": breakout_up,
+        "breakout_dn": breakout_dn,
+        "exit_long": exit_long,
+        "exit_short": exit_short,
+    }
+
+def build_signals(df):
+    add_indicators(df)
+    return signals(df)
+
+def live_context():
+    # build_context with O(1) work per new closed bar
+    return StrategyLiveContext(sys.modules[__name__])
+
 def decide(ctx, position, allow_long=True, allow_short=True):
     # returns action: "open_long", "open_short", "close_long", "close_short", "hold"
     if position == "long" and ctx["exit_long"]:
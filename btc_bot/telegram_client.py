@@ -1,15 +1,40 @@
+import time
+import queue
+import atexit
 import logging
+import threading
 from . import config
+from . import metrics
 from .http import get_session
 
 logger = logging.getLogger("btc-bot")
 
+# Telegram rejects longer messages
+MAX_MESSAGE_LEN = 4096
+
+_STOP = object()
+
 
 class TelegramClient:
+    """Telegram notifier whose send() never blocks the caller.
+
+    Messages go to a bounded queue drained by one daemon thread. The worker waits TG_COALESCE_SEC
+    after the first message of a burst, then delivers the burst as one message; identical texts
+    collapse into one line with an "(xN)" count. Sends are spaced by at least TG_MIN_INTERVAL_SEC
+    and a 429 waits for Telegram's retry_after. When the queue is full new messages are dropped
+    (and logged). Pending messages are flushed at interpreter exit, bounded by TG_FLUSH_TIMEOUT_SEC.
+    With TG_ASYNC=false send() delivers synchronously in the caller, 429 waits included.
+    """
+
     def __init__(self):
         self.token = config.TG_BOT_TOKEN
         self.chat_id = config.TG_CHAT_ID
-        self._session = get_session()
+        # 429s are handled by the worker (Telegram's retry_after), not by blocking urllib3 retries
+        self._session = get_session(status_forcelist=(500, 502, 503, 504))
+        self._queue = queue.Queue(maxsize=config.TG_QUEUE_SIZE)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._next_send = 0.0
 
     def enabled(self) -> bool:
         return bool(self.token) and bool(self.chat_id)
@@ -17,10 +42,139 @@ class TelegramClient:
     def send(self, text: str):
         if not self.enabled():
             return
-        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        if not config.TG_ASYNC:
+            self._deliver(text)
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(text)
+        except queue.Full:
+            metrics.inc("btc_bot_telegram_messages_total", result="dropped")
+            logger.warning(f"Telegram queue full, dropped: {text[:80]!r}")
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far was delivered (or given up); False on timeout."""
+        if self._worker is None or not self._worker.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = None):
+        """Deliver what is queued, then stop the worker."""
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            return
+        timeout = config.TG_FLUSH_TIMEOUT_SEC if timeout is None else timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Telegram queue still full at shutdown; pending messages dropped")
+            return
+        worker.join(timeout)
+        if worker.is_alive():
+            logger.warning("Telegram flush timed out at shutdown")
+
+    # ----- worker -----
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                if self._worker is None:
+                    atexit.register(self.close)
+                self._worker = threading.Thread(target=self._run, name="telegram", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, markers, stop = [], [], False
+            deadline = time.monotonic() + config.TG_COALESCE_SEC
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if stop or markers:
+                    # flush/close: send what we have now, plus anything already queued
+                    try:
+                        item = self._queue.get_nowait()
+                        continue
+                    except queue.Empty:
+                        break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            for text in self._coalesce(batch):
+                self._deliver(text)
+            for m in markers:
+                m.set()
+            if stop:
+                return
+
+    @staticmethod
+    def _coalesce(batch):
+        """Burst -> messages: duplicates counted, distinct texts joined, each message <= MAX_MESSAGE_LEN."""
+        counts = {}
+        for text in batch:
+            counts[text] = counts.get(text, 0) + 1
+        if len(batch) > len(counts):
+            metrics.inc("btc_bot_telegram_messages_total", len(batch) - len(counts), result="coalesced")
+        parts = [t if n == 1 else f"{t} (x{n})" for t, n in counts.items()]
+
+        out, cur = [], ""
+        for p in parts:
+            p = p[:MAX_MESSAGE_LEN]
+            if cur and len(cur) + 2 + len(p) > MAX_MESSAGE_LEN:
+                out.append(cur)
+                cur = ""
+            cur = f"{cur}\n\n{p}" if cur else p
+        if cur:
+            out.append(cur)
+        return out
+
+    def _deliver(self, text: str):
+        """Send one message, waiting out Telegram's retry_after on a 429 (up to 3 attempts)."""
+        for _ in range(3):
+            wait = self._next_send - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            retry_after = self._post(text)
+            self._next_send = time.monotonic() + config.TG_MIN_INTERVAL_SEC
+            if not retry_after:
+                return
+            self._next_send = time.monotonic() + retry_after
+        metrics.inc("btc_bot_telegram_messages_total", result="failed")
+        logger.warning(f"Telegram still rate limited, dropped: {text[:80]!r}")
+
+    def _post(self, text: str):
+        """POST one message; returns Telegram's retry_after seconds on a 429, else None."""
+        url = f"{config.TELEGRAM_API_URL}/bot{self.token}/sendMessage"
         payload = {"chat_id": self.chat_id, "text": text}
         try:
             r = self._session.post(url, json=payload, timeout=10)
+            if r.status_code == 429:
+                try:
+                    retry_after = float(r.json().get("parameters", {}).get("retry_after", 1))
+                except Exception:
+                    retry_after = 1.0
+                logger.warning(f"Telegram rate limited, retry in {retry_after:.0f}s")
+                return retry_after
             r.raise_for_status()
-        except Exception as exc:
+            metrics.inc("btc_bot_telegram_messages_total", result="sent")
+        except Exception:
+            metrics.inc("btc_bot_telegram_messages_total", result="failed")
             logger.exception("Failed to send Telegram message")
+        return None
@@ -0,0 +1,239 @@
+import numpy as np
+from .. import config
+from ..market.kline_store import interval_ms
+from .paper import PaperBook
+
+# Kill-switch days are Asia/Bangkok days (UTC+7, no DST)
+DAY_OFFSET_MS = 7 * 60 * 60 * 1000
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def bar_day(close_ms: int) -> int:
+    """Day number of a bar for the kill switch; backtests use it in place of the wall-clock date."""
+    return (close_ms + DAY_OFFSET_MS) // DAY_MS
+
+
+class DecisionEngine:
+    """Per-bar trading rules shared by the live bot and the backtests.
+
+    Takes plain numbers (no DataFrame, no dict state) and owns the PaperBook plus the rule state
+    the live bot keeps in its state file: re-entry cooldown, kill-switch day and halt flag.
+    Order on each bar, as the live loop always did it: day roll / kill switch, re-entry cooldown
+    (nothing else happens while it runs, not even risk exits), TP/SL/trailing exits, then the
+    strategy's action, with opens blocked while the kill switch is on. Every fill starts a
+    REENTRY_BARS cooldown.
+    """
+    __slots__ = ("book", "cooldown_until_bar_ms", "day", "day_start_value", "halt_today",
+                 "use_tp_sl", "tp_mult", "sl_mult", "use_trailing", "trail_mult", "trail_activate_r",
+                 "reentry_ms", "use_kill_switch", "max_daily_dd_pct")
+
+    def __init__(self, book: PaperBook = None, bar_ms: int = None):
+        self.book = book if book is not None else PaperBook(config.START_CASH_USDT)
+        self.cooldown_until_bar_ms = 0
+        self.day = None
+        self.day_start_value = 0.0
+        self.halt_today = False
+
+        # settings are read once; optimizer runs build a fresh engine per parameter set
+        self.use_tp_sl = config.USE_TP_SL
+        self.tp_mult = config.TP_ATR_MULT
+        self.sl_mult = config.SL_ATR_MULT
+        self.use_trailing = config.USE_TRAILING
+        self.trail_mult = config.TRAIL_ATR_MULT
+        self.trail_activate_r = config.TRAIL_ACTIVATE_R
+        bar_ms = bar_ms or interval_ms(config.KLINE_INTERVAL) or 5 * 60 * 1000
+        self.reentry_ms = config.REENTRY_BARS * bar_ms
+        self.use_kill_switch = config.USE_KILL_SWITCH
+        self.max_daily_dd_pct = float(config.MAX_DAILY_DD_PCT)
+
+    @classmethod
+    def from_state(cls, state: dict, bar_ms: int = None) -> "DecisionEngine":
+        eng = cls(PaperBook.from_state(state), bar_ms)
+        eng.cooldown_until_bar_ms = int(state.get("cooldown_until_bar_ms", 0) or 0)
+        eng.day = state.get("day")
+        eng.day_start_value = float(state.get("day_start_value", 0.0) or 0.0)
+        eng.halt_today = bool(state.get("halt_today", False))
+        return eng
+
+    def store(self, state: dict):
+        self.book.store(state)
+        state["cooldown_until_bar_ms"] = self.cooldown_until_bar_ms
+        state["day"] = self.day
+        state["day_start_value"] = self.day_start_value
+        state["halt_today"] = self.halt_today
+
+    def new_day(self, day, start_value: float):
+        self.day = day
+        self.day_start_value = start_value
+        self.halt_today = False
+
+    def kill_switch(self, value: float):
+        """Halt opens for the rest of the day once the drawdown from the day start reaches
+        MAX_DAILY_DD_PCT; returns the drawdown % when it triggers on this call, else None."""
+        if not self.use_kill_switch or self.halt_today or not self.day_start_value:
+            return None
+        dd_pct = (self.day_start_value - value) / self.day_start_value * 100.0
+        if dd_pct >= self.max_daily_dd_pct:
+            self.halt_today = True
+            return dd_pct
+        return None
+
+    def risk_exit(self, price: float):
+        """TP/SL/trailing check of the open position against one price (the bar close).
+
+        May arm or move the trailing stop; returns (close action, "tp" | "sl" | "trail") or None.
+        """
+        book = self.book
+        entry_atr = book.entry_atr
+        if entry_atr <= 0:
+            return None
+        entry_price = book.entry_price
+
+        if book.position == "long":
+            if self.use_tp_sl:
+                if price >= entry_price + self.tp_mult * entry_atr:
+                    return "close_long", "tp"
+                if price <= entry_price - self.sl_mult * entry_atr:
+                    return "close_long", "sl"
+            if self.use_trailing:
+                if not book.trail_active:
+                    # activate trailing when profit >= R * atr
+                    if price - entry_price >= self.trail_activate_r * entry_atr:
+                        book.trail_active = True
+                        book.trail_stop = price - self.trail_mult * entry_atr
+                else:
+                    candidate = price - self.trail_mult * entry_atr
+                    if candidate > book.trail_stop:
+                        book.trail_stop = candidate
+                    if price <= book.trail_stop:
+                        return "close_long", "trail"
+
+        elif book.position == "short":
+            if self.use_tp_sl:
+                if price <= entry_price - self.tp_mult * entry_atr:
+                    return "close_short", "tp"
+                if price >= entry_price + self.sl_mult * entry_atr:
+                    return "close_short", "sl"
+            if self.use_trailing:
+                if not book.trail_active:
+                    if entry_price - price >= self.trail_activate_r * entry_atr:
+                        book.trail_active = True
+                        book.trail_stop = price + self.trail_mult * entry_atr
+                else:
+                    candidate = price + self.trail_mult * entry_atr
+                    if candidate < book.trail_stop or book.trail_stop == 0.0:
+                        book.trail_stop = candidate
+                    if book.trail_stop and price >= book.trail_stop:
+                        return "close_short", "trail"
+        return None
+
+    def first_touch(self, side: str, entry_price: float, entry_atr: float, open_, high, low,
+                    trail_active: bool = False, trail_stop: float = 0.0):
+        """Which of TP, SL or trailing stop a price path touches first, and the fill price.
+
+        The path is arrays of (sub-)bar open/high/low after the entry. Returns
+        (index, kind, price, trail_active, trail_stop) with index -1 / kind None when nothing is
+        touched; the trail state is then the one at the end of the path. Within one (sub-)bar the
+        order of high and low is unknown, so a stop is assumed to fill before TP, and the trail only
+        uses highs (lows for shorts) of earlier (sub-)bars. A (sub-)bar opening beyond a level
+        fills at its open.
+        """
+        if side == "short":
+            # a short is a long on the negated price path
+            k, kind, price, active, stop = self.first_touch(
+                "long", -entry_price, entry_atr, -np.asarray(open_), -np.asarray(low), -np.asarray(high),
+                trail_active, -trail_stop if trail_active else 0.0)
+            return k, kind, (-price if k >= 0 else None), active, (-stop if active else 0.0)
+
+        high = np.asarray(high, dtype=float)
+        low = np.asarray(low, dtype=float)
+        n = len(high)
+        if entry_atr <= 0 or n == 0:
+            return -1, None, None, trail_active, trail_stop
+
+        sl_level = entry_price - self.sl_mult * entry_atr
+        tp_level = entry_price + self.tp_mult * entry_atr
+        if self.use_tp_sl:
+            sl_hit = low <= sl_level
+            tp_hit = high >= tp_level
+        else:
+            sl_hit = tp_hit = np.zeros(n, dtype=bool)
+
+        trail_hit = np.zeros(n, dtype=bool)
+        best0 = trail_stop + self.trail_mult * entry_atr if trail_active else -np.inf
+        if self.use_trailing:
+            # best price seen before each (sub-)bar
+            best = np.maximum.accumulate(np.concatenate(([best0], high[:-1])))
+            active = best >= entry_price + self.trail_activate_r * entry_atr
+            if trail_active:
+                active[:] = True
+            tstop = best - self.trail_mult * entry_atr
+            trail_hit = active & (low <= tstop)
+
+        stop_hit = sl_hit | trail_hit
+        hit = stop_hit | tp_hit
+        if not hit.any():
+            if not self.use_trailing:
+                return -1, None, None, trail_active, trail_stop
+            best_end = max(best0, float(high.max()))
+            active_end = trail_active or best_end >= entry_price + self.trail_activate_r * entry_atr
+            return -1, None, None, active_end, (best_end - self.trail_mult * entry_atr) if active_end else 0.0
+
+        k = int(np.argmax(hit))
+        o = float(open_[k])
+        if stop_hit[k]:
+            # falling through both: the higher of the two stops is touched first
+            if trail_hit[k] and (not sl_hit[k] or tstop[k] >= sl_level):
+                return k, "trail", min(o, float(tstop[k])), True, float(tstop[k])
+            return k, "sl", min(o, sl_level), trail_active, trail_stop
+        return k, "tp", max(o, tp_level), trail_active, trail_stop
+
+    def on_bar(self, bar_close_ms: int, close: float, atr: float, action: str, path=None):
+        """Apply cooldown, risk exits and the strategy `action` for one closed bar.
+
+        Without `path` the risk exits are checked against the bar close. With a path (see
+        trading.intrabar) they are checked against the bar's high/low or its sub-bars and fill at
+        the touched level. Returns (action, reason, fill): reason is "risk" or "signal" with the
+        paper fill dict (risk fills carry "exit": "tp" | "sl" | "trail"), "cooldown" / "halted"
+        when the bar was skipped or an open was blocked (fill None), or (None, None, None) when
+        nothing happened.
+        """
+        if bar_close_ms < self.cooldown_until_bar_ms:
+            return None, "cooldown", None
+
+        book = self.book
+        position = book.position
+        reason = "signal"
+        exit_kind = None
+        price = close
+        if position != "flat":
+            if path is not None:
+                risk = path.risk_exit(self)
+                if risk is not None:
+                    action, exit_kind, price = risk
+            else:
+                risk = self.risk_exit(close)
+                if risk is not None:
+                    action, exit_kind = risk
+            if risk is not None:
+                reason = "risk"
+
+        if action == "open_long" and position == "flat":
+            if self.halt_today:
+                return action, "halted", None
+            fill = book.open_long(close, atr)
+        elif action == "open_short" and position == "flat":
+            if self.halt_today:
+                return action, "halted", None
+            fill = book.open_short(close, atr)
+        elif action == "close_long" and position == "long":
+            fill = book.close_long(price)
+        elif action == "close_short" and position == "short":
+            fill = book.close_short(price)
+        else:
+            return None, None, None
+
+        if exit_kind is not None:
+            fill["exit"] = exit_kind
+        self.cooldown_until_bar_ms = bar_close_ms + self.reentry_ms
+        return action, reason, fill
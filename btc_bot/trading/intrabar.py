@@ -0,0 +1,123 @@
+"""Price paths for intrabar TP/SL/trailing fills (INTRABAR_FILLS=bar|1m).
+
+DecisionEngine.on_bar(..., path=...) asks the path which risk exit the open position touched
+inside the bar. BarPath is one bar's worth for the live bot; HistoryPath covers a whole backtest
+and scans ahead once per position with DecisionEngine.first_touch, so a position costs a few
+numpy passes instead of per-bar Python over every sub-bar.
+"""
+import numpy as np
+from .. import config
+from ..market.bars import Bars
+from ..market.kline_store import interval_ms
+
+MODES = ("off", "bar", "1m")
+
+
+def _ohlc(df):
+    # Bars or a klines() DataFrame -> contiguous open/high/low/close_ms arrays
+    bars = Bars.of(df)
+    return tuple(np.ascontiguousarray(c) for c in (bars.open, bars.high, bars.low, bars.close_time))
+
+
+def _close_action(position: str) -> str:
+    return "close_long" if position == "long" else "close_short"
+
+
+class BarPath:
+    """Open/high/low of the (sub-)bars inside one closed bar; carries the trail state on the book."""
+    __slots__ = ("open", "high", "low")
+
+    def __init__(self, open_, high, low):
+        self.open, self.high, self.low = open_, high, low
+
+    def risk_exit(self, engine):
+        book = engine.book
+        k, kind, price, active, stop = engine.first_touch(
+            book.position, book.entry_price, book.entry_atr, self.open, self.high, self.low,
+            book.trail_active, book.trail_stop)
+        if k < 0:
+            book.trail_active, book.trail_stop = active, stop
+            return None
+        return _close_action(book.position), kind, price
+
+
+def bar_path(df, sub_df=None, bar_ms: int = None):
+    """BarPath for the last closed bar of `df` (row -2): its 1m sub-bars from `sub_df` when
+    given and present, else the bar's own open/high/low."""
+    last = Bars.of(df).data[-2]
+    if sub_df is not None and len(sub_df):
+        bar_ms = bar_ms or interval_ms(config.KLINE_INTERVAL)
+        o, h, l, close_ms = _ohlc(sub_df)
+        bar_close_ms = int(last["close_time"])
+        inside = (close_ms > bar_close_ms - bar_ms) & (close_ms <= bar_close_ms)
+        if inside.any():
+            return BarPath(o[inside], h[inside], l[inside])
+    return BarPath(np.array([float(last["open"])]), np.array([float(last["high"])]),
+                   np.array([float(last["low"])]))
+
+
+class HistoryPath:
+    """Whole-history (sub-)bars for backtests. bar(close_ms) selects the (sub-)bars of one bar,
+    i.e. those closing in (close_ms - bar_ms, close_ms]."""
+
+    def __init__(self, open_, high, low, close_ms, bar_ms: int, chunk: int = 256):
+        self.open, self.high, self.low = open_, high, low
+        self.close_ms = close_ms
+        self.bar_ms = bar_ms
+        self.chunk = chunk
+        self.lo = self.hi = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the scan-ahead cache; call before replaying another run over the same path."""
+        self._key = None
+        self._start = self._end = 0
+        self._entry = None
+        self._touch = None
+
+    @classmethod
+    def from_frame(cls, df, bar_ms: int, chunk: int = 256):
+        return cls(*_ohlc(df), bar_ms, chunk)
+
+    def bar(self, bar_close_ms: int):
+        self.lo = int(np.searchsorted(self.close_ms, bar_close_ms - self.bar_ms, side="right"))
+        self.hi = int(np.searchsorted(self.close_ms, bar_close_ms, side="right"))
+        return self
+
+    def risk_exit(self, engine):
+        book = engine.book
+        key = (id(engine), book.trades, book.position)
+        if key != self._key:
+            # first bar checked for this position: scan from here with the book's trail state
+            self._key = key
+            self._start = self._end = self.lo
+            self._entry = (book.entry_price, book.entry_atr, book.trail_active, book.trail_stop)
+            self._touch = None
+
+        n = len(self.close_ms)
+        while self._touch is None and self._end < min(self.hi, n):
+            span = max(self.chunk, 2 * (self._end - self._start))
+            self._end = min(n, self._start + span)
+            s, e = self._start, self._end
+            entry_price, entry_atr, trail_active, trail_stop = self._entry
+            k, kind, price, _, _ = engine.first_touch(
+                book.position, entry_price, entry_atr, self.open[s:e], self.high[s:e], self.low[s:e],
+                trail_active, trail_stop)
+            if k >= 0:
+                self._touch = (s + k, kind, price)
+
+        if self._touch is not None and self.lo <= self._touch[0] < self.hi:
+            return _close_action(book.position), self._touch[1], self._touch[2]
+        return None
+
+
+def history_path(df, mode: str, sub_df=None, bar_ms: int = None):
+    """HistoryPath for a backtest over `df`: None for "off", the bars themselves for "bar",
+    `sub_df` (1m klines covering df) for "1m"."""
+    if mode == "off":
+        return None
+    bar_ms = bar_ms or interval_ms(config.KLINE_INTERVAL)
+    if mode == "1m" and sub_df is not None:
+        return HistoryPath.from_frame(sub_df, bar_ms)
+    return HistoryPath.from_frame(df, bar_ms)
+
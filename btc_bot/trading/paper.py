@@ -9,99 +9,157 @@ def portfolio_value(paper: dict, price: float) -> float:
     short_liab = float(paper["btc_short"]) * price
     return cash + long_val - short_liab
 
-def open_long(state, price: float, atr_at_entry: float):
-    paper = state["paper"]
-    cash = float(paper["cash"])
-    spend = cash * max(0.0, min(config.ORDER_PCT, 1.0))
-    fill = apply_slippage(price, "buy")
-    fee = spend * config.FEE_RATE
-    qty = (spend - fee) / fill
-
-    paper["cash"] = cash - spend
-    paper["btc_long"] = qty
-    paper["avg_long"] = fill
-
-    paper["btc_short"] = 0.0
-    paper["avg_short"] = 0.0
-
-    paper["entry_price"] = fill
-    paper["entry_atr"] = atr_at_entry
-    paper["trail_active"] = False
-    paper["trail_stop"] = 0.0
 
-    paper["trades"] = int(paper["trades"]) + 1
-    state["position"] = "long"
+class PaperBook:
+    """Typed paper portfolio with the same open/close semantics as the dict functions below.
+
+    Backtests use it directly (no dict lookups or float()/int() coercion per access); the live
+    bot keeps the JSON schema of state["paper"] and converts with from_state()/store().
+    """
+    FIELDS = ("enabled", "start_cash", "cash", "btc_long", "avg_long", "btc_short", "avg_short",
+              "realized_pnl", "trades", "trail_active", "trail_stop", "entry_atr", "entry_price")
+    __slots__ = FIELDS + ("position",)
+
+    def __init__(self, start_cash: float = None, enabled: bool = True):
+        start_cash = float(config.START_CASH_USDT if start_cash is None else start_cash)
+        self.enabled = enabled
+        self.start_cash = start_cash
+        self.cash = start_cash
+        self.btc_long = 0.0
+        self.avg_long = 0.0
+        self.btc_short = 0.0
+        self.avg_short = 0.0
+        self.realized_pnl = 0.0
+        self.trades = 0
+        self.trail_active = False
+        self.trail_stop = 0.0
+        self.entry_atr = 0.0
+        self.entry_price = 0.0
+        self.position = "flat"
+
+    @classmethod
+    def from_state(cls, state: dict) -> "PaperBook":
+        p = state["paper"]
+        book = cls.__new__(cls)
+        book.enabled = bool(p.get("enabled", True))
+        for f in ("start_cash", "cash", "btc_long", "avg_long", "btc_short", "avg_short",
+                  "realized_pnl", "trail_stop", "entry_atr", "entry_price"):
+            setattr(book, f, float(p.get(f, 0.0) or 0.0))
+        book.trades = int(p.get("trades", 0))
+        book.trail_active = bool(p.get("trail_active", False))
+        book.position = state.get("position", "flat")
+        return book
+
+    def to_dict(self) -> dict:
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    def store(self, state: dict):
+        """Write back into the JSON-compatible state (other keys in state["paper"] are kept)."""
+        state.setdefault("paper", {}).update(self.to_dict())
+        state["position"] = self.position
+
+    def value(self, price: float) -> float:
+        return self.cash + self.btc_long * price - self.btc_short * price
+
+    def open_long(self, price: float, atr_at_entry: float):
+        cash = self.cash
+        spend = cash * max(0.0, min(config.ORDER_PCT, 1.0))
+        fill = apply_slippage(price, "buy")
+        fee = spend * config.FEE_RATE
+        qty = (spend - fee) / fill
+
+        self.cash = cash - spend
+        self.btc_long = qty
+        self.avg_long = fill
+        self.btc_short = 0.0
+        self.avg_short = 0.0
+
+        self.entry_price = fill
+        self.entry_atr = atr_at_entry
+        self.trail_active = False
+        self.trail_stop = 0.0
+
+        self.trades += 1
+        self.position = "long"
+        return {"fill": fill, "qty": qty, "fee": fee}
+
+    def close_long(self, price: float):
+        qty = self.btc_long
+        fill = apply_slippage(price, "sell")
+        gross = qty * fill
+        fee = gross * config.FEE_RATE
+        net = gross - fee
+        realized = (fill - self.avg_long) * qty - fee
+
+        self.realized_pnl += realized
+        self.cash += net
+        self.btc_long = 0.0
+        self.avg_long = 0.0
+
+        self.trail_active = False
+        self.trail_stop = 0.0
+
+        self.trades += 1
+        self.position = "flat"
+        return {"fill": fill, "qty": qty, "fee": fee, "realized": realized}
+
+    def open_short(self, price: float, atr_at_entry: float):
+        cash = self.cash
+        notional = cash * max(0.0, min(config.ORDER_PCT, 1.0))
+        fill = apply_slippage(price, "sell_short")
+        fee = notional * config.FEE_RATE
+        qty = (notional - fee) / fill
+
+        self.cash = cash + (notional - fee)
+        self.btc_short = qty
+        self.avg_short = fill
+        self.btc_long = 0.0
+        self.avg_long = 0.0
+
+        self.entry_price = fill
+        self.entry_atr = atr_at_entry
+        self.trail_active = False
+        self.trail_stop = 0.0
+
+        self.trades += 1
+        self.position = "short"
+        return {"fill": fill, "qty": qty, "fee": fee}
+
+    def close_short(self, price: float):
+        qty = self.btc_short
+        fill = apply_slippage(price, "buy_to_cover")
+        gross = qty * fill
+        fee = gross * config.FEE_RATE
+        total_cost = gross + fee
+        realized = (self.avg_short - fill) * qty - fee
+
+        self.realized_pnl += realized
+        self.cash -= total_cost
+        self.btc_short = 0.0
+        self.avg_short = 0.0
+
+        self.trail_active = False
+        self.trail_stop = 0.0
+
+        self.trades += 1
+        self.position = "flat"
+        return {"fill": fill, "qty": qty, "fee": fee, "realized": realized}
+
+
+def _apply(state, method: str, *args):
+    book = PaperBook.from_state(state)
+    result = getattr(book, method)(*args)
+    book.store(state)
+    return result
 
-    return {"fill": fill, "qty": qty, "fee": fee}
+def open_long(state, price: float, atr_at_entry: float):
+    return _apply(state, "open_long", price, atr_at_entry)
 
 def close_long(state, price: float):
-    paper = state["paper"]
-    qty = float(paper["btc_long"])
-    fill = apply_slippage(price, "sell")
-    gross = qty * fill
-    fee = gross * config.FEE_RATE
-    net = gross - fee
-    avg = float(paper["avg_long"])
-    realized = (fill - avg) * qty - fee
-
-    paper["realized_pnl"] = float(paper["realized_pnl"]) + realized
-    paper["cash"] = float(paper["cash"]) + net
-    paper["btc_long"] = 0.0
-    paper["avg_long"] = 0.0
-
-    paper["trail_active"] = False
-    paper["trail_stop"] = 0.0
-
-    paper["trades"] = int(paper["trades"]) + 1
-    state["position"] = "flat"
-
-    return {"fill": fill, "qty": qty, "fee": fee, "realized": realized}
+    return _apply(state, "close_long", price)
 
 def open_short(state, price: float, atr_at_entry: float):
-    paper = state["paper"]
-    cash = float(paper["cash"])
-
-    notional = cash * max(0.0, min(config.ORDER_PCT, 1.0))
-    fill = apply_slippage(price, "sell_short")
-    fee = notional * config.FEE_RATE
-    qty = (notional - fee) / fill
-
-    paper["cash"] = cash + (notional - fee)
-    paper["btc_short"] = qty
-    paper["avg_short"] = fill
-
-    paper["btc_long"] = 0.0
-    paper["avg_long"] = 0.0
-
-    paper["entry_price"] = fill
-    paper["entry_atr"] = atr_at_entry
-    paper["trail_active"] = False
-    paper["trail_stop"] = 0.0
-
-    paper["trades"] = int(paper["trades"]) + 1
-    state["position"] = "short"
-
-    return {"fill": fill, "qty": qty, "fee": fee}
+    return _apply(state, "open_short", price, atr_at_entry)
 
 def close_short(state, price: float):
-    paper = state["paper"]
-    qty = float(paper["btc_short"])
-    fill = apply_slippage(price, "buy_to_cover")
-    gross = qty * fill
-    fee = gross * config.FEE_RATE
-    total_cost = gross + fee
-    avg = float(paper["avg_short"])
-    realized = (avg - fill) * qty - fee
-
-    paper["realized_pnl"] = float(paper["realized_pnl"]) + realized
-    paper["cash"] = float(paper["cash"]) - total_cost
-    paper["btc_short"] = 0.0
-    paper["avg_short"] = 0.0
-
-    paper["trail_active"] = False
-    paper["trail_stop"] = 0.0
-
-    paper["trades"] = int(paper["trades"]) + 1
-    state["position"] = "flat"
-
-    return {"fill": fill, "qty": qty, "fee": fee, "realized": realized}
+    return _apply(state, "close_short", price)
@@ -0,0 +1,137 @@
+"""Walk-forward optimization: tune on rolling in-sample windows, score on the following out-of-sample one.
+
+    python -m btc_bot.walkforward --strategy trend --limit 60000 --train 8640 --test 2016 \\
+        --grid VOL_SPIKE_MULT=1.2:2.0:0.2 --grid EMA_5M_PERIOD=10,20,30
+
+Signals are causal, so each parameter set's build_signals() runs once over the whole history and
+every window (in- and out-of-sample) replays a slice of it. Phase 1 fans the parameter sets out
+over the shared-memory pool from optimize; phase 2 re-runs each window's chosen set out of sample
+(in parallel) and the OOS equity curves are stitched into one compounded curve.
+"""
+import argparse
+import numpy as np
+from . import config
+from .log_setup import setup_logger
+from .market.binance_api import klines
+from . import backtest, optimize, strategy
+
+logger = setup_logger()
+
+
+def make_windows(n: int, train: int, test: int, step: int = None):
+    """[(train_start, train_end, test_end), ...] over bar indices; the test slice is [train_end, test_end)."""
+    step = step or test
+    first = backtest.WARMUP_BARS - 2
+    last = n - 2  # the final bar is the still-open one
+    windows = []
+    s = first
+    while s + train + test <= last:
+        windows.append((s, s + train, s + train + test))
+        s += step
+    return windows
+
+
+def _score(strat, sig, allow, start: int, end: int) -> float:
+    book, fills = backtest.run_signals(strat, sig, start, end, allow, path=optimize._worker["path"])
+    return backtest.summarize(book, fills, float(sig["close"][end - 1]))["pnl_pct"]
+
+
+def _in_sample(task):
+    params, windows = task
+    strat, df = optimize._worker["strat"], optimize._worker["df"]
+    old = optimize.apply_params(strat, params)
+    try:
+        sig = strat.build_signals(df.copy())
+        allow = optimize.worker_allow()
+        return [_score(strat, sig, allow, a, b) for a, b, _ in windows]
+    finally:
+        optimize.restore_params(old)
+
+
+def _out_of_sample(task):
+    params, (a, b, c) = task
+    strat, df = optimize._worker["strat"], optimize._worker["df"]
+    old = optimize.apply_params(strat, params)
+    try:
+        sig = strat.build_signals(df.copy())
+        equity = []
+        book, fills = backtest.run_signals(strat, sig, b, c, optimize.worker_allow(), equity=equity,
+                                           path=optimize._worker["path"])
+        result = backtest.summarize(book, fills, float(sig["close"][c - 1]))
+        result["equity"] = equity
+        return result
+    finally:
+        optimize.restore_params(old)
+
+
+def walk_forward(strategy_name: str, df, grid: dict, train: int, test: int, step: int = None, workers: int = None):
+    windows = make_windows(len(df), train, test, step)
+    if not windows:
+        raise ValueError(f"not enough bars ({len(df)}) for train={train} test={test}")
+    sets = optimize.param_sets(grid)
+
+    with optimize.shared_pool(strategy_name, df, workers) as pool:
+        # scores[p][w]: in-sample PnL% of param set p on window w
+        scores = np.array(list(pool.map(_in_sample, [(p, windows) for p in sets])))
+        chosen = [sets[int(np.argmax(scores[:, w]))] for w in range(len(windows))]
+        oos = list(pool.map(_out_of_sample, list(zip(chosen, windows))))
+
+    start_cash = float(config.START_CASH_USDT)
+    stitched = []
+    level = 1.0
+    rows = []
+    close_ms = df["close_time"].to_numpy(dtype="datetime64[ms]").astype("int64")
+    for w, ((a, b, c), params, r) in enumerate(zip(windows, chosen, oos)):
+        stitched.extend(level * v for v in r["equity"])
+        level *= r["end_value"] / start_cash
+        rows.append({
+            "window": w,
+            "test_from_ms": int(close_ms[b]),
+            "test_to_ms": int(close_ms[c - 1]),
+            **params,
+            "is_pnl_pct": float(scores[sets.index(params), w]),
+            "oos_pnl_pct": r["pnl_pct"],
+            "oos_trades": r["trades"],
+        })
+
+    curve = np.asarray(stitched)
+    peak = np.maximum.accumulate(curve) if len(curve) else curve
+    max_dd_pct = float(((peak - curve) / peak).max() * 100.0) if len(curve) else 0.0
+    return {
+        "windows": rows,
+        "equity": curve,
+        "oos_return_pct": (level - 1.0) * 100.0,
+        "oos_max_dd_pct": max_dd_pct,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Walk-forward optimization with out-of-sample scoring")
+    ap.add_argument("--strategy", choices=strategy.names(), default="trend")
+    ap.add_argument("--limit", type=int, default=config.BACKTEST_KLINES_LIMIT)
+    ap.add_argument("--grid", action="append", required=True, help="NAME=v1,v2,... or NAME=start:stop:step")
+    ap.add_argument("--train", type=int, required=True, help="in-sample bars per window")
+    ap.add_argument("--test", type=int, required=True, help="out-of-sample bars per window")
+    ap.add_argument("--step", type=int, default=None, help="bars between window starts (default: --test)")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--equity-out", default="", help="write the stitched OOS equity curve as CSV")
+    args = ap.parse_args()
+
+    config.validate_config()
+    grid = optimize.parse_grid(args.grid, backtest.pick_strategy(args.strategy))
+    df = klines(config.SYMBOL, config.KLINE_INTERVAL, args.limit)
+    res = walk_forward(args.strategy, df, grid, args.train, args.test, args.step, args.workers)
+
+    names = list(grid)
+    for r in res["windows"]:
+        chosen = " ".join(f"{n}={r[n]}" for n in names)
+        print(f"window={r['window']} {chosen} is={r['is_pnl_pct']:+.2f}% oos={r['oos_pnl_pct']:+.2f}% trades={r['oos_trades']}")
+    print(f"oos_return={res['oos_return_pct']:+.2f}% oos_max_dd={res['oos_max_dd_pct']:.2f}% windows={len(res['windows'])}")
+
+    if args.equity_out:
+        np.savetxt(args.equity_out, res["equity"], delimiter=",", header="equity", comments="")
+        logger.info(f"OOS equity written to {args.equity_out}")
+
+
+if __name__ == "__main__":
+    main()
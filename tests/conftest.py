@@ -0,0 +1,4 @@
+import os
+
+# config is read from the environment at import; keep test runs off data/btc_bot.log
+os.environ.setdefault("LOG_TO_FILE", "false")
@@ -0,0 +1,39 @@
+"""The vectorized backtest engine against the O(n^2) reference loop on synthetic bars."""
+import pytest
+from btc_bot import backtest, strategy
+from btc_bot.market import synthetic
+from btc_bot.market.trend_filter import ema1h_allow_arrays
+from btc_bot.trading.intrabar import history_path
+
+# fixed end so the synthetic walk does not move with the wall clock
+END_MS = 1791355500000
+BARS = 300
+
+
+@pytest.fixture(scope="module", params=[1, 2, 3])
+def df(request):
+    return synthetic.frame(BARS, "5m", seed=request.param, end_ms=END_MS)
+
+
+@pytest.mark.parametrize("mode", ["off", "bar"])
+@pytest.mark.parametrize("name", ["trend", "range"])
+def test_simulate_matches_loop(df, name, mode):
+    strat = strategy.get(name)
+    allow = ema1h_allow_arrays(df)
+    book, fills = backtest.simulate(strat, df, allow, history_path(df, mode))
+    ref_book, ref_fills = backtest.simulate_loop(strat, df, allow, history_path(df, mode))
+
+    assert fills, "no trades, the comparison proves nothing"
+    assert fills == ref_fills
+    last = float(df.iloc[-1]["close"])
+    assert book.value(last) == ref_book.value(last)
+    assert book.realized_pnl == ref_book.realized_pnl
+
+
+def test_simulate_many_matches_simulate(df):
+    path = history_path(df, "bar")
+    runs = backtest.simulate_many(["trend", "range"], df, path=path)
+    for name, (book, fills) in runs.items():
+        ref_book, ref_fills = backtest.simulate(strategy.get(name), df, path=path)
+        assert fills == ref_fills
+        assert book.realized_pnl == ref_book.realized_pnl
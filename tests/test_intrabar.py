@@ -0,0 +1,86 @@
+"""DecisionEngine.first_touch ordering and fill prices, and HistoryPath's scan-ahead."""
+import numpy as np
+import pytest
+from btc_bot.trading.engine import DecisionEngine
+from btc_bot.trading.intrabar import HistoryPath
+
+BAR_MS = 5 * 60 * 1000
+
+
+@pytest.fixture
+def engine():
+    # entry 100, ATR 1: SL 99, TP 102, trailing off unless a test turns it on
+    eng = DecisionEngine(bar_ms=BAR_MS)
+    eng.use_tp_sl = True
+    eng.sl_mult, eng.tp_mult = 1.0, 2.0
+    eng.use_trailing = False
+    eng.trail_mult, eng.trail_activate_r = 1.0, 1.0
+    return eng
+
+
+def touch(engine, side, open_, high, low, **kw):
+    return engine.first_touch(side, 100.0, 1.0, np.array(open_), np.array(high), np.array(low), **kw)[:3]
+
+
+def test_no_touch(engine):
+    assert touch(engine, "long", [100.0, 100.5], [101.0, 101.5], [99.5, 99.8]) == (-1, None, None)
+
+
+def test_gap_through_stop_fills_at_open(engine):
+    assert touch(engine, "long", [100.0, 97.0], [100.5, 97.5], [99.5, 96.5]) == (1, "sl", 97.0)
+    assert touch(engine, "short", [100.0, 103.0], [100.5, 103.5], [99.5, 102.5]) == (1, "sl", 103.0)
+
+
+def test_gap_through_take_profit_fills_at_open(engine):
+    assert touch(engine, "long", [100.0, 104.0], [100.5, 104.5], [99.5, 103.5]) == (1, "tp", 104.0)
+    assert touch(engine, "short", [100.0, 96.0], [100.5, 96.5], [99.5, 95.5]) == (1, "tp", 96.0)
+
+
+def test_touch_inside_bar_fills_at_level(engine):
+    assert touch(engine, "long", [100.0, 100.2], [100.5, 102.5], [99.5, 100.0]) == (1, "tp", 102.0)
+    assert touch(engine, "long", [100.0, 99.8], [100.5, 100.0], [99.5, 98.5]) == (1, "sl", 99.0)
+
+
+def test_stop_before_take_profit_in_one_sub_bar(engine):
+    # both levels inside the same (sub-)bar: the order of high and low is unknown, the stop wins
+    assert touch(engine, "long", [100.0], [103.0], [98.0]) == (0, "sl", 99.0)
+    assert touch(engine, "short", [100.0], [102.0], [97.0]) == (0, "sl", 101.0)
+
+
+def test_trail_uses_earlier_highs_only(engine):
+    engine.use_tp_sl = False
+    engine.use_trailing = True
+    # bar 0 reaches 101.5 (1R) and dips to 100.0 in the same bar: not yet armed there
+    # bar 1 falls to 100.2, through the 100.5 stop armed by bar 0's high
+    k, kind, price, active, stop = engine.first_touch(
+        "long", 100.0, 1.0, np.array([100.0, 101.0]), np.array([101.5, 101.2]), np.array([100.0, 100.2]))
+    assert (k, kind, price, active, stop) == (1, "trail", 100.5, True, 100.5)
+
+
+def test_higher_stop_fills_first(engine):
+    engine.use_trailing = True
+    # trail armed at 99.5, above the 99 SL; a bar falling through both fills at the trail
+    k, kind, price, _, _ = engine.first_touch(
+        "long", 100.0, 1.0, np.array([100.2]), np.array([100.4]), np.array([98.0]),
+        trail_active=True, trail_stop=99.5)
+    assert (k, kind, price) == (0, "trail", 99.5)
+
+def test_history_path_scan_ahead_matches_single_scan(engine):
+    # touch far past the first chunk; the chunked scan must find the same sub-bar and price
+    n = 1000
+    open_ = np.full(n, 100.2)
+    high = np.full(n, 100.5)
+    low = np.full(n, 99.5)
+    open_[700], low[700] = 99.4, 98.0
+    close_ms = np.arange(1, n + 1, dtype=np.int64) * 60000 - 1
+    path = HistoryPath(open_, high, low, close_ms, BAR_MS, chunk=16)
+
+    engine.book.open_long(100.0, 1.0)
+    engine.book.entry_price = 100.0  # no slippage, so the levels stay at 99 / 102
+    hits = []
+    for bar_close_ms in range(BAR_MS - 1, n * 60000, BAR_MS):
+        exit_ = path.bar(bar_close_ms).risk_exit(engine)
+        if exit_ is not None:
+            hits.append((bar_close_ms, exit_))
+    assert hits == [(141 * BAR_MS - 1, ("close_long", "sl", 99.0))]
+    assert touch(engine, "long", open_, high, low) == (700, "sl", 99.0)